@@ -34,6 +34,29 @@ class BlockMesh:
     def get_bounds(self):
         return self._voxel_mesh.get_bounds()
 
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray, list[str], np.ndarray]:
+        """Posisi (N, 3) int32, indeks nama (N,) int32 ke daftar nama, dan warna RGBA (N, 4) uint8."""
+        names = self.get_block_palette()
+        name_index = {name: i for i, name in enumerate(names)}
+        count = len(self._blocks)
+        positions = np.empty((count, 3), dtype=np.int32)
+        name_ids = np.empty(count, dtype=np.int32)
+        colours = np.empty((count, 4), dtype=np.uint8)
+        for i, block in enumerate(self._blocks):
+            positions[i] = (int(block.position.x), int(block.position.y), int(block.position.z))
+            name_ids[i] = name_index[block.name]
+            colours[i] = (block.colour.r, block.colour.g, block.colour.b, block.colour.a)
+        return positions, name_ids, names, colours
+
+    @classmethod
+    def from_arrays(cls, voxel_mesh: VoxelMesh, positions: np.ndarray, name_ids: np.ndarray,
+                    names: list[str], colours: np.ndarray) -> 'BlockMesh':
+        block_mesh = cls(voxel_mesh)
+        for (x, y, z), name_id, (r, g, b, a) in zip(np.asarray(positions).tolist(), np.asarray(name_ids).tolist(),
+                                                    np.asarray(colours).tolist()):
+            block_mesh.add_block(Block(position=Vector3(x, y, z), name=names[name_id], colour=RGBA(r, g, b, a)))
+        return block_mesh
+
 # Enum untuk visibilitas sisi, tidak ada perubahan
 class FaceVisibility(Flag):
     NONE = 0
@@ -203,4 +226,16 @@ def map_voxels_to_blocks(voxel_mesh: VoxelMesh, visibility_grid: np.ndarray, atl
             continue # Lanjutkan ke voxel berikutnya jika terjadi error
 
     logging.info("Pemetaan blok selesai.")
-    return block_mesh_result
\ No newline at end of file
+    return block_mesh_result
+
+def build_block_name_grid(block_mesh: BlockMesh, shape: tuple) -> np.ndarray:
+    """
+    Grid nama blok (dtype object) seukuran solid_grid untuk pratinjau frontend;
+    sel tanpa blok berisi "minecraft:air".
+    """
+    block_name_grid = np.full(shape, "minecraft:air", dtype=object)
+    for block in block_mesh.get_blocks():
+        x, y, z = int(block.position.x), int(block.position.y), int(block.position.z)
+        if 0 <= x < block_name_grid.shape[0] and 0 <= y < block_name_grid.shape[1] and 0 <= z < block_name_grid.shape[2]:
+            block_name_grid[x, y, z] = block.name
+    return block_name_grid
@@ -72,6 +72,31 @@ class VoxelMesh:
             
         return grid_rgb
 
+    def to_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Representasi ringkas: koordinat (N, 3) int32 dan warna RGBA (N, 4) uint8."""
+        count = self.get_voxel_count()
+        coords = np.empty((count, 3), dtype=np.int32)
+        colours = np.empty((count, 4), dtype=np.uint8)
+        for i, (key, colour) in enumerate(self._voxels.items()):
+            coords[i] = [int(c) for c in key.split(',')]
+            colours[i] = (colour.r, colour.g, colour.b, colour.a)
+        return coords, colours
+
+    @classmethod
+    def from_arrays(cls, coords: np.ndarray, colours: np.ndarray) -> 'VoxelMesh':
+        voxel_mesh = cls()
+        if len(coords) == 0:
+            return voxel_mesh
+        coords = np.asarray(coords, dtype=np.int64)
+        voxel_mesh._voxels = {
+            f"{x},{y},{z}": RGBA(int(r), int(g), int(b), int(a))
+            for (x, y, z), (r, g, b, a) in zip(coords.tolist(), np.asarray(colours).tolist())
+        }
+        mins, maxs = coords.min(axis=0), coords.max(axis=0)
+        voxel_mesh._min_bounds = Vector3(int(mins[0]), int(mins[1]), int(mins[2]))
+        voxel_mesh._max_bounds = Vector3(int(maxs[0]), int(maxs[1]), int(maxs[2]))
+        return voxel_mesh
+
 # =========================================================================================
 # 2. KELAS VOXELISER ABSTRAK
 # =========================================================================================
@@ -0,0 +1,141 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import torch
+from PIL import Image
+
+from model_registry import ModelRegistry
+
+# =========================================================================================
+# MICRO-BATCHING INFERENSI TSR
+# =========================================================================================
+
+@dataclass
+class _PendingRequest:
+    image: Image.Image
+    future: Future = field(default_factory=Future)
+
+class InferenceBatcher:
+    """
+    Mengumpulkan permintaan rekonstruksi yang datang bersamaan dalam jendela waktu
+    `window_ms` (maksimal `max_batch_size` gambar), menjalankan satu forward
+    `model([...])` bertumpuk, lalu membagi scene_codes kembali ke tiap pemanggil.
+    Batch baru dipotong saat ada replika yang bebas, sehingga permintaan yang antre
+    selama semua replika sibuk ikut terkumpul (hingga `max_batch_size`).
+    Backbone transformer dan tokenizer DINO adalah biaya dominan per gambar,
+    sehingga batching menaikkan throughput saat beban bursty.
+    """
+    def __init__(self, registry: ModelRegistry, max_batch_size: int = 4, window_ms: float = 50.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size minimal 1.")
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self._queue: "queue.Queue[_PendingRequest | None]" = queue.Queue()
+        self._dispatcher = None
+        self._executor = None
+        self._free_replicas = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, registry: ModelRegistry) -> "InferenceBatcher":
+        return cls(
+            registry,
+            max_batch_size=int(os.environ.get("TRIPOSR_MAX_BATCH", "4")),
+            window_ms=float(os.environ.get("TRIPOSR_BATCH_WINDOW_MS", "50")),
+        )
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+        # Satu worker per replika agar beberapa batch bisa berjalan paralel
+        self._free_replicas = threading.Semaphore(self.registry.replicas)
+        self._executor = ThreadPoolExecutor(max_workers=self.registry.replicas, thread_name_prefix="tsr-batch")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="tsr-batcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self):
+        with self._lock:
+            if self._dispatcher is None:
+                return
+            self._queue.put(None)
+            self._dispatcher.join()
+            self._dispatcher = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            # Permintaan yang masuk setelah sentinel tidak akan pernah diproses
+            while True:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is not None and not request.future.done():
+                    request.future.set_exception(RuntimeError("Batcher inferensi sudah dihentikan."))
+
+    def submit(self, image: Image.Image) -> Future:
+        request = _PendingRequest(image=image)
+        with self._lock:
+            if self._dispatcher is None:
+                self.start()
+            self._queue.put(request)
+        return request.future
+
+    def infer(self, image: Image.Image) -> torch.Tensor:
+        """Versi blocking dari `submit`: mengembalikan scene_codes berukuran batch 1."""
+        return self.submit(image).result()
+
+    def _collect_batch(self, first: _PendingRequest) -> tuple[list[_PendingRequest], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Setelah jendela habis, permintaan yang sudah antre tetap ikut tanpa menunggu
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _dispatch_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            # Tunggu replika bebas dulu; permintaan yang antre selama menunggu ikut dalam batch ini
+            self._free_replicas.acquire()
+            batch, stopping = self._collect_batch(first)
+            try:
+                self._executor.submit(self._run_batch, batch)
+            except Exception as e:
+                # Batch tidak pernah berjalan: kembalikan slot replika dan gagalkan permintaannya,
+                # dispatcher tetap hidup agar permintaan berikutnya tidak menggantung
+                self._free_replicas.release()
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            if stopping:
+                break
+
+    def _run_batch(self, batch: list[_PendingRequest]):
+        try:
+            with self.registry.acquire() as replica:
+                logging.info(f"Inferensi TripoSR untuk batch berisi {len(batch)} gambar (replika {replica.index})...")
+                with torch.no_grad():
+                    scene_codes = replica.model([r.image for r in batch], device=replica.device)
+            for i, request in enumerate(batch):
+                # clone agar tiap permintaan tidak menahan tensor batch penuh
+                request.future.set_result(scene_codes[i:i + 1].clone())
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._free_replicas.release()
@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import socket
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields, replace
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+# =========================================================================================
+# ANTRIAN JOB ASINKRON UNTUK PIPELINE EMPAT TAHAP
+# =========================================================================================
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+TERMINAL_STATES = (JOB_DONE, JOB_FAILED)
+
+def _current_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _owner_alive(owner: str) -> bool:
+    # Hanya proses di host yang sama yang bisa diperiksa; di Windows os.kill(pid, 0) justru menghentikan proses
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or os.name == "nt":
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+@dataclass
+class Job:
+    id: str
+    stage: str
+    status: str = JOB_QUEUED
+    progress: float = 0.0
+    message: str = ""
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Worker uvicorn (host:pid) yang menjalankan job; dipakai untuk mendeteksi job yatim
+    owner: str = field(default_factory=_current_owner)
+    listener: Optional[Callable[["Job"], None]] = field(default=None, repr=False, compare=False)
+
+    def touch(self):
+        self.updated_at = time.time()
+        if self.listener is not None:
+            self.listener(self)
+
+    def report(self, progress: float, message: str = ""):
+        # Dipanggil oleh fungsi tahap (boleh dari thread worker) untuk melaporkan kemajuan
+        self.progress = max(0.0, min(1.0, float(progress)))
+        if message:
+            self.message = message
+        self.touch()
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "listener"}
+
+class JobStore:
+    """
+    Salinan status job di SQLite agar worker uvicorn mana pun dapat menjawab
+    /jobs/{id}, walaupun job dijalankan oleh worker lain.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " job_id TEXT PRIMARY KEY,"
+                    " status TEXT NOT NULL,"
+                    " data TEXT NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def save(self, job: Job):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, status, data, updated_at) VALUES (?, ?, ?, ?)",
+                    (job.id, job.status, json.dumps(job.to_dict()), job.updated_at)
+                )
+        finally:
+            conn.close()
+
+    def load(self, job_id: str) -> Optional[Job]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return Job(**json.loads(row[0])) if row else None
+
+    def unfinished(self) -> list[Job]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT data FROM jobs WHERE status NOT IN ({','.join('?' * len(TERMINAL_STATES))})",
+                TERMINAL_STATES
+            ).fetchall()
+        finally:
+            conn.close()
+        return [Job(**json.loads(row[0])) for row in rows]
+
+    def replace_if_unchanged(self, job: Job, previous_updated_at: float) -> bool:
+        """Menulis `job` hanya jika barisnya belum diubah sejak `previous_updated_at`."""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE job_id = ? AND updated_at = ?",
+                    (job.status, json.dumps(job.to_dict()), job.updated_at, job.id, previous_updated_at)
+                )
+        finally:
+            conn.close()
+        return cursor.rowcount == 1
+
+    def purge(self, cutoff: float):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(TERMINAL_STATES))}) AND updated_at < ?",
+                    (*TERMINAL_STATES, cutoff)
+                )
+        finally:
+            conn.close()
+
+class JobManager:
+    """
+    Menjalankan tahap pipeline sebagai job latar belakang. Setiap tahap punya batas
+    konkurensi sendiri sehingga rekonstruksi yang berat tidak menghabiskan slot
+    untuk ekspor yang ringan. Status job dapat di-poll atau di-stream (SSE).
+    """
+    ORPHAN_ERROR = "Worker yang menjalankan job ini berhenti sebelum job selesai."
+
+    def __init__(self, limits: dict[str, int], ttl_seconds: float = 3600.0, store: Optional[JobStore] = None,
+                 stale_seconds: float = 0.0):
+        self.limits = dict(limits)
+        self.ttl_seconds = ttl_seconds
+        # Job belum selesai yang tidak diperbarui selama ini dianggap yatim (0 = hanya cek pid)
+        self.stale_seconds = stale_seconds
+        self.store = store
+        self._jobs: dict[str, Job] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        # Satu thread penulis: SQLite tidak menahan event loop dan urutan status tetap terjaga
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store") if store is not None else None
+
+    @classmethod
+    def from_env(cls, default_limits: dict[str, int]) -> "JobManager":
+        # Contoh: JOB_WORKERS_RECONSTRUCT=1, JOB_WORKERS_MAP_BLOCKS=4
+        limits = {
+            stage: int(os.environ.get(f"JOB_WORKERS_{stage.upper().replace('-', '_')}", str(limit)))
+            for stage, limit in default_limits.items()
+        }
+        # Database yang sama dengan SessionStore agar status job terbaca dari semua worker
+        store = JobStore(os.environ.get("SESSION_DB_PATH", "sessions.db"))
+        manager = cls(
+            limits, ttl_seconds=float(os.environ.get("JOB_TTL_HOURS", "1")) * 3600, store=store,
+            stale_seconds=float(os.environ.get("JOB_STALE_HOURS", "6")) * 3600,
+        )
+        # Job dari worker yang mati (crash/restart) tidak akan pernah selesai
+        manager.fail_orphaned_jobs()
+        return manager
+
+    def _persist(self, job: Job):
+        if self.store is not None:
+            # Snapshot diambil sekarang; penulisan berjalan di thread penulis
+            self._writer.submit(self._save, replace(job, listener=None))
+
+    def _save(self, job: Job):
+        try:
+            self.store.save(job)
+        except Exception as e:
+            logging.warning(f"[job {job.id}] Gagal menyimpan status job: {e}")
+
+    def _is_orphaned(self, job: Job) -> bool:
+        # Hanya untuk job yang tidak ada di self._jobs: pid sama berarti proses lama yang kebetulan
+        # mendapat pid yang sama setelah restart (umum di container)
+        if job.status in TERMINAL_STATES:
+            return False
+        if job.owner == _current_owner() or not _owner_alive(job.owner):
+            return True
+        return self.stale_seconds > 0 and job.updated_at < time.time() - self.stale_seconds
+
+    def _fail_orphan(self, job: Job) -> Optional[Job]:
+        failed = replace(job, status=JOB_FAILED, error=self.ORPHAN_ERROR, updated_at=time.time())
+        if self.store.replace_if_unchanged(failed, job.updated_at):
+            logging.warning(f"[job {job.id}] Ditandai gagal: worker {job.owner} tidak lagi menjalankannya.")
+            return failed
+        # Baris baru saja diperbarui oleh pemiliknya
+        return self.store.load(job.id)
+
+    def fail_orphaned_jobs(self) -> int:
+        if self.store is None:
+            return 0
+        with self._lock:
+            local = set(self._jobs)
+        orphans = [job for job in self.store.unfinished() if job.id not in local and self._is_orphaned(job)]
+        for job in orphans:
+            self._fail_orphan(job)
+        return len(orphans)
+
+    def _semaphore(self, stage: str) -> asyncio.Semaphore:
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(max(1, self.limits.get(stage, 1)))
+        return self._semaphores[stage]
+
+    def submit(self, stage: str, func: Callable[..., Awaitable[dict]], *args, **kwargs) -> Job:
+        """
+        Mendaftarkan job dan langsung kembali. `func` adalah coroutine tahap yang
+        menerima argumen keyword `progress` untuk pelaporan kemajuan.
+        """
+        if stage not in self.limits:
+            raise ValueError(f"Tahap tidak dikenal: {stage}")
+        job = Job(id=str(uuid.uuid4()), stage=stage, listener=self._persist)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._persist(job)
+        task = asyncio.create_task(self._run(job, func, *args, **kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, func: Callable[..., Awaitable[dict]], *args, **kwargs):
+        async with self._semaphore(job.stage):
+            job.status = JOB_RUNNING
+            job.report(0.0, "Memulai...")
+            try:
+                job.result = await func(*args, progress=job.report, **kwargs)
+                job.status = JOB_DONE
+                job.report(1.0, "Selesai.")
+            except HTTPException as e:
+                job.status = JOB_FAILED
+                job.error = str(e.detail)
+                job.touch()
+            except Exception as e:
+                logging.error(f"[job {job.id}] Tahap {job.stage} gagal: {e}", exc_info=True)
+                job.status = JOB_FAILED
+                job.error = f"Kesalahan internal pada tahap {job.stage}."
+                job.touch()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            # Job milik worker lain
+            job = self.store.load(job_id)
+            if job is not None and self._is_orphaned(job):
+                job = self._fail_orphan(job)
+        return job
+
+    async def events(self, job_id: str, poll_interval: float = 0.5):
+        """Generator Server-Sent Events: mengirim snapshot job setiap kali berubah."""
+        last_update = None
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'detail': 'Job tidak ditemukan.'})}\n\n"
+                return
+            if job.updated_at != last_update:
+                last_update = job.updated_at
+                yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.status in TERMINAL_STATES:
+                return
+            await asyncio.sleep(poll_interval)
+
+    def close(self):
+        # Menunggu status job yang masih antre untuk ditulis
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+
+    def purge_finished(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items()
+                       if job.status in TERMINAL_STATES and job.updated_at < cutoff]
+            for jid in expired:
+                del self._jobs[jid]
+        if self.store is not None:
+            self.store.purge(cutoff)
+        if expired:
+            logging.info(f"Menghapus {len(expired)} job yang sudah kedaluwarsa.")
@@ -2,7 +2,6 @@ import os
 import uuid
 import json
 from pathlib import Path
-import numpy as np
 import logging
 import imghdr
 import shutil
@@ -11,17 +10,28 @@ from datetime import datetime, timedelta
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # Impor modul-modul proyek
-import trimesh
-from PIL import Image
-from triposr_runner import run_triposr
-from core_voxelizer import BasicGridVoxeliser, VoxelMesh
-from block_mapper import map_voxels_to_blocks, load_atlas_data, calculate_face_visibility, BlockMesh
+from triposr_runner import (
+    prepare_image, export_reconstruction, bake_textured_mesh,
+    save_scene_code, load_scene_code, has_scene_code, SCENE_CODE_FILENAME
+)
+from pipeline import parse_artifacts, write_artifacts, MESH_ARTIFACTS, VOXEL_MODES
+from mesh_decimation import decimation_target, write_decimation_info, decimated_max_blocks
+from mesh_io import parse_formats, artifact_names, has_textured_mesh, load_textured_mesh, MESH_FORMATS
+from model_registry import ModelRegistry
+from inference_batcher import InferenceBatcher
+from reconstruction_cache import ReconstructionCache
+from job_queue import JobManager
+from core_voxelizer import VoxelMesh
+from block_mapper import load_atlas_data, build_block_name_grid, BlockMesh
+from stage_executor import StageProcessPool
+from triplane_voxelizer import TriplaneVoxeliser, DEFAULT_THRESHOLD, DEFAULT_SUPERSAMPLE
+from session_store import SessionStore
 from exporter import Exporter
 
 # === KONFIGURASI APLIKASI ===
@@ -33,8 +43,19 @@ ALLOWED_IMAGE_EXT = ['jpeg', 'png', 'jpg', 'bmp']
 CORS_ALLOW = ["*"]
 MAX_FILE_SIZE_MB = 10
 SESSION_LIFESPAN_HOURS = 24
+# Ekstraksi mesh coarse-to-fine (pita sempit di sekitar permukaan), default untuk semua rekonstruksi
+HIERARCHICAL_MC = os.environ.get("TRIPOSR_HIERARCHICAL_MC", "0").lower() in ("1", "true", "yes")
 
-SESSION_STORAGE = {}
+# Data sesi (VoxelMesh, solid_grid, BlockMesh) dibatasi memorinya; kelebihan di-spill ke temp/<sesi> (SESSION_MEMORY_BUDGET_MB)
+SESSION_STORE = SessionStore.from_env(TEMP_DIR)
+# Replika model TripoSR dimuat sekali saat startup (atur dengan env TRIPOSR_REPLICAS)
+MODEL_REGISTRY = ModelRegistry.from_env()
+# Permintaan rekonstruksi bersamaan digabung menjadi satu forward (TRIPOSR_MAX_BATCH, TRIPOSR_BATCH_WINDOW_MS)
+INFERENCE_BATCHER = InferenceBatcher.from_env(MODEL_REGISTRY)
+# Cache hasil rekonstruksi per (gambar, parameter) dengan batas ukuran LRU (RECON_CACHE_DIR, RECON_CACHE_MAX_MB)
+RECON_CACHE = ReconstructionCache.from_env()
+# Batas job paralel per tahap (JOB_WORKERS_RECONSTRUCT, JOB_WORKERS_RE_EXTRACT, JOB_WORKERS_VOXELIZE, JOB_WORKERS_MAP_BLOCKS, JOB_WORKERS_EXPORT)
+JOB_MANAGER = JobManager.from_env({"reconstruct": 1, "re-extract": 1, "voxelize": 2, "map-blocks": 2, "export": 4, "pipeline": 1})
 
 app = FastAPI(title="3D to Schematic API")
 app.add_middleware(CORSMiddleware, allow_origins=CORS_ALLOW, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
@@ -48,6 +69,9 @@ try:
 except Exception as e:
     logging.fatal(f"KRITIS: Gagal memuat file atlas '{ATLAS_PATH}'. Error: {e}")
     exit(1)
+
+# Vokselisasi & pemetaan blok berjalan di pool proses (STAGE_PROCESSES), bukan thread yang berebut GIL
+STAGE_POOL = StageProcessPool.from_env(str(ATLAS_PATH))
     
 scheduler = AsyncIOScheduler()
 
@@ -63,8 +87,7 @@ def cleanup_old_sessions():
             try:
                 dir_time = datetime.fromtimestamp(session_dir.stat().st_mtime)
                 if now - dir_time > lifespan:
-                    if session_dir.name in SESSION_STORAGE:
-                        del SESSION_STORAGE[session_dir.name]
+                    SESSION_STORE.delete(session_dir.name)
                     shutil.rmtree(session_dir)
                     logging.info(f"Menghapus sesi usang: {session_dir.name}")
                     cleaned_count += 1
@@ -76,16 +99,46 @@ def cleanup_old_sessions():
 @app.on_event("startup")
 def start_scheduler(): 
     scheduler.add_job(cleanup_old_sessions, 'interval', hours=6)
+    scheduler.add_job(JOB_MANAGER.purge_finished, 'interval', minutes=30)
     scheduler.start()
 
+@app.on_event("startup")
+def load_models():
+    MODEL_REGISTRY.load()
+    INFERENCE_BATCHER.start()
+    STAGE_POOL.start()
+
 @app.on_event("shutdown")
 def shutdown_scheduler(): 
     scheduler.shutdown()
 
+@app.on_event("shutdown")
+def unload_models():
+    INFERENCE_BATCHER.stop()
+    MODEL_REGISTRY.close()
+    STAGE_POOL.shutdown()
+    SESSION_STORE.flush()
+    JOB_MANAGER.close()
+
 class VoxelizePayload(BaseModel):
     sessionId: str
     max_blocks: int = 128
     fill: bool = True
+    # "mesh": dari mesh + tekstur hasil bake; "triplane": langsung dari scene code tersimpan
+    mode: str = "mesh"
+    supersample: int = DEFAULT_SUPERSAMPLE
+    threshold: float = DEFAULT_THRESHOLD
+
+class ReExtractPayload(BaseModel):
+    sessionId: str
+    resolution: int = 256
+    threshold: float = 25.0
+    hierarchical: bool = HIERARCHICAL_MC
+    # Ukuran build (blok) untuk menentukan target desimasi; 0 = tanpa desimasi
+    max_blocks: int = 0
+    texture_resolution: int = 2048
+    render: bool = False
+    export_formats: str = "glb"
 
 class MapPayload(BaseModel):
     sessionId: str
@@ -107,8 +160,80 @@ def validate_image(file: UploadFile):
     if kind not in ALLOWED_IMAGE_EXT: 
         raise HTTPException(status_code=400, detail="File bukan gambar yang valid. Hanya menerima JPEG, PNG, BMP.")
 
-@app.post("/reconstruct", summary="Tahap 1: Rekonstruksi Gambar ke 3D")
-async def reconstruct(image: UploadFile = File(...), remove_bg: bool = Form(True), resolution: int = Form(256)):
+def _report(progress, value: float, message: str):
+    if progress is not None:
+        progress(value, message)
+
+def _run_reconstruction(input_img_path: Path, session_dir: Path, resolution: int, remove_bg: bool,
+                        foreground_ratio: float, texture_resolution: int, export_formats=("glb",),
+                        max_blocks: int = 0, progress=None):
+    # Dijalankan di thread terpisah. Jika gambar & parameter yang sama sudah pernah diproses,
+    # artefaknya ditautkan dari cache tanpa menjalankan ulang rembg/transformer/bake.
+    cache_key = RECON_CACHE.make_key(
+        str(input_img_path), resolution=resolution, remove_bg=remove_bg,
+        foreground_ratio=foreground_ratio, texture_resolution=texture_resolution,
+        export_formats=list(export_formats), hierarchical=HIERARCHICAL_MC, max_blocks=max_blocks,
+        # Cache di disk bertahan antar restart: ganti precision/kuantisasi/backend -> kunci baru
+        model=MODEL_REGISTRY.config_key()
+    )
+    # scene_code.npy ikut di-cache agar sesi hasil cache hit tetap bisa diekstraksi ulang
+    artifacts = artifact_names(export_formats) + (SCENE_CODE_FILENAME,)
+    if RECON_CACHE.lookup(cache_key, session_dir, artifacts):
+        logging.info(f"[{session_dir.name}] Cache hit rekonstruksi ({cache_key[:12]}).")
+        extras = {"cached": True}
+        if "glb" in export_formats:
+            extras["glb"] = str(session_dir / "model.glb")
+        texture_path = None
+        if "obj" in export_formats:
+            extras["obj"] = str(session_dir / "model.obj")
+            texture_path = str(session_dir / "baked_texture.png")
+        write_decimation_info(str(session_dir), max_blocks)
+        return extras[export_formats[0]], texture_path, extras
+
+    # Inferensi lewat batcher (digabung dengan permintaan lain),
+    # ekstraksi mesh & bake tekstur meminjam satu replika model yang sudah dimuat.
+    _report(progress, 0.05, "Memproses gambar input...")
+    image = prepare_image(
+        str(input_img_path), str(session_dir), remove_bg=remove_bg,
+        foreground_ratio=foreground_ratio, rembg_session=MODEL_REGISTRY.rembg_session
+    )
+    _report(progress, 0.2, "Inferensi model TripoSR...")
+    scene_codes = INFERENCE_BATCHER.infer(image)
+    save_scene_code(scene_codes, str(session_dir))
+    _report(progress, 0.5, "Mengekstrak mesh dan mem-bake tekstur...")
+    with MODEL_REGISTRY.acquire() as replica:
+        result = export_reconstruction(
+            replica.model, scene_codes.to(replica.device), str(session_dir),
+            resolution=resolution, texture_resolution=texture_resolution,
+            export_formats=export_formats, hierarchical=HIERARCHICAL_MC,
+            decimate_faces=decimation_target(max_blocks)
+        )
+    write_decimation_info(str(session_dir), max_blocks)
+    RECON_CACHE.store(cache_key, session_dir, artifacts)
+    return result
+
+def _run_re_extraction(session_dir: Path, resolution: int, threshold: float, texture_resolution: int,
+                       render: bool, export_formats=("glb",), hierarchical=False, max_blocks: int = 0,
+                       progress=None):
+    # Hanya decoder + marching cubes + bake: rembg, tokenizer DINO dan backbone dilewati
+    _report(progress, 0.1, "Memuat scene code...")
+    # Hapus (unlink) artefak lama lebih dulu: file bisa berupa hardlink ke entri cache
+    # rekonstruksi, jadi tidak boleh ditimpa di tempat
+    for name in artifact_names(MESH_FORMATS) + ("render.mp4",):
+        (session_dir / name).unlink(missing_ok=True)
+    with MODEL_REGISTRY.acquire() as replica:
+        scene_codes = load_scene_code(str(session_dir), replica.device)
+        _report(progress, 0.3, "Mengekstrak mesh dan mem-bake tekstur...")
+        result = export_reconstruction(
+            replica.model, scene_codes, str(session_dir), render=render,
+            resolution=resolution, texture_resolution=texture_resolution,
+            export_formats=export_formats, threshold=threshold, hierarchical=hierarchical,
+            decimate_faces=decimation_target(max_blocks)
+        )
+    write_decimation_info(str(session_dir), max_blocks)
+    return result
+
+def _save_upload(image: UploadFile) -> tuple[str, Path, Path]:
     validate_image(image)
     session_id = str(uuid.uuid4())
     session_dir = Path(TEMP_DIR) / session_id
@@ -119,62 +244,126 @@ async def reconstruct(image: UploadFile = File(...), remove_bg: bool = Form(True
     
     with open(input_img_path, "wb") as f: 
         shutil.copyfileobj(image.file, f)
+    return session_id, session_dir, input_img_path
+
+# =========================================================================================
+# FUNGSI TAHAP PIPELINE (dipakai oleh endpoint sinkron maupun job)
+# =========================================================================================
 
+async def _reconstruct_stage(session_id: str, session_dir: Path, input_img_path: Path, remove_bg: bool,
+                             resolution: int, foreground_ratio: float, texture_resolution: int,
+                             export_formats=("glb",), max_blocks: int = 0, progress=None) -> dict:
     try:
         logging.info(f"[{session_id}] Memulai rekonstruksi 3D...")
-        obj_path, texture_path, _ = await asyncio.to_thread(
-            run_triposr, str(input_img_path), str(session_dir), resolution=resolution, remove_bg=remove_bg
+        mesh_path, texture_path, extras = await asyncio.to_thread(
+            _run_reconstruction, input_img_path, session_dir, resolution, remove_bg,
+            foreground_ratio, texture_resolution, export_formats, max_blocks, progress
         )
         
         def get_url(p): 
             return f"/temp/{session_id}/{Path(p).name}" if p and os.path.exists(p) else None
             
-        return JSONResponse({
+        return {
             "sessionId": session_id, 
-            "objUrl": get_url(obj_path), 
-            "textureUrl": get_url(texture_path)
-        })
+            "meshUrl": get_url(mesh_path),
+            "glbUrl": get_url(extras.get("glb")),
+            "objUrl": get_url(extras.get("obj")), 
+            "textureUrl": get_url(texture_path),
+            "cached": bool(extras.get("cached")),
+            "maxBlocks": max_blocks
+        }
     except Exception as e:
         logging.error(f"[{session_id}] Rekonstruksi gagal: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Kesalahan internal saat rekonstruksi model 3D.")
 
-@app.post("/voxelize", summary="Tahap 2: Vokselisasi Model 3D")
-async def voxelize(payload: VoxelizePayload):
+async def _re_extract_stage(payload: ReExtractPayload, progress=None) -> dict:
     sessionId = secure_filename(payload.sessionId)
     session_dir = Path(TEMP_DIR) / sessionId
-    obj_path = session_dir / "model.obj"
-    texture_path = session_dir / "baked_texture.png"
+    formats = _parse_formats_form(payload.export_formats)
 
-    if not obj_path.exists() or not texture_path.exists():
+    if not has_scene_code(str(session_dir)):
+        raise HTTPException(status_code=404, detail="Scene code tidak ditemukan untuk sesi ini. Jalankan rekonstruksi terlebih dahulu.")
+
+    try:
+        logging.info(f"[{sessionId}] Ekstraksi ulang dari scene code tersimpan...")
+        mesh_path, texture_path, extras = await asyncio.to_thread(
+            _run_re_extraction, session_dir, payload.resolution, payload.threshold,
+            payload.texture_resolution, payload.render, formats, payload.hierarchical,
+            payload.max_blocks, progress
+        )
+        # Voxel/blok lama berasal dari mesh sebelumnya dan tidak lagi valid
+        await asyncio.to_thread(SESSION_STORE.delete, sessionId)
+
+        def get_url(p):
+            return f"/temp/{sessionId}/{Path(p).name}" if p and os.path.exists(p) else None
+
+        return {
+            "sessionId": sessionId,
+            "meshUrl": get_url(mesh_path),
+            "glbUrl": get_url(extras.get("glb")),
+            "objUrl": get_url(extras.get("obj")),
+            "textureUrl": get_url(texture_path),
+            "renderUrl": get_url(extras.get("render")),
+            "maxBlocks": payload.max_blocks
+        }
+    except Exception as e:
+        logging.error(f"[{sessionId}] Ekstraksi ulang gagal: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Kesalahan internal saat ekstraksi ulang model 3D.")
+
+def _voxelize_from_triplane(scene_codes, max_blocks: int, fill: bool, threshold: float, supersample: int):
+    # Query densitas & warna langsung di pusat voxel: tanpa marching cubes, xatlas, bake maupun OBJ
+    with MODEL_REGISTRY.acquire() as replica:
+        voxeliser = TriplaneVoxeliser(replica.model, threshold=threshold, supersample=supersample)
+        return voxeliser.run(scene_codes.to(replica.device), max_blocks, fill)
+
+async def _voxelize_stage(payload: VoxelizePayload, progress=None) -> dict:
+    sessionId = secure_filename(payload.sessionId)
+    session_dir = Path(TEMP_DIR) / sessionId
+
+    _parse_voxel_mode_form(payload.mode, payload.supersample)
+    if payload.mode == "triplane" and not has_scene_code(str(session_dir)):
+        raise HTTPException(status_code=404, detail="Scene code tidak ditemukan untuk sesi ini. Jalankan rekonstruksi terlebih dahulu.")
+    if payload.mode == "mesh" and not has_textured_mesh(session_dir):
         raise HTTPException(status_code=404, detail="File model atau tekstur tidak ditemukan untuk sesi ini.")
+    # Mesh sudah didesimasi untuk grid tertentu; grid yang lebih besar akan kehilangan detail
+    pinned = decimated_max_blocks(str(session_dir)) if payload.mode == "mesh" else 0
+    if pinned and payload.max_blocks > pinned:
+        raise HTTPException(status_code=400, detail=f"Mesh sesi ini didesimasi untuk maksimal {pinned} blok. Ekstraksi ulang dengan max_blocks lebih besar atau gunakan mode triplane.")
         
     try:
-        logging.info(f"[{sessionId}] Memulai vokselisasi...")
-        mesh = await asyncio.to_thread(trimesh.load, obj_path, force='mesh')
-        texture = await asyncio.to_thread(Image.open, texture_path)
-        
-        voxelizer = BasicGridVoxeliser()
-        voxel_mesh_obj, solid_grid = await asyncio.to_thread(
-            voxelizer.run, mesh, texture, payload.max_blocks, payload.fill
-        )
+        logging.info(f"[{sessionId}] Memulai vokselisasi ({payload.mode})...")
+        _report(progress, 0.1, "Memuat model...")
+        if payload.mode == "triplane":
+            scene_codes = await asyncio.to_thread(load_scene_code, str(session_dir))
+            _report(progress, 0.3, "Vokselisasi langsung dari triplane...")
+            voxel_mesh_obj, solid_grid = await asyncio.to_thread(
+                _voxelize_from_triplane, scene_codes, payload.max_blocks, payload.fill,
+                payload.threshold, payload.supersample
+            )
+        else:
+            # model.glb (biner) diutamakan; model.obj + baked_texture.png sebagai fallback
+            mesh, texture = await asyncio.to_thread(load_textured_mesh, session_dir)
+            
+            _report(progress, 0.3, "Vokselisasi...")
+            voxel_mesh_obj, solid_grid = await STAGE_POOL.voxelize(mesh, texture, payload.max_blocks, payload.fill)
         
-        SESSION_STORAGE[sessionId] = {'voxel_mesh': voxel_mesh_obj, 'solid_grid': solid_grid}
+        await asyncio.to_thread(SESSION_STORE.set, sessionId, {'voxel_mesh': voxel_mesh_obj, 'solid_grid': solid_grid})
         
+        _report(progress, 0.9, "Menulis pratinjau voxel...")
         preview_array = await asyncio.to_thread(voxel_mesh_obj.to_numpy_array)
         preview_path = session_dir / "voxel_preview.json"
         with open(preview_path, "w") as f: 
             json.dump(preview_array.tolist(), f)
 
-        return JSONResponse({"sessionId": sessionId, "voxelPreviewUrl": f"/temp/{sessionId}/voxel_preview.json"})
+        return {"sessionId": sessionId, "voxelPreviewUrl": f"/temp/{sessionId}/voxel_preview.json"}
     except Exception as e:
         logging.error(f"[{sessionId}] Vokselisasi gagal: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Kesalahan internal saat vokselisasi.")
 
-@app.post("/map-blocks", summary="Tahap 3: Pemetaan Voxel ke Blok")
-async def map_blocks(payload: MapPayload):
+async def _map_blocks_stage(payload: MapPayload, progress=None) -> dict:
     sessionId = secure_filename(payload.sessionId)
     session_dir = Path(TEMP_DIR) / sessionId
-    session_data = SESSION_STORAGE.get(sessionId)
+    session_data = await asyncio.to_thread(SESSION_STORE.get, sessionId)
     
     if not session_data or 'voxel_mesh' not in session_data or 'solid_grid' not in session_data:
         raise HTTPException(status_code=404, detail="Data vokselisasi tidak ditemukan. Jalankan tahap 2 dahulu.")
@@ -183,24 +372,20 @@ async def map_blocks(payload: MapPayload):
         voxel_mesh_obj = session_data['voxel_mesh']
         solid_grid = session_data['solid_grid']
         
-        visibility_grid = await asyncio.to_thread(calculate_face_visibility, solid_grid)
-        
         logging.info(f"[{sessionId}] Memulai pemetaan blok canggih...")
-        block_mesh_obj = await asyncio.to_thread(map_voxels_to_blocks, voxel_mesh_obj, visibility_grid, ATLAS_DATA)
+        _report(progress, 0.1, "Menghitung visibilitas sisi dan memetakan voxel ke blok...")
+        block_mesh_obj = await STAGE_POOL.map_blocks(voxel_mesh_obj, solid_grid)
 
-        session_data['block_mesh'] = block_mesh_obj
+        await asyncio.to_thread(SESSION_STORE.update, sessionId, block_mesh=block_mesh_obj)
         
-        block_name_grid = np.full(solid_grid.shape, "minecraft:air", dtype=object)
-        for block in block_mesh_obj.get_blocks():
-            x, y, z = int(block.position.x), int(block.position.y), int(block.position.z)
-            if 0 <= x < block_name_grid.shape[0] and 0 <= y < block_name_grid.shape[1] and 0 <= z < block_name_grid.shape[2]:
-                block_name_grid[x, y, z] = block.name
+        _report(progress, 0.9, "Menulis pratinjau blok...")
+        block_name_grid = build_block_name_grid(block_mesh_obj, solid_grid.shape)
             
         block_names_path = session_dir / "block_names_preview.json"
         with open(block_names_path, "w") as f:
             json.dump(block_name_grid.tolist(), f)
 
-        return JSONResponse({"sessionId": sessionId, "blockNamesPreviewUrl": f"/temp/{sessionId}/block_names_preview.json"})
+        return {"sessionId": sessionId, "blockNamesPreviewUrl": f"/temp/{sessionId}/block_names_preview.json"}
     except Exception as e:
         logging.error(f"[{sessionId}] Pemetaan blok gagal: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Kesalahan internal saat pemetaan blok.")
@@ -227,30 +412,217 @@ def _run_export(block_mesh: BlockMesh, session_dir: Path, format_type: str):
     return output_path
 
 # PERBAIKAN: Menggabungkan logika export ke satu fungsi
-async def _handle_export(payload: ExportPayload, format_type: str):
+async def _handle_export(payload: ExportPayload, format_type: str, progress=None) -> dict:
     sessionId = secure_filename(payload.sessionId)
     session_dir = Path(TEMP_DIR) / sessionId
-    block_mesh = SESSION_STORAGE.get(sessionId, {}).get('block_mesh')
+    block_mesh = ((await asyncio.to_thread(SESSION_STORE.get, sessionId)) or {}).get('block_mesh')
 
     if not block_mesh:
         raise HTTPException(status_code=404, detail="Data pemetaan blok tidak ditemukan. Jalankan tahap 3 dahulu.")
         
     try:
+        _report(progress, 0.1, f"Mengekspor .{format_type}...")
         output_path = await asyncio.to_thread(_run_export, block_mesh, session_dir, format_type)
-        return JSONResponse({"downloadUrl": f"/temp/{sessionId}/{output_path.name}"})
+        return {"downloadUrl": f"/temp/{sessionId}/{output_path.name}"}
     except Exception as e:
         logging.error(f"[{sessionId}] Ekspor .{format_type} gagal: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _bake_in_memory(scene_codes, resolution: int, texture_resolution: int, max_blocks: int = 0):
+    # Mesh disederhanakan ke detail yang masih terlihat pada grid max_blocks sebelum bake & vokselisasi
+    with MODEL_REGISTRY.acquire() as replica:
+        return bake_textured_mesh(
+            replica.model, scene_codes.to(replica.device), resolution, texture_resolution,
+            hierarchical=HIERARCHICAL_MC, decimate_faces=decimation_target(max_blocks)
+        )
+
+async def _pipeline_stage(session_id: str, session_dir: Path, input_img_path: Path, remove_bg: bool,
+                          resolution: int, foreground_ratio: float, texture_resolution: int,
+                          max_blocks: int, fill: bool, artifacts: tuple, voxel_mode: str = "mesh",
+                          threshold: float = DEFAULT_THRESHOLD, supersample: int = DEFAULT_SUPERSAMPLE,
+                          progress=None) -> dict:
+    # Keempat tahap berantai di memori: mesh trimesh & tekstur diteruskan langsung antar tahap.
+    # voxel_mode="triplane": vokselisasi langsung dari scene code, mesh hanya dibuat jika diminta sebagai artefak
+    try:
+        logging.info(f"[{session_id}] Memulai pipeline penuh...")
+        _report(progress, 0.05, "Memproses gambar input...")
+        image = await asyncio.to_thread(
+            prepare_image, str(input_img_path), None, remove_bg, foreground_ratio, MODEL_REGISTRY.rembg_session
+        )
+        _report(progress, 0.15, "Inferensi model TripoSR...")
+        scene_codes = await asyncio.to_thread(INFERENCE_BATCHER.infer, image)
+        mesh, texture = None, None
+        if voxel_mode == "mesh" or any(a in MESH_ARTIFACTS for a in artifacts):
+            _report(progress, 0.35, "Mengekstrak mesh dan mem-bake tekstur...")
+            mesh, texture = await asyncio.to_thread(
+                _bake_in_memory, scene_codes, resolution, texture_resolution, max_blocks
+            )
+        _report(progress, 0.6, "Vokselisasi...")
+        if voxel_mode == "triplane":
+            voxel_mesh, solid_grid = await asyncio.to_thread(
+                _voxelize_from_triplane, scene_codes, max_blocks, fill, threshold, supersample
+            )
+        else:
+            voxel_mesh, solid_grid = await STAGE_POOL.voxelize(mesh, texture, max_blocks, fill)
+        _report(progress, 0.8, "Memetakan voxel ke blok...")
+        block_mesh = await STAGE_POOL.map_blocks(voxel_mesh, solid_grid)
+        _report(progress, 0.9, "Menulis artefak...")
+        paths = await asyncio.to_thread(
+            write_artifacts, str(session_dir), artifacts, mesh, texture, voxel_mesh, solid_grid, block_mesh
+        )
+        return {
+            "sessionId": session_id,
+            "artifacts": {name: f"/temp/{session_id}/{Path(p).name}" for name, p in paths.items()}
+        }
+    except Exception as e:
+        logging.error(f"[{session_id}] Pipeline gagal: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Kesalahan internal saat menjalankan pipeline.")
+
+def _parse_formats_form(export_formats: str) -> tuple:
+    try:
+        return parse_formats(export_formats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _parse_voxel_mode_form(voxel_mode: str, supersample: int = DEFAULT_SUPERSAMPLE) -> str:
+    if voxel_mode not in VOXEL_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode vokselisasi tidak valid. Pilihan: {', '.join(VOXEL_MODES)}.")
+    if supersample < 1:
+        raise HTTPException(status_code=400, detail="supersample minimal 1.")
+    return voxel_mode
+
+def _parse_artifacts_form(artifacts: str) -> tuple:
+    try:
+        return parse_artifacts(artifacts.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# =========================================================================================
+# ENDPOINT SINKRON (menahan koneksi sampai tahap selesai)
+# =========================================================================================
+
+@app.post("/reconstruct", summary="Tahap 1: Rekonstruksi Gambar ke 3D")
+async def reconstruct(image: UploadFile = File(...), remove_bg: bool = Form(True), resolution: int = Form(256),
+                      foreground_ratio: float = Form(0.85), texture_resolution: int = Form(2048),
+                      export_formats: str = Form("glb"), max_blocks: int = Form(0)):
+    # max_blocks > 0: mesh didesimasi sesuai ukuran build yang direncanakan
+    formats = _parse_formats_form(export_formats)
+    session_id, session_dir, input_img_path = _save_upload(image)
+    return JSONResponse(await _reconstruct_stage(
+        session_id, session_dir, input_img_path, remove_bg, resolution, foreground_ratio, texture_resolution,
+        formats, max_blocks
+    ))
+
+@app.post("/re-extract", summary="Tahap 1b: Ekstraksi ulang mesh dari scene code tersimpan")
+async def re_extract(payload: ReExtractPayload):
+    return JSONResponse(await _re_extract_stage(payload))
+
+@app.post("/voxelize", summary="Tahap 2: Vokselisasi Model 3D")
+async def voxelize(payload: VoxelizePayload):
+    return JSONResponse(await _voxelize_stage(payload))
+
+@app.post("/map-blocks", summary="Tahap 3: Pemetaan Voxel ke Blok")
+async def map_blocks(payload: MapPayload):
+    return JSONResponse(await _map_blocks_stage(payload))
+
 @app.post("/export-schematic", summary="Tahap 4: Ekspor ke .schem")
 async def export_schematic(payload: ExportPayload):
-    return await _handle_export(payload, 'schem')
+    return JSONResponse(await _handle_export(payload, 'schem'))
         
+@app.post("/pipeline", summary="Pipeline penuh in-memory: gambar -> .schem")
+async def pipeline(image: UploadFile = File(...), remove_bg: bool = Form(True), resolution: int = Form(256),
+                   foreground_ratio: float = Form(0.85), texture_resolution: int = Form(2048),
+                   max_blocks: int = Form(128), fill: bool = Form(True), artifacts: str = Form("schem"),
+                   voxel_mode: str = Form("mesh"), threshold: float = Form(DEFAULT_THRESHOLD),
+                   supersample: int = Form(DEFAULT_SUPERSAMPLE)):
+    # threshold & supersample hanya dipakai pada voxel_mode="triplane"
+    requested = _parse_artifacts_form(artifacts)
+    voxel_mode = _parse_voxel_mode_form(voxel_mode, supersample)
+    session_id, session_dir, input_img_path = _save_upload(image)
+    return JSONResponse(await _pipeline_stage(
+        session_id, session_dir, input_img_path, remove_bg, resolution, foreground_ratio,
+        texture_resolution, max_blocks, fill, requested, voxel_mode, threshold, supersample
+    ))
+
 # PERBAIKAN: Menonaktifkan endpoint litematic
 # @app.post("/export-litematic", summary="Tahap 4: Ekspor ke .litematic")
 # async def export_litematic(payload: ExportPayload):
 #     return await _handle_export(payload, 'litematic')
 
+# =========================================================================================
+# ENDPOINT JOB ASINKRON (langsung mengembalikan jobId, status di-poll atau di-stream)
+# =========================================================================================
+
+def _job_response(job, **extra) -> JSONResponse:
+    return JSONResponse({
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": f"/jobs/{job.id}",
+        "eventsUrl": f"/jobs/{job.id}/events",
+        **extra
+    }, status_code=202)
+
+@app.post("/jobs/reconstruct", summary="Job Tahap 1: Rekonstruksi Gambar ke 3D")
+async def submit_reconstruct(image: UploadFile = File(...), remove_bg: bool = Form(True), resolution: int = Form(256),
+                             foreground_ratio: float = Form(0.85), texture_resolution: int = Form(2048),
+                             export_formats: str = Form("glb"), max_blocks: int = Form(0)):
+    formats = _parse_formats_form(export_formats)
+    session_id, session_dir, input_img_path = _save_upload(image)
+    job = JOB_MANAGER.submit(
+        "reconstruct", _reconstruct_stage, session_id, session_dir, input_img_path,
+        remove_bg, resolution, foreground_ratio, texture_resolution, formats, max_blocks
+    )
+    return _job_response(job, sessionId=session_id)
+
+@app.post("/jobs/re-extract", summary="Job Tahap 1b: Ekstraksi ulang mesh dari scene code tersimpan")
+async def submit_re_extract(payload: ReExtractPayload):
+    _parse_formats_form(payload.export_formats)
+    return _job_response(JOB_MANAGER.submit("re-extract", _re_extract_stage, payload), sessionId=payload.sessionId)
+
+@app.post("/jobs/voxelize", summary="Job Tahap 2: Vokselisasi Model 3D")
+async def submit_voxelize(payload: VoxelizePayload):
+    return _job_response(JOB_MANAGER.submit("voxelize", _voxelize_stage, payload), sessionId=payload.sessionId)
+
+@app.post("/jobs/map-blocks", summary="Job Tahap 3: Pemetaan Voxel ke Blok")
+async def submit_map_blocks(payload: MapPayload):
+    return _job_response(JOB_MANAGER.submit("map-blocks", _map_blocks_stage, payload), sessionId=payload.sessionId)
+
+@app.post("/jobs/export-schematic", summary="Job Tahap 4: Ekspor ke .schem")
+async def submit_export_schematic(payload: ExportPayload):
+    job = JOB_MANAGER.submit("export", _handle_export, payload, 'schem')
+    return _job_response(job, sessionId=payload.sessionId)
+
+@app.post("/jobs/pipeline", summary="Job pipeline penuh in-memory: gambar -> .schem")
+async def submit_pipeline(image: UploadFile = File(...), remove_bg: bool = Form(True), resolution: int = Form(256),
+                          foreground_ratio: float = Form(0.85), texture_resolution: int = Form(2048),
+                          max_blocks: int = Form(128), fill: bool = Form(True), artifacts: str = Form("schem"),
+                          voxel_mode: str = Form("mesh"), threshold: float = Form(DEFAULT_THRESHOLD),
+                          supersample: int = Form(DEFAULT_SUPERSAMPLE)):
+    requested = _parse_artifacts_form(artifacts)
+    voxel_mode = _parse_voxel_mode_form(voxel_mode, supersample)
+    session_id, session_dir, input_img_path = _save_upload(image)
+    job = JOB_MANAGER.submit(
+        "pipeline", _pipeline_stage, session_id, session_dir, input_img_path, remove_bg, resolution,
+        foreground_ratio, texture_resolution, max_blocks, fill, requested, voxel_mode, threshold, supersample
+    )
+    return _job_response(job, sessionId=session_id)
+
+@app.get("/jobs/{job_id}", summary="Status job")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(JOB_MANAGER.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+    return JSONResponse(job.to_dict())
+
+@app.get("/jobs/{job_id}/events", summary="Stream status job (Server-Sent Events)")
+async def job_events(job_id: str):
+    if await asyncio.to_thread(JOB_MANAGER.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+    return StreamingResponse(
+        JOB_MANAGER.events(job_id), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Sajikan frontend sebagai fallback
 frontend_dir = Path(__file__).parent / "frontend"
 if not frontend_dir.exists():
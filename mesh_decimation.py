@@ -0,0 +1,64 @@
+import os
+import json
+import math
+import logging
+from typing import Optional
+
+import trimesh
+
+# =========================================================================================
+# DESIMASI MESH (QUADRIC ERROR) SEBELUM BAKE & VOKSELISASI
+# =========================================================================================
+
+# Segitiga per sel permukaan pada grid max_blocks; detail yang lebih halus dari satu blok
+# tidak terlihat di schematic, jadi permukaan cukup diwakili ~2 segitiga per sel
+FACES_PER_SURFACE_CELL = 2
+# Batas bawah agar objek kecil/tipis tidak runtuh menjadi beberapa segitiga saja
+MIN_TARGET_FACES = 5000
+# Ukuran build yang menjadi dasar desimasi mesh sesi; vokselisasi mode "mesh" tidak boleh melebihinya
+DECIMATION_FILENAME = "decimation.json"
+
+def decimation_target(max_blocks: int) -> int:
+    """
+    Jumlah segitiga target untuk build berukuran `max_blocks`. Luas permukaan objek
+    yang memenuhi kubus N blok kira-kira setara bola berdiameter N (pi * N^2 sel).
+    """
+    if max_blocks <= 0:
+        return 0
+    return max(MIN_TARGET_FACES, int(FACES_PER_SURFACE_CELL * math.pi * max_blocks ** 2))
+
+def write_decimation_info(output_dir: str, max_blocks: int):
+    """Mencatat max_blocks yang dipakai untuk desimasi mesh di `output_dir` (0: tidak didesimasi)."""
+    path = os.path.join(output_dir, DECIMATION_FILENAME)
+    if max_blocks <= 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w") as f:
+        json.dump({"max_blocks": int(max_blocks)}, f)
+
+def decimated_max_blocks(output_dir: str) -> int:
+    """max_blocks terbesar yang masih terlayani oleh mesh di `output_dir`; 0 bila tidak dibatasi."""
+    path = os.path.join(output_dir, DECIMATION_FILENAME)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(json.load(f).get("max_blocks", 0))
+
+def decimate_mesh(mesh: trimesh.Trimesh, target_faces: Optional[int] = None,
+                  aggression: Optional[int] = None) -> trimesh.Trimesh:
+    """
+    Desimasi quadric-error (trimesh + fast-simplification) ke `target_faces` segitiga.
+    `aggression` (0-10) menukar ketepatan dengan kecepatan. Mesh yang sudah cukup
+    ringan dikembalikan apa adanya; atribut visual (UV/warna) tidak dipertahankan,
+    jadi panggil sebelum bake tekstur.
+    """
+    if not target_faces or len(mesh.faces) <= target_faces:
+        return mesh
+    try:
+        simplified = mesh.simplify_quadric_decimation(face_count=target_faces, aggression=aggression)
+    except ImportError as e:
+        logging.warning(f"Desimasi dilewati, fast-simplification tidak terpasang: {e}")
+        return mesh
+    logging.info(f"Desimasi mesh: {len(mesh.faces)} -> {len(simplified.faces)} segitiga.")
+    return simplified
@@ -0,0 +1,105 @@
+import os
+import logging
+from pathlib import Path
+
+import numpy as np
+import trimesh
+from PIL import Image
+
+# =========================================================================================
+# LAPISAN OUTPUT MESH (OBJ TERVEKTORISASI & GLB BINER)
+# =========================================================================================
+
+MESH_FORMATS = ("glb", "obj")
+# Jumlah baris per blok format; membatasi ukuran string sementara
+_ROWS_PER_CHUNK = 65536
+
+def _write_rows(f, row_fmt: str, rows: np.ndarray):
+    # Satu operasi % untuk ribuan baris sekaligus, bukan f-string per baris
+    rows = np.asarray(rows)
+    for start in range(0, len(rows), _ROWS_PER_CHUNK):
+        block = rows[start:start + _ROWS_PER_CHUNK]
+        f.write((row_fmt * len(block)) % tuple(block.ravel().tolist()))
+
+def _write_obj_file(obj_path, vertices, obj_uvs, faces, texture_name):
+    faces = np.asarray(faces, dtype=np.int64) + 1
+    with open(obj_path, 'w') as f:
+        f.write("mtllib material.mtl\nusemtl material_0\n")
+        _write_rows(f, "v %.6f %.6f %.6f\n", np.asarray(vertices, dtype=np.float64))
+        _write_rows(f, "vt %.6f %.6f\n", np.asarray(obj_uvs, dtype=np.float64))
+        # Indeks posisi dan UV sama: a/a b/b c/c
+        _write_rows(f, "f %d/%d %d/%d %d/%d\n", np.repeat(faces, 2, axis=1))
+
+    mtl_path = os.path.join(os.path.dirname(obj_path), "material.mtl")
+    with open(mtl_path, "w") as f:
+        f.write("newmtl material_0\n")
+        f.write(f"map_Kd {texture_name}\n")
+
+def write_obj(vertices, uvs, faces, obj_path, texture_name="texture.png"):
+    """Menulis OBJ + material.mtl dari UV mentah xatlas (sumbu V dibalik sesuai konvensi OBJ)."""
+    uvs = np.asarray(uvs, dtype=np.float64)
+    obj_uvs = np.column_stack([uvs[:, 0], 1 - uvs[:, 1]])  # OBJ UV Y-axis is inverted!
+    _write_obj_file(obj_path, vertices, obj_uvs, faces, texture_name)
+
+def write_textured_obj(mesh: trimesh.Trimesh, texture: Image.Image, output_dir, texture_name="baked_texture.png"):
+    """Menulis mesh ber-UV (konvensi trimesh) sebagai model.obj + material.mtl + tekstur PNG."""
+    texture_path = os.path.join(output_dir, texture_name)
+    texture.save(texture_path)
+    output_obj_path = os.path.join(output_dir, "model.obj")
+    _write_obj_file(output_obj_path, mesh.vertices, mesh.visual.uv, mesh.faces, texture_name)
+    logging.info(f"Model OBJ disimpan di: {output_obj_path}")
+    return output_obj_path, texture_path
+
+def write_glb(mesh: trimesh.Trimesh, output_dir, filename="model.glb"):
+    """Menulis mesh ber-UV sebagai GLB biner dengan tekstur tertanam."""
+    glb_path = os.path.join(output_dir, filename)
+    mesh.export(glb_path, file_type="glb")
+    logging.info(f"Model GLB disimpan di: {glb_path}")
+    return glb_path
+
+def artifact_names(formats) -> tuple[str, ...]:
+    """Nama file yang dihasilkan untuk kombinasi format tertentu."""
+    names = []
+    if "glb" in formats:
+        names.append("model.glb")
+    if "obj" in formats:
+        names += ["model.obj", "material.mtl", "baked_texture.png"]
+    return tuple(names)
+
+def parse_formats(formats) -> tuple[str, ...]:
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    parsed = tuple(dict.fromkeys(f.strip().lower() for f in formats if f and f.strip()))
+    unknown = [f for f in parsed if f not in MESH_FORMATS]
+    if unknown or not parsed:
+        raise ValueError(f"Format mesh tidak valid: {', '.join(unknown) or '(kosong)'}. Pilihan: {', '.join(MESH_FORMATS)}.")
+    return parsed
+
+def load_textured_mesh(session_dir) -> tuple[trimesh.Trimesh, Image.Image]:
+    """
+    Memuat mesh ber-UV dan teksturnya dari direktori sesi, mengutamakan model.glb
+    (biner, tekstur tertanam) dan jatuh ke model.obj + baked_texture.png.
+    """
+    session_dir = Path(session_dir)
+    glb_path = session_dir / "model.glb"
+    if glb_path.exists():
+        mesh = trimesh.load(glb_path, force='mesh')
+        texture = getattr(mesh.visual.material, "baseColorTexture", None)
+        if texture is None:
+            texture = getattr(mesh.visual.material, "image", None)
+        if texture is None:
+            raise ValueError("Tekstur tidak ditemukan di model.glb.")
+        return mesh, texture.convert("RGB")
+
+    obj_path = session_dir / "model.obj"
+    texture_path = session_dir / "baked_texture.png"
+    if not obj_path.exists() or not texture_path.exists():
+        raise FileNotFoundError("File model atau tekstur tidak ditemukan untuk sesi ini.")
+    mesh = trimesh.load(obj_path, force='mesh')
+    return mesh, Image.open(texture_path)
+
+def has_textured_mesh(session_dir) -> bool:
+    session_dir = Path(session_dir)
+    return (session_dir / "model.glb").exists() or (
+        (session_dir / "model.obj").exists() and (session_dir / "baked_texture.png").exists()
+    )
@@ -0,0 +1,170 @@
+import os
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import rembg
+
+from triposr_runner import resolve_device, load_tsr_model
+from tsr.bake_texture import get_baking_context
+
+# =========================================================================================
+# REGISTRY MODEL TRIPOSR
+# =========================================================================================
+
+@dataclass
+class ModelReplica:
+    index: int
+    model: Any
+    device: str
+
+def _int_or_auto(value: str) -> Optional[int]:
+    return None if value.strip().lower() == "auto" else int(value)
+
+def _bool_or_auto(value: str) -> Optional[bool]:
+    value = value.strip().lower()
+    return None if value == "auto" else value in ("1", "true", "yes")
+
+class ModelRegistry:
+    """
+    Menyimpan replika TSR dan sesi rembg yang dimuat sekali saat aplikasi start.
+    Setiap replika hanya dipakai oleh satu thread pada satu waktu (dipinjam lewat
+    `acquire()`), sedangkan sesi rembg (ONNX Runtime) aman dipakai bersama.
+    """
+    def __init__(self, replicas: int = 1, device: Optional[str] = None, chunk_size: Optional[int] = None,
+                 precision: str = "fp32", quantize: bool = False, backend: str = "torch",
+                 onnx_dir: str = "onnx", onnx_threads: int = 0, compile_mode: Optional[str] = None,
+                 mc_backend: str = "skimage", mc_workers: Optional[int] = None, render_budget_mb: int = 1024,
+                 occupancy_resolution: int = 64, chunk_memory_mb: int = 2048,
+                 chunk_workers: Optional[int] = None, mc_processes: Optional[bool] = None,
+                 int8_cache_dir: Optional[str] = None):
+        if replicas < 1:
+            raise ValueError("Jumlah replika model minimal 1.")
+        self.replicas = replicas
+        self.device = resolve_device(device)
+        self.chunk_size = chunk_size
+        self.precision = precision
+        self.quantize = quantize
+        self.int8_cache_dir = int8_cache_dir
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        self.onnx_threads = onnx_threads
+        self.compile_mode = compile_mode
+        self.mc_backend = mc_backend
+        self.mc_workers = mc_workers
+        self.mc_processes = mc_processes
+        self.render_budget_mb = render_budget_mb
+        self.occupancy_resolution = occupancy_resolution
+        self.chunk_memory_mb = chunk_memory_mb
+        self.chunk_workers = chunk_workers
+        self.rembg_session = None
+        self._pool: "queue.Queue[ModelReplica]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        return cls(
+            replicas=int(os.environ.get("TRIPOSR_REPLICAS", "1")),
+            device=os.environ.get("TRIPOSR_DEVICE"),
+            # "auto": benchmark saat startup, pilih chunk tercepat di bawah TRIPOSR_CHUNK_MEMORY_MB
+            chunk_size=_int_or_auto(os.environ.get("TRIPOSR_CHUNK_SIZE", "auto")),
+            chunk_memory_mb=int(os.environ.get("TRIPOSR_CHUNK_MEMORY_MB", "2048")),
+            # Chunk kueri triplane yang dievaluasi paralel ("auto": dari jumlah core CPU, 1 = berurutan)
+            chunk_workers=_int_or_auto(os.environ.get("TRIPOSR_CHUNK_WORKERS", "auto")),
+            # "bf16": autocast bfloat16 di CPU (opt-in), default fp32 penuh
+            precision=os.environ.get("TRIPOSR_PRECISION", "fp32"),
+            # Backbone & decoder int8 dinamis: latensi lebih rendah dan memori per replika lebih kecil (CPU)
+            quantize=os.environ.get("TRIPOSR_QUANTIZE", "0").lower() in ("1", "true", "yes"),
+            # Folder cache checkpoint int8; kosong = di samping checkpoint fp32 (snapshot hub)
+            int8_cache_dir=os.environ.get("TRIPOSR_INT8_CACHE_DIR") or None,
+            # "onnx": tokenizer gambar + backbone lewat ONNX Runtime (TRIPOSR_ONNX_DIR, TRIPOSR_ONNX_THREADS)
+            backend=os.environ.get("TRIPOSR_BACKEND", "torch"),
+            onnx_dir=os.environ.get("TRIPOSR_ONNX_DIR", "onnx"),
+            onnx_threads=int(os.environ.get("TRIPOSR_ONNX_THREADS", "0")),
+            # "compile" (torch.compile) atau "script" (TorchScript) untuk kueri triplane + decoder
+            compile_mode=os.environ.get("TRIPOSR_COMPILE") or None,
+            # Marching cubes: "skimage" (portabel) atau "torchmcubes"; slab paralel sebanyak TRIPOSR_MC_WORKERS
+            mc_backend=os.environ.get("TRIPOSR_MC_BACKEND", "skimage"),
+            mc_workers=int(os.environ["TRIPOSR_MC_WORKERS"]) if os.environ.get("TRIPOSR_MC_WORKERS") else None,
+            # Slab di proses ("1") atau thread ("0"); "auto": proses untuk skimage
+            mc_processes=_bool_or_auto(os.environ.get("TRIPOSR_MC_PROCESSES", "auto")),
+            # Batas memori kira-kira untuk sinar beberapa view yang dirender bersamaan (video pratinjau)
+            render_budget_mb=int(os.environ.get("TRIPOSR_RENDER_BUDGET_MB", "1024")),
+            # Grid okupansi kasar untuk melewati ruang kosong saat render; 0 = ray marching padat
+            occupancy_resolution=int(os.environ.get("TRIPOSR_OCCUPANCY_RES", "64")),
+        )
+
+    def config_key(self) -> dict:
+        """Konfigurasi model yang memengaruhi hasil rekonstruksi (bagian dari kunci cache)."""
+        return {
+            "device": self.device,
+            "precision": self.precision,
+            "quantize": self.quantize,
+            "backend": self.backend,
+            "compile_mode": self.compile_mode,
+            "mc_backend": self.mc_backend,
+        }
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            logging.info(f"Memuat {self.replicas} replika TripoSR di device {self.device} ({self.backend}, {self.precision}{', int8' if self.quantize else ''})...")
+            for i in range(self.replicas):
+                model = load_tsr_model(
+                    self.device, chunk_size=self.chunk_size, precision=self.precision, quantize=self.quantize,
+                    backend=self.backend, onnx_dir=self.onnx_dir, onnx_threads=self.onnx_threads,
+                    compile_mode=self.compile_mode, mc_backend=self.mc_backend, mc_workers=self.mc_workers,
+                    render_budget_mb=self.render_budget_mb, occupancy_resolution=self.occupancy_resolution,
+                    chunk_memory_mb=self.chunk_memory_mb, chunk_workers=self.chunk_workers,
+                    mc_processes=self.mc_processes, replicas=self.replicas,
+                    int8_cache_dir=self.int8_cache_dir
+                )
+                model.eval()
+                if self.chunk_size is None:
+                    # Autotune cukup sekali; replika berikutnya memakai hasil replika pertama
+                    self.chunk_size = model.renderer.chunk_size
+                    logging.info(f"Chunk size kueri triplane: {self.chunk_size}")
+                self._pool.put(ModelReplica(index=i, model=model, device=self.device))
+            self.rembg_session = rembg.new_session()
+            self._loaded = True
+            logging.info("Registry model siap.")
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Meminjam satu replika model. Memblokir sampai ada replika yang bebas
+        (atau melempar TimeoutError setelah `timeout` detik).
+        """
+        if not self._loaded:
+            self.load()
+        try:
+            replica = self._pool.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Tidak ada replika model yang tersedia.")
+        try:
+            yield replica
+        finally:
+            self._pool.put(replica)
+
+    def close(self):
+        with self._lock:
+            while not self._pool.empty():
+                try:
+                    replica = self._pool.get_nowait()
+                except queue.Empty:
+                    break
+                # Hentikan thread pool chunk milik replika
+                replica.model.renderer.set_chunk_workers(1)
+            # Konteks OpenGL + shader bake dipakai bersama semua replika; lepas bersama model
+            get_baking_context().release()
+            self.rembg_session = None
+            self._loaded = False
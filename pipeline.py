@@ -0,0 +1,142 @@
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import torch
+import trimesh
+from PIL import Image
+
+from triposr_runner import prepare_image, bake_textured_mesh, resolve_device, load_tsr_model
+from mesh_io import write_textured_obj, write_glb
+from core_voxelizer import BasicGridVoxeliser, VoxelMesh
+from block_mapper import BlockMesh, AtlasBlock, load_atlas_data, calculate_face_visibility, map_voxels_to_blocks, build_block_name_grid
+from exporter import Exporter
+from mesh_decimation import decimation_target
+from triplane_voxelizer import TriplaneVoxeliser, DEFAULT_THRESHOLD, DEFAULT_SUPERSAMPLE
+
+# =========================================================================================
+# PIPELINE IN-MEMORY: REKONSTRUKSI -> VOKSELISASI -> PEMETAAN -> EKSPOR
+# =========================================================================================
+
+DEFAULT_ATLAS_PATH = Path(__file__).parent / "frontend" / "assets" / "vanilla.atlas"
+
+# Artefak yang bisa diminta; hanya yang diminta yang ditulis ke disk
+PIPELINE_ARTIFACTS = ("glb", "obj", "voxel_preview", "block_preview", "schem")
+# Artefak yang membutuhkan mesh ber-tekstur (bake tetap dijalankan pada voxel_mode="triplane")
+MESH_ARTIFACTS = ("glb", "obj")
+# Sumber vokselisasi: mesh hasil bake, atau query triplane langsung di pusat voxel
+VOXEL_MODES = ("mesh", "triplane")
+
+@dataclass
+class PipelineResult:
+    # None pada voxel_mode="triplane" jika tidak ada artefak mesh yang diminta
+    mesh: Optional[trimesh.Trimesh]
+    texture: Optional[Image.Image]
+    voxel_mesh: VoxelMesh
+    solid_grid: np.ndarray
+    block_mesh: BlockMesh
+    artifacts: dict[str, str] = field(default_factory=dict)
+
+def parse_artifacts(artifacts: Iterable[str]) -> tuple[str, ...]:
+    requested = tuple(a.strip() for a in artifacts if a and a.strip())
+    unknown = [a for a in requested if a not in PIPELINE_ARTIFACTS]
+    if unknown:
+        raise ValueError(f"Artefak tidak dikenal: {', '.join(unknown)}. Pilihan: {', '.join(PIPELINE_ARTIFACTS)}.")
+    return requested
+
+def write_artifacts(output_dir: str, artifacts: Iterable[str], mesh: Optional[trimesh.Trimesh], texture: Optional[Image.Image],
+                    voxel_mesh: VoxelMesh, solid_grid: np.ndarray, block_mesh: BlockMesh) -> dict[str, str]:
+    """Menulis hanya artefak yang diminta. Mengembalikan peta nama artefak -> path file."""
+    artifacts = parse_artifacts(artifacts)
+    if not artifacts:
+        return {}
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    if "glb" in artifacts:
+        paths["glb"] = write_glb(mesh, output_dir)
+    if "obj" in artifacts:
+        obj_path, texture_path = write_textured_obj(mesh, texture, output_dir)
+        paths["obj"] = obj_path
+        paths["texture"] = texture_path
+    if "voxel_preview" in artifacts:
+        paths["voxel_preview"] = os.path.join(output_dir, "voxel_preview.json")
+        with open(paths["voxel_preview"], "w") as f:
+            json.dump(voxel_mesh.to_numpy_array().tolist(), f)
+    if "block_preview" in artifacts:
+        paths["block_preview"] = os.path.join(output_dir, "block_names_preview.json")
+        with open(paths["block_preview"], "w") as f:
+            json.dump(build_block_name_grid(block_mesh, solid_grid.shape).tolist(), f)
+    if "schem" in artifacts:
+        paths["schem"] = os.path.join(output_dir, "output.schem")
+        Exporter(block_mesh).export_to_schem_v2(paths["schem"])
+    return paths
+
+def run_pipeline(
+        image_path: str,
+        output_dir: Optional[str] = None,
+        artifacts: Iterable[str] = ("schem",),
+        resolution: int = 256,
+        texture_resolution: int = 2048,
+        foreground_ratio: float = 0.85,
+        remove_bg: bool = True,
+        max_blocks: int = 128,
+        fill: bool = True,
+        decimate: bool = True,
+        voxel_mode: str = "mesh",
+        supersample: int = DEFAULT_SUPERSAMPLE,
+        voxel_threshold: float = DEFAULT_THRESHOLD,
+        model=None,
+        device: Optional[str] = None,
+        rembg_session=None,
+        atlas: Optional[dict[str, AtlasBlock]] = None,
+) -> PipelineResult:
+    """
+    Menjalankan keempat tahap dalam satu proses. Mesh trimesh dan tekstur diteruskan
+    langsung antar tahap (tanpa menulis lalu mem-parsing ulang model.obj), dan hanya
+    `artifacts` yang diminta yang ditulis ke `output_dir`.
+    `decimate=True` menyederhanakan mesh ke jumlah segitiga yang masih terlihat pada
+    grid `max_blocks` sebelum bake dan vokselisasi.
+    `voxel_mode="triplane"` memvokselisasi langsung dari scene code (densitas & warna di
+    pusat voxel, `supersample`^3 sampel per voxel, batas densitas `voxel_threshold`) tanpa
+    marching cubes, xatlas dan bake;
+    mesh hanya dibuat jika artefak "glb"/"obj" diminta.
+    """
+    artifacts = parse_artifacts(artifacts)
+    if voxel_mode not in VOXEL_MODES:
+        raise ValueError(f"Mode vokselisasi tidak dikenal: {voxel_mode}. Pilihan: {', '.join(VOXEL_MODES)}.")
+    if artifacts and output_dir is None:
+        raise ValueError("output_dir wajib diisi jika ada artefak yang diminta.")
+    if model is None:
+        device = resolve_device(device)
+        model = load_tsr_model(device)
+    elif device is None:
+        device = str(next(model.parameters()).device)
+    if atlas is None:
+        atlas = load_atlas_data(str(DEFAULT_ATLAS_PATH))
+
+    image = prepare_image(image_path, None, remove_bg, foreground_ratio, rembg_session)
+    logging.info("Memulai inferensi model TripoSR...")
+    with torch.no_grad():
+        scene_codes = model([image], device=device)
+    mesh, texture = None, None
+    if voxel_mode == "mesh" or any(a in MESH_ARTIFACTS for a in artifacts):
+        mesh, texture = bake_textured_mesh(
+            model, scene_codes, resolution, texture_resolution,
+            decimate_faces=decimation_target(max_blocks) if decimate else None
+        )
+
+    if voxel_mode == "triplane":
+        voxel_mesh, solid_grid = TriplaneVoxeliser(
+            model, threshold=voxel_threshold, supersample=supersample
+        ).run(scene_codes, max_blocks, fill)
+    else:
+        voxel_mesh, solid_grid = BasicGridVoxeliser().run(mesh, texture, max_blocks, fill)
+    visibility_grid = calculate_face_visibility(solid_grid)
+    block_mesh = map_voxels_to_blocks(voxel_mesh, visibility_grid, atlas)
+
+    paths = write_artifacts(output_dir, artifacts, mesh, texture, voxel_mesh, solid_grid, block_mesh) if artifacts else {}
+    return PipelineResult(mesh, texture, voxel_mesh, solid_grid, block_mesh, paths)
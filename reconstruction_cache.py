@@ -0,0 +1,134 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import uuid
+from pathlib import Path
+
+from PIL import Image
+
+# =========================================================================================
+# CACHE REKONSTRUKSI BERBASIS KONTEN
+# =========================================================================================
+
+def _link_or_copy(src: Path, dst: Path):
+    # Hardlink agar tidak ada salinan data; fallback ke copy jika beda filesystem
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+class ReconstructionCache:
+    """
+    Cache hasil /reconstruct di disk, dengan kunci hash dari piksel gambar yang sudah
+    di-decode ditambah parameter rekonstruksi. Setiap entri adalah satu direktori
+    berisi artefak sesi; entri paling lama tidak dipakai dihapus saat total ukuran
+    melebihi `max_bytes` (LRU berdasarkan mtime direktori).
+    """
+    # Artefak bawaan (OBJ); pemanggil dapat memberi daftar lain per format output
+    ARTIFACTS = ("model.obj", "material.mtl", "baked_texture.png")
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ReconstructionCache":
+        return cls(
+            root=os.environ.get("RECON_CACHE_DIR", "cache"),
+            max_bytes=int(float(os.environ.get("RECON_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+        )
+
+    @staticmethod
+    def make_key(image_path: str, **params) -> str:
+        """
+        Hash piksel hasil decode (bukan byte file) sehingga file yang sama dengan
+        metadata/kompresi berbeda tetap menghasilkan kunci yang sama.
+        """
+        h = hashlib.sha256()
+        with Image.open(image_path) as img:
+            img.load()
+            h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}".encode())
+            h.update(img.tobytes())
+        h.update(json.dumps(params, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def _is_complete(self, entry: Path, artifacts=None) -> bool:
+        return all((entry / name).exists() for name in (artifacts or self.ARTIFACTS))
+
+    def lookup(self, key: str, dest_dir: Path, artifacts=None) -> bool:
+        """Menautkan artefak cache ke dest_dir. Mengembalikan True jika cache hit."""
+        with self._lock:
+            entry = self._entry_dir(key)
+            if not entry.is_dir() or not self._is_complete(entry, artifacts):
+                return False
+            os.makedirs(dest_dir, exist_ok=True)
+            linked = []
+            try:
+                for name in os.listdir(entry):
+                    _link_or_copy(entry / name, Path(dest_dir) / name)
+                    linked.append(Path(dest_dir) / name)
+                os.utime(entry)
+            except FileNotFoundError:
+                # Entri sedang dihapus oleh proses lain (eviction): anggap miss, buang tautan parsial
+                for path in linked:
+                    path.unlink(missing_ok=True)
+                return False
+            return True
+
+    def store(self, key: str, src_dir: Path, artifacts=None):
+        artifacts = tuple(artifacts or self.ARTIFACTS)
+        src_dir = Path(src_dir)
+        if not all((src_dir / name).exists() for name in artifacts):
+            logging.warning(f"Artefak rekonstruksi tidak lengkap di {src_dir}, tidak disimpan ke cache.")
+            return
+        with self._lock:
+            entry = self._entry_dir(key)
+            if entry.is_dir() and self._is_complete(entry, artifacts):
+                os.utime(entry)
+                return
+            # Tulis ke direktori sementara lalu rename agar entri tidak pernah setengah jadi
+            staging = self.root / f".staging-{uuid.uuid4().hex}"
+            os.makedirs(staging)
+            try:
+                for name in artifacts:
+                    _link_or_copy(src_dir / name, staging / name)
+                if entry.exists():
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.rename(staging, entry)
+            except OSError:
+                # Worker lain mungkin baru saja menulis entri yang sama
+                shutil.rmtree(staging, ignore_errors=True)
+                if not self._is_complete(entry, artifacts):
+                    raise
+            self._evict()
+
+    def _entry_size(self, entry: Path) -> int:
+        return sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in self.root.iterdir():
+            if not entry.is_dir() or entry.name.startswith(".staging-"):
+                continue
+            size = self._entry_size(entry)
+            entries.append((entry.stat().st_mtime, size, entry))
+            total += size
+
+        entries.sort(key=lambda e: e[0])
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logging.info(f"Cache rekonstruksi: menghapus entri {entry.name[:12]} (LRU).")
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from core_voxelizer import VoxelMesh
+from block_mapper import BlockMesh
+
+# =========================================================================================
+# PENYIMPANAN SESI BERSAMA ANTAR WORKER (SQLITE + .NPY MEMORY-MAPPED)
+# =========================================================================================
+
+# Perkiraan kasar overhead objek Python per voxel / blok (key string, dataclass RGBA/Vector3, slot dict/list)
+VOXEL_OVERHEAD_BYTES = 250
+BLOCK_OVERHEAD_BYTES = 400
+STATE_DIRNAME = "state"
+# Versi sebelumnya dipertahankan agar worker yang baru membaca nomor versinya tetap menemukan berkasnya
+KEEP_PREVIOUS_VERSIONS = 1
+
+def estimate_entry_nbytes(entry: dict) -> int:
+    total = 0
+    voxel_mesh = entry.get('voxel_mesh')
+    if voxel_mesh is not None:
+        total += voxel_mesh.get_voxel_count() * VOXEL_OVERHEAD_BYTES
+    solid_grid = entry.get('solid_grid')
+    # solid_grid hasil memory-map tidak menempati memori proses
+    if solid_grid is not None and not isinstance(solid_grid, np.memmap):
+        total += solid_grid.nbytes
+    block_mesh = entry.get('block_mesh')
+    if block_mesh is not None:
+        total += len(block_mesh.get_blocks()) * BLOCK_OVERHEAD_BYTES
+    return total
+
+def _entry_to_arrays(entry: dict) -> tuple[dict, dict]:
+    arrays, meta = {}, {}
+    voxel_mesh = entry.get('voxel_mesh')
+    if voxel_mesh is not None:
+        arrays['voxel_coords'], arrays['voxel_colours'] = voxel_mesh.to_arrays()
+    if entry.get('solid_grid') is not None:
+        arrays['solid_grid'] = np.asarray(entry['solid_grid'], dtype=bool)
+    block_mesh = entry.get('block_mesh')
+    if block_mesh is not None:
+        positions, name_ids, names, colours = block_mesh.to_arrays()
+        arrays['block_positions'] = positions
+        arrays['block_name_ids'] = name_ids
+        arrays['block_colours'] = colours
+        meta['block_names'] = names
+    return arrays, meta
+
+def _entry_from_arrays(arrays: dict, meta: dict) -> dict:
+    entry = {}
+    voxel_mesh = None
+    if 'voxel_coords' in arrays:
+        voxel_mesh = VoxelMesh.from_arrays(arrays['voxel_coords'], arrays['voxel_colours'])
+        entry['voxel_mesh'] = voxel_mesh
+    if 'solid_grid' in arrays:
+        entry['solid_grid'] = arrays['solid_grid']
+    if 'block_positions' in arrays and voxel_mesh is not None:
+        entry['block_mesh'] = BlockMesh.from_arrays(
+            voxel_mesh, arrays['block_positions'], arrays['block_name_ids'],
+            meta['block_names'], arrays['block_colours']
+        )
+    return entry
+
+class SessionStore:
+    """
+    Pengganti dict SESSION_STORAGE yang aman dipakai beberapa worker uvicorn.
+    Setiap `set` ditulis langsung ke `temp/<sesi>/state/v<versi>/*.npy` dan metadatanya
+    (versi, daftar array, nama blok) ke SQLite. Worker mana pun dapat membaca sesi itu:
+    array di-memory-map tanpa salinan, lalu objek VoxelMesh/BlockMesh dibangun ulang.
+    Setiap proses menyimpan cache LRU lokal berbatas `memory_budget_bytes` yang
+    divalidasi terhadap nomor versi di SQLite.
+    """
+    def __init__(self, base_dir: str, db_path: str, memory_budget_bytes: int):
+        self.base_dir = Path(base_dir)
+        self.db_path = db_path
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries: "OrderedDict[str, tuple[int, dict]]" = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._used = 0
+        self._lock = threading.RLock()
+        self._init_db()
+
+    @classmethod
+    def from_env(cls, base_dir: str) -> "SessionStore":
+        budget_mb = float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "1024"))
+        # Database disimpan di luar TEMP_DIR agar tidak ikut tersaji lewat /temp
+        db_path = os.environ.get("SESSION_DB_PATH", "sessions.db")
+        return cls(base_dir, db_path, int(budget_mb * 1024 * 1024))
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used
+
+    # --- SQLite ---
+
+    def _connect(self) -> sqlite3.Connection:
+        # Koneksi pendek per operasi: aman lintas thread dan lintas proses
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " meta TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+        conn.close()
+
+    def _read_row(self, session_id: str) -> Optional[tuple[int, dict]]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT version, meta FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    # --- API publik ---
+
+    def _state_dir(self, session_id: str) -> Path:
+        return self.base_dir / session_id / STATE_DIRNAME
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._read_row(session_id) is not None
+
+    def get(self, session_id: str) -> Optional[dict]:
+        row = self._read_row(session_id)
+        while row is not None:
+            version, meta = row
+            with self._lock:
+                cached = self._entries.get(session_id)
+                if cached is not None and cached[0] == version:
+                    self._entries.move_to_end(session_id)
+                    return dict(cached[1])
+            entry = self._load(session_id, version, meta)
+            if entry is not None:
+                with self._lock:
+                    self._put(session_id, version, entry)
+                return dict(entry)
+            # Berkas hilang: ulangi hanya bila sementara itu worker lain menulis versi baru
+            newer = self._read_row(session_id)
+            if newer is None or newer[0] == version:
+                return None
+            row = newer
+        with self._lock:
+            self._drop(session_id)
+        return None
+
+    def set(self, session_id: str, entry: dict):
+        arrays, meta = _entry_to_arrays(entry)
+        meta['arrays'] = sorted(arrays)
+        state_dir = self._state_dir(session_id)
+        os.makedirs(state_dir, exist_ok=True)
+        # Array ditulis ke direktori sementara di luar transaksi; kunci tulis SQLite hanya
+        # dipegang selama memilih nomor versi, rename direktori, dan INSERT
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=state_dir))
+        try:
+            for name, array in arrays.items():
+                np.save(tmp_dir / f"{name}.npy", array)
+            conn = self._connect()
+            try:
+                # BEGIN IMMEDIATE: kunci tulis agar dua worker tidak memakai nomor versi yang sama
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                version = (row[0] if row else 0) + 1
+                version_dir = state_dir / f"v{version}"
+                # Sisa tulisan yang gagal sebelum commit
+                shutil.rmtree(version_dir, ignore_errors=True)
+                os.rename(tmp_dir, version_dir)
+                tmp_dir = version_dir
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, version, meta, updated_at) VALUES (?, ?, ?, ?)",
+                    (session_id, version, json.dumps(meta), time.time())
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._remove_old_versions(session_id, keep=version)
+        with self._lock:
+            self._put(session_id, version, dict(entry))
+
+    def update(self, session_id: str, **values):
+        entry = self.get(session_id) or {}
+        entry.update(values)
+        self.set(session_id, entry)
+
+    def delete(self, session_id: str):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        finally:
+            conn.close()
+        with self._lock:
+            self._drop(session_id)
+        shutil.rmtree(self._state_dir(session_id), ignore_errors=True)
+
+    def flush(self):
+        # Semua penulisan sudah langsung ke disk; cukup kosongkan cache lokal
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._used = 0
+
+    # --- Internal ---
+
+    def _load(self, session_id: str, version: int, meta: dict) -> Optional[dict]:
+        version_dir = self._state_dir(session_id) / f"v{version}"
+        try:
+            arrays = {
+                name: np.load(version_dir / f"{name}.npy", mmap_mode='r', allow_pickle=False)
+                for name in meta.get('arrays', [])
+            }
+        except FileNotFoundError:
+            logging.warning(f"[{session_id}] Berkas state versi {version} tidak ditemukan.")
+            return None
+        return _entry_from_arrays(arrays, meta)
+
+    def _remove_old_versions(self, session_id: str, keep: int):
+        # Pembaca lain yang masih me-mmap versi lama tetap aman (file di-unlink, bukan ditimpa);
+        # direktori ".tmp-*" milik penulis yang sedang berjalan tidak disentuh
+        state_dir = self._state_dir(session_id)
+        for version_dir in state_dir.glob("v*"):
+            try:
+                version = int(version_dir.name[1:])
+            except ValueError:
+                continue
+            if version < keep - KEEP_PREVIOUS_VERSIONS:
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+    def _put(self, session_id: str, version: int, entry: dict):
+        self._drop(session_id)
+        size = estimate_entry_nbytes(entry)
+        self._entries[session_id] = (version, entry)
+        self._sizes[session_id] = size
+        self._used += size
+        self._evict(keep=session_id)
+
+    def _drop(self, session_id: str):
+        if session_id in self._entries:
+            del self._entries[session_id]
+            self._used -= self._sizes.pop(session_id)
+
+    def _evict(self, keep: str):
+        # Data sudah ada di disk, jadi eviksi cukup membuang salinan di memori
+        while self._used > self.memory_budget_bytes and len(self._entries) > 1:
+            session_id = next(iter(self._entries))
+            if session_id == keep:
+                break
+            self._drop(session_id)
+            logging.info(f"[{session_id}] Sesi dikeluarkan dari cache memori ({self._used / 2**20:.1f} MB terpakai).")
@@ -0,0 +1,202 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import trimesh
+from PIL import Image
+
+from core_voxelizer import BasicGridVoxeliser, VoxelMesh
+from block_mapper import BlockMesh, load_atlas_data, calculate_face_visibility, map_voxels_to_blocks
+
+# =========================================================================================
+# ARRAY DI SHARED MEMORY
+# =========================================================================================
+
+@dataclass(frozen=True)
+class SharedArrayRef:
+    """Deskripsi ringan (nama segmen, shape, dtype) yang dikirim antar proses menggantikan data."""
+    name: str
+    shape: tuple
+    dtype: str
+
+def share_array(array: np.ndarray) -> tuple[shared_memory.SharedMemory, SharedArrayRef]:
+    array = np.ascontiguousarray(array)
+    # SharedMemory tidak menerima ukuran 0
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, SharedArrayRef(name=shm.name, shape=array.shape, dtype=array.dtype.str)
+
+def attach_array(ref: SharedArrayRef) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    shm = shared_memory.SharedMemory(name=ref.name)
+    return shm, np.ndarray(ref.shape, dtype=np.dtype(ref.dtype), buffer=shm.buf)
+
+def take_array(ref: SharedArrayRef) -> np.ndarray:
+    """Menyalin array keluar dari segmen lalu membebaskan segmen tersebut (untuk hasil dari worker)."""
+    shm, view = attach_array(ref)
+    try:
+        return view.copy()
+    finally:
+        del view
+        shm.close()
+        shm.unlink()
+
+def _release(segments: list[shared_memory.SharedMemory], unlink: bool):
+    for shm in segments:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+def _share_outputs(arrays: list[np.ndarray]) -> list[SharedArrayRef]:
+    # Dipanggil di worker: segmen hasil dilepas (close) tapi tidak di-unlink, pemiliknya pindah ke proses induk
+    refs = []
+    for array in arrays:
+        shm, ref = share_array(array)
+        shm.close()
+        refs.append(ref)
+    return refs
+
+# =========================================================================================
+# FUNGSI WORKER (dijalankan di proses anak)
+# =========================================================================================
+
+_WORKER_ATLAS = None
+
+def _init_worker(atlas_path: str):
+    global _WORKER_ATLAS
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(message)s')
+    _WORKER_ATLAS = load_atlas_data(atlas_path)
+
+def _voxelize_job(vertices_ref, faces_ref, uv_ref, texture_ref, max_blocks: int, fill: bool):
+    segments, arrays = [], []
+    for ref in (vertices_ref, faces_ref, uv_ref, texture_ref):
+        shm, array = attach_array(ref)
+        segments.append(shm)
+        arrays.append(array)
+    try:
+        vertices, faces, uv, texture = (a.copy() for a in arrays)
+    finally:
+        del arrays
+        _release(segments, unlink=False)
+
+    mesh = trimesh.Trimesh(
+        vertices=vertices, faces=faces, visual=trimesh.visual.TextureVisuals(uv=uv), process=False
+    )
+    texture_img = Image.fromarray(texture)
+    voxel_mesh, solid_grid = BasicGridVoxeliser().run(mesh, texture_img, max_blocks, fill)
+    coords, colours = voxel_mesh.to_arrays()
+    return _share_outputs([coords, colours, np.asarray(solid_grid, dtype=bool)])
+
+def _map_blocks_job(coords_ref, colours_ref, solid_ref):
+    segments, arrays = [], []
+    for ref in (coords_ref, colours_ref, solid_ref):
+        shm, array = attach_array(ref)
+        segments.append(shm)
+        arrays.append(array)
+    try:
+        coords, colours, solid_grid = (a.copy() for a in arrays)
+    finally:
+        del arrays
+        _release(segments, unlink=False)
+
+    voxel_mesh = VoxelMesh.from_arrays(coords, colours)
+    visibility_grid = calculate_face_visibility(solid_grid)
+    block_mesh = map_voxels_to_blocks(voxel_mesh, visibility_grid, _WORKER_ATLAS)
+    positions, name_ids, names, block_colours = block_mesh.to_arrays()
+    return _share_outputs([positions, name_ids, block_colours]), names
+
+# =========================================================================================
+# KONVERSI DI PROSES INDUK (dijalankan lewat asyncio.to_thread)
+# =========================================================================================
+
+def _share_voxelize_inputs(mesh: trimesh.Trimesh, texture: Image.Image):
+    inputs = [
+        np.asarray(mesh.vertices, dtype=np.float64),
+        np.asarray(mesh.faces, dtype=np.int64),
+        np.asarray(mesh.visual.uv, dtype=np.float64),
+        np.asarray(texture.convert("RGB"), dtype=np.uint8),
+    ]
+    return tuple(zip(*(share_array(a) for a in inputs)))
+
+def _take_voxelize_outputs(out_refs) -> tuple[VoxelMesh, np.ndarray]:
+    coords, colours, solid_grid = (take_array(ref) for ref in out_refs)
+    return VoxelMesh.from_arrays(coords, colours), solid_grid
+
+def _share_map_blocks_inputs(voxel_mesh: VoxelMesh, solid_grid: np.ndarray):
+    coords, colours = voxel_mesh.to_arrays()
+    return tuple(zip(*(share_array(a) for a in (coords, colours, np.asarray(solid_grid, dtype=bool)))))
+
+def _take_map_blocks_outputs(voxel_mesh: VoxelMesh, out_refs, names) -> BlockMesh:
+    positions, name_ids, block_colours = (take_array(ref) for ref in out_refs)
+    return BlockMesh.from_arrays(voxel_mesh, positions, name_ids, names, block_colours)
+
+# =========================================================================================
+# POOL PROSES UNTUK TAHAP CPU-BOUND
+# =========================================================================================
+
+class StageProcessPool:
+    """
+    Menjalankan vokselisasi dan pemetaan blok (loop Python murni yang menahan GIL)
+    di pool proses sehingga sesi paralel memakai semua core. Grid voxel dan array
+    warna berpindah antar proses lewat shared memory, bukan pickle objek VoxelMesh.
+    """
+    def __init__(self, processes: int, atlas_path: str):
+        self.processes = max(1, processes)
+        self.atlas_path = atlas_path
+        self._pool = None
+
+    @classmethod
+    def from_env(cls, atlas_path: str) -> "StageProcessPool":
+        processes = os.environ.get("STAGE_PROCESSES")
+        if processes is None:
+            # Tiap worker uvicorn punya pool sendiri: bagi core di antara worker (WEB_CONCURRENCY)
+            # agar total proses tidak menjadi cpu_count x jumlah worker
+            web_workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+            return cls(max(1, (os.cpu_count() or 1) // web_workers), atlas_path)
+        return cls(int(processes), atlas_path)
+
+    def start(self):
+        if self._pool is not None:
+            return
+        # spawn: jangan mewarisi state torch/thread dari proses server
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.atlas_path,),
+        )
+        logging.info(f"Pool proses tahap CPU aktif dengan {self.processes} worker.")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def _submit(self, fn, *args):
+        if self._pool is None:
+            self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    # Konversi objek <-> array (loop per voxel/blok) dan penyalinan ke shared memory
+    # berjalan lewat asyncio.to_thread agar tidak menahan event loop
+
+    async def voxelize(self, mesh: trimesh.Trimesh, texture: Image.Image, max_blocks: int, fill: bool) -> tuple[VoxelMesh, np.ndarray]:
+        segments, refs = await asyncio.to_thread(_share_voxelize_inputs, mesh, texture)
+        try:
+            out_refs = await self._submit(_voxelize_job, *refs, max_blocks, fill)
+        finally:
+            _release(list(segments), unlink=True)
+        return await asyncio.to_thread(_take_voxelize_outputs, out_refs)
+
+    async def map_blocks(self, voxel_mesh: VoxelMesh, solid_grid: np.ndarray) -> BlockMesh:
+        segments, refs = await asyncio.to_thread(_share_map_blocks_inputs, voxel_mesh, solid_grid)
+        try:
+            out_refs, names = await self._submit(_map_blocks_job, *refs)
+        finally:
+            _release(list(segments), unlink=True)
+        return await asyncio.to_thread(_take_map_blocks_outputs, voxel_mesh, out_refs, names)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul aplikasi (main.py, session_store.py, ...) berada di root repo, bukan di paket
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+torch = pytest.importorskip("torch")
+utils = pytest.importorskip("tsr.utils")
+
+
+def _row_wise(x, scale=1.0):
+    return {"sum": x.sum(dim=-1, keepdim=True) * scale, "double": x * 2, "none": None}
+
+
+@pytest.mark.parametrize("n_rows", [0, 1, 7, 100])
+def test_chunk_batch_with_executor_matches_sequential(n_rows):
+    x = torch.randn(n_rows, 3)
+    sequential = utils.chunk_batch(_row_wise, 8, x, scale=0.5)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        parallel = utils.chunk_batch(_row_wise, 8, x, scale=0.5, executor=executor)
+    assert sequential.keys() == parallel.keys()
+    assert parallel["none"] is None
+    for key in ("sum", "double"):
+        torch.testing.assert_close(parallel[key], sequential[key], rtol=0, atol=0)
+    torch.testing.assert_close(sequential["double"], x * 2)
+
+
+def test_chunk_batch_forwards_grad_mode_to_workers():
+    x = torch.randn(20, 3, requires_grad=True)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with torch.no_grad():
+            out = utils.chunk_batch(lambda t: t * 2, 4, x, executor=executor)
+        assert not out.requires_grad
+        out = utils.chunk_batch(lambda t: t * 2, 4, x, executor=executor)
+    out.sum().backward()
+    torch.testing.assert_close(x.grad, torch.full_like(x, 2.0))
+
+
+def test_chunk_executor_keeps_process_thread_count():
+    pytest.importorskip("threadpoolctl")
+    before = torch.get_num_threads()
+    executor = utils.make_chunk_executor(2, 1)
+    try:
+        list(executor.map(lambda _: torch.ones(64, 64) @ torch.ones(64, 64), range(4)))
+        assert torch.get_num_threads() == before
+        # a thread started after the pool (e.g. asyncio.to_thread) keeps the default too
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(torch.get_num_threads()))
+        thread.start()
+        thread.join()
+        assert seen == [before]
+    finally:
+        executor.shutdown(wait=True)
+
+
+def test_default_chunk_workers_splits_cores_across_replicas(monkeypatch):
+    monkeypatch.setattr(utils.os, "cpu_count", lambda: 32)
+    workers, threads = utils.default_chunk_workers("cpu")
+    assert workers * threads <= 32
+    for replicas in (2, 4):
+        workers, threads = utils.default_chunk_workers("cpu", replicas)
+        assert workers * threads <= 32 // replicas
+    assert utils.default_chunk_workers("cpu", 8) == (1, 4)
@@ -0,0 +1,105 @@
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+inference_batcher = pytest.importorskip("inference_batcher")
+
+TIMEOUT = 10
+
+
+class _GatedRegistry:
+    """Registry tiruan satu replika: model menunggu `gate` dan mencatat ukuran tiap batch."""
+    replicas = 1
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.batch_sizes = []
+        self._free = threading.Semaphore(self.replicas)
+
+    def _model(self, images, device=None):
+        self.batch_sizes.append(len(images))
+        self.entered.set()
+        assert self.gate.wait(TIMEOUT)
+        return torch.arange(len(images), dtype=torch.float32).view(-1, 1)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        with self._free:
+            yield SimpleNamespace(index=0, model=self._model, device="cpu")
+
+
+def test_requests_queued_while_replica_busy_are_batched():
+    registry = _GatedRegistry()
+    batcher = inference_batcher.InferenceBatcher(registry, max_batch_size=2, window_ms=0)
+    try:
+        first = batcher.submit("a")
+        assert registry.entered.wait(TIMEOUT)
+        pending = [batcher.submit(name) for name in "bcd"]
+        registry.gate.set()
+        assert first.result(TIMEOUT).shape == (1, 1)
+        results = [f.result(TIMEOUT) for f in pending]
+    finally:
+        batcher.stop()
+    assert registry.batch_sizes == [1, 2, 1]
+    # tiap pemanggil menerima barisnya sendiri dari batch
+    assert [float(r) for r in results] == [0.0, 1.0, 0.0]
+
+
+def test_stop_resolves_every_pending_request():
+    registry = _GatedRegistry()
+    batcher = inference_batcher.InferenceBatcher(registry, max_batch_size=4, window_ms=0)
+    first = batcher.submit("a")
+    assert registry.entered.wait(TIMEOUT)
+    pending = [batcher.submit(name) for name in "bc"]
+    # permintaan yang terselip di belakang sentinel tidak pernah diambil dispatcher
+    late = inference_batcher._PendingRequest(image="late")
+    batcher._queue.put(None)
+    batcher._queue.put(late)
+
+    threading.Timer(0.1, registry.gate.set).start()
+    batcher.stop()
+
+    assert first.result(TIMEOUT).shape == (1, 1)
+    assert all(f.result(TIMEOUT).shape == (1, 1) for f in pending)
+    with pytest.raises(RuntimeError):
+        late.future.result(TIMEOUT)
+
+
+def test_submit_after_stop_restarts_batcher():
+    registry = _GatedRegistry()
+    registry.gate.set()
+    batcher = inference_batcher.InferenceBatcher(registry, max_batch_size=2, window_ms=0)
+    assert batcher.infer("a").shape == (1, 1)
+    batcher.stop()
+    try:
+        assert batcher.submit("b").result(TIMEOUT).shape == (1, 1)
+    finally:
+        batcher.stop()
+
+
+def test_failed_submit_releases_replica_slot():
+    registry = _GatedRegistry()
+    registry.gate.set()
+    batcher = inference_batcher.InferenceBatcher(registry, max_batch_size=1, window_ms=0)
+    batcher.start()
+    executor_submit = batcher._executor.submit
+    calls = []
+
+    def flaky_submit(fn, *args):
+        calls.append(fn)
+        if len(calls) == 1:
+            raise RuntimeError("executor penuh")
+        return executor_submit(fn, *args)
+
+    batcher._executor.submit = flaky_submit
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.submit("a").result(TIMEOUT)
+        # slot replika sudah dikembalikan, jadi permintaan berikutnya tetap dilayani
+        assert batcher.submit("b").result(TIMEOUT).shape == (1, 1)
+    finally:
+        batcher.stop()
@@ -0,0 +1,73 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("skimage")
+
+from tsr.models.isosurface import MarchingCubeHelper, seam_planes
+
+RESOLUTION = 41
+
+
+def _sphere_level(radius, resolution=RESOLUTION):
+    # level > 0 inside, as produced by TSR.extract_mesh (density - threshold)
+    axis = torch.linspace(-1, 1, resolution)
+    x, y, z = torch.meshgrid(axis, axis, axis, indexing="ij")
+    return radius - torch.sqrt(x**2 + y**2 + z**2)
+
+
+def _polygonize(volume, workers):
+    return MarchingCubeHelper(RESOLUTION, workers=workers, use_processes=False).polygonize(volume)
+
+
+def _edge_counts(faces):
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    return np.unique(edges, axis=0, return_counts=True)[1]
+
+
+# 0.6 puts grid values exactly on the surface (coincident vertices within a slab)
+@pytest.mark.parametrize("radius", [0.6, 0.61])
+def test_welded_slabs_have_single_slab_topology(radius):
+    volume = (-_sphere_level(radius)).numpy()
+    single_verts, single_faces = _polygonize(volume, 1)
+    welded_verts, welded_faces = _polygonize(volume, 4)
+
+    assert len(welded_verts) == len(single_verts)
+    assert len(welded_faces) == len(single_faces)
+    # every edge of the closed surface is shared by exactly two triangles
+    assert (_edge_counts(single_faces) == 2).all()
+    assert (_edge_counts(welded_faces) == 2).all()
+
+
+def test_welded_slabs_match_single_slab_geometry():
+    spatial = pytest.importorskip("scipy.spatial")
+    # no grid value on the surface, so every vertex has a unique position
+    volume = (-_sphere_level(0.61)).numpy()
+    single_verts, single_faces = _polygonize(volume, 1)
+    welded_verts, welded_faces = _polygonize(volume, 4)
+
+    distance, index = spatial.KDTree(single_verts).query(welded_verts)
+    assert distance.max() < 1e-4
+    assert len(np.unique(index)) == len(index)
+    as_sets = lambda faces: {frozenset(face) for face in faces.tolist()}
+    assert as_sets(index[welded_faces]) == as_sets(single_faces)
+
+
+def test_seams_avoid_planes_with_exact_zeros():
+    volume = np.ones((41, 5, 5), dtype=np.float32)
+    volume[20, 2, 2] = 0.0
+    bounds = seam_planes(volume, 4)
+    assert bounds[0] == 0 and bounds[-1] == 40
+    assert 20 not in bounds
+    assert len(bounds) == 5 and (np.diff(bounds) > 0).all()
+
+
+def test_forward_returns_outward_mesh_on_level_device():
+    level = _sphere_level(0.6)
+    helper = MarchingCubeHelper(RESOLUTION, workers=4, use_processes=False)
+    v_pos, t_pos_idx = helper(level.reshape(-1))
+    assert v_pos.device == level.device and t_pos_idx.dtype == torch.long
+    assert float(v_pos.min()) >= 0.0 and float(v_pos.max()) <= 1.0
+    tri = v_pos[t_pos_idx].double() - 0.5
+    signed_volume = (tri[:, 0] * torch.cross(tri[:, 1], tri[:, 2], dim=-1)).sum()
+    assert signed_volume > 0
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+job_queue = pytest.importorskip("job_queue")
+
+Job, JobManager, JobStore = job_queue.Job, job_queue.JobManager, job_queue.JobStore
+
+
+def _dead_owner():
+    # pid di atas batas pid Linux tidak mungkin hidup
+    return f"{job_queue.socket.gethostname()}:{2 ** 23}"
+
+
+def test_jobs_of_dead_worker_fail_on_startup(tmp_path):
+    store = JobStore(str(tmp_path / "sessions.db"))
+    store.save(Job(id="orphan", stage="reconstruct", status=job_queue.JOB_RUNNING, owner=_dead_owner()))
+    store.save(Job(id="done", stage="export", status=job_queue.JOB_DONE, owner=_dead_owner()))
+    store.save(Job(id="remote", stage="export", status=job_queue.JOB_RUNNING, owner="host-lain:1"))
+
+    manager = JobManager({"reconstruct": 1, "export": 1}, store=store)
+    assert manager.fail_orphaned_jobs() == 1
+    assert store.load("orphan").status == job_queue.JOB_FAILED
+    assert store.load("orphan").error == JobManager.ORPHAN_ERROR
+    assert store.load("done").status == job_queue.JOB_DONE
+    # host lain tidak bisa diperiksa pid-nya
+    assert store.load("remote").status == job_queue.JOB_RUNNING
+
+
+def test_get_fails_job_of_dead_worker(tmp_path):
+    store = JobStore(str(tmp_path / "sessions.db"))
+    manager = JobManager({"reconstruct": 1}, store=store)
+    store.save(Job(id="orphan", stage="reconstruct", status=job_queue.JOB_QUEUED, owner=_dead_owner()))
+    job = manager.get("orphan")
+    assert job.status == job_queue.JOB_FAILED
+    assert store.load("orphan").status == job_queue.JOB_FAILED
+
+
+def test_stale_jobs_fail_after_timeout(tmp_path):
+    store = JobStore(str(tmp_path / "sessions.db"))
+    store.save(Job(id="stale", stage="reconstruct", status=job_queue.JOB_RUNNING,
+                   owner="host-lain:1", updated_at=time.time() - 7200))
+    store.save(Job(id="fresh", stage="reconstruct", status=job_queue.JOB_RUNNING, owner="host-lain:1"))
+    manager = JobManager({"reconstruct": 1}, store=store, stale_seconds=3600)
+    assert manager.get("stale").status == job_queue.JOB_FAILED
+    assert manager.get("fresh").status == job_queue.JOB_RUNNING
+
+
+def test_reused_pid_does_not_keep_job_alive(tmp_path):
+    store = JobStore(str(tmp_path / "sessions.db"))
+    # Proses lama dengan pid yang sama seperti proses ini (restart container)
+    store.save(Job(id="old", stage="reconstruct", status=job_queue.JOB_RUNNING))
+    manager = JobManager({"reconstruct": 1}, store=store)
+    assert manager.get("old").status == job_queue.JOB_FAILED
@@ -0,0 +1,31 @@
+import pytest
+
+trimesh = pytest.importorskip("trimesh")
+
+from mesh_decimation import (
+    MIN_TARGET_FACES, decimate_mesh, decimated_max_blocks, decimation_target, write_decimation_info,
+)
+
+
+def test_target_grows_with_build_size():
+    assert decimation_target(0) == 0
+    assert decimation_target(16) == MIN_TARGET_FACES
+    assert decimation_target(380) > decimation_target(128) > MIN_TARGET_FACES
+
+
+def test_decimate_mesh_reaches_target():
+    pytest.importorskip("fast_simplification")
+    mesh = trimesh.creation.icosphere(subdivisions=5)
+    simplified = decimate_mesh(mesh, 2000)
+    assert len(simplified.faces) <= 2000
+    # Mesh yang sudah ringan dikembalikan apa adanya
+    assert decimate_mesh(simplified, 2000) is simplified
+
+
+def test_decimation_info_pins_max_blocks(tmp_path):
+    assert decimated_max_blocks(str(tmp_path)) == 0
+    write_decimation_info(str(tmp_path), 128)
+    assert decimated_max_blocks(str(tmp_path)) == 128
+    # Ekstraksi ulang tanpa desimasi melepas batasnya
+    write_decimation_info(str(tmp_path), 0)
+    assert decimated_max_blocks(str(tmp_path)) == 0
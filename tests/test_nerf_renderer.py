@@ -0,0 +1,63 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("tsr.utils")
+
+from tsr.models.network_utils import NeRFMLP
+from tsr.models.nerf_renderer import TriplaneNeRFRenderer
+
+CHANNELS = 4
+RADIUS = 0.87
+
+
+def _toy_scene(num_samples_per_ray=32):
+    torch.manual_seed(0)
+    renderer = TriplaneNeRFRenderer(
+        {"radius": RADIUS, "density_activation": "exp", "num_samples_per_ray": num_samples_per_ray}
+    ).eval()
+    decoder = NeRFMLP({"in_channels": 3 * CHANNELS, "n_neurons": 16, "n_hidden_layers": 2}).eval()
+    triplane = torch.randn(3, CHANNELS, 8, 8)
+    return renderer, decoder, triplane
+
+
+def _rays(n_rays=64):
+    torch.manual_seed(1)
+    origins = torch.nn.functional.normalize(torch.randn(n_rays, 3), dim=-1) * 2.0
+    targets = (torch.rand(n_rays, 3) * 2 - 1) * RADIUS * 0.5
+    return origins, torch.nn.functional.normalize(targets - origins, dim=-1)
+
+
+def test_march_with_full_occupancy_matches_dense_forward():
+    renderer, decoder, triplane = _toy_scene()
+    renderer.set_ray_marching(occupancy_resolution=8, march_step=5, min_transmittance=0.0)
+    rays_o, rays_d = _rays()
+    occupancy = torch.ones(8, 8, 8, dtype=torch.bool)
+    with torch.no_grad():
+        dense = renderer._forward(decoder, triplane, rays_o, rays_d)
+        marched = renderer._forward(decoder, triplane, rays_o, rays_d, occupancy)
+    torch.testing.assert_close(marched, dense, rtol=1e-4, atol=1e-5)
+
+
+def test_march_with_built_grid_stays_close_to_dense_forward():
+    renderer, decoder, triplane = _toy_scene()
+    renderer.set_ray_marching(occupancy_resolution=16, occupancy_threshold=0.0)
+    rays_o, rays_d = _rays()
+    with torch.no_grad():
+        occupancy = renderer.build_occupancy_grid(decoder, triplane)
+        dense = renderer._forward(decoder, triplane, rays_o, rays_d)
+        marched = renderer._forward(decoder, triplane, rays_o, rays_d, occupancy)
+    assert occupancy.shape == (16, 16, 16)
+    # only the early termination (min_transmittance) separates the two paths here
+    torch.testing.assert_close(marched, dense, rtol=0, atol=1e-3)
+
+
+def test_march_skips_empty_occupancy():
+    renderer, decoder, triplane = _toy_scene()
+    renderer.set_ray_marching(occupancy_resolution=8)
+    rays_o, rays_d = _rays()
+    with torch.no_grad():
+        marched = renderer._forward(
+            decoder, triplane, rays_o, rays_d, torch.zeros(8, 8, 8, dtype=torch.bool)
+        )
+    # nothing is composited, so every ray shows the white background
+    torch.testing.assert_close(marched, torch.ones_like(marched))
@@ -0,0 +1,58 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+triposr_runner = pytest.importorskip("triposr_runner")
+
+
+class _CountingModel:
+    """Model tiruan: grid okupansi deterministik dari scene code, menghitung pembangunan ulang."""
+    def __init__(self, resolution=8, threshold=0.1):
+        self.renderer = SimpleNamespace(occupancy_resolution=resolution, occupancy_threshold=threshold)
+        self.builds = 0
+
+    def occupancy_grid(self, scene_code):
+        self.builds += 1
+        r = self.renderer.occupancy_resolution
+        values = scene_code.flatten()[: r ** 3].float()
+        values = torch.cat([values, values.new_zeros(r ** 3 - values.numel())])
+        return (values > self.renderer.occupancy_threshold).view(r, r, r)
+
+
+def _scene_code(seed=0):
+    torch.manual_seed(seed)
+    return torch.randn(1, 3, 4, 16, 16)
+
+
+def test_cached_grid_is_reused_while_settings_match(tmp_path):
+    model, scene_code = _CountingModel(), _scene_code()
+    first = triposr_runner.load_or_build_occupancy(model, scene_code, str(tmp_path))
+    second = triposr_runner.load_or_build_occupancy(model, scene_code, str(tmp_path))
+    assert model.builds == 1
+    assert torch.equal(first, second)
+    assert os.path.exists(tmp_path / triposr_runner.OCCUPANCY_FILENAME)
+
+
+@pytest.mark.parametrize("change", ["resolution", "threshold", "scene_code"])
+def test_cached_grid_is_rebuilt_when_settings_change(tmp_path, change):
+    model, scene_code = _CountingModel(), _scene_code()
+    triposr_runner.load_or_build_occupancy(model, scene_code, str(tmp_path))
+    if change == "resolution":
+        model.renderer.occupancy_resolution = 4
+    elif change == "threshold":
+        model.renderer.occupancy_threshold = 0.5
+    else:
+        scene_code = _scene_code(seed=1)
+    grid = triposr_runner.load_or_build_occupancy(model, scene_code, str(tmp_path))
+    assert model.builds == 2
+    assert torch.equal(grid, model.occupancy_grid(scene_code))
+
+
+def test_save_scene_code_invalidates_grid(tmp_path):
+    model, scene_code = _CountingModel(), _scene_code()
+    triposr_runner.save_scene_code(scene_code, str(tmp_path))
+    triposr_runner.load_or_build_occupancy(model, scene_code, str(tmp_path))
+    triposr_runner.save_scene_code(scene_code, str(tmp_path))
+    assert not os.path.exists(tmp_path / triposr_runner.OCCUPANCY_FILENAME)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+import torch.nn as nn
+
+from tsr.quantize import load_quantized, quantized_weight_path
+
+
+class TinyModel(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.backbone = nn.Linear(8, 8)
+        self.decoder = nn.Linear(8, 4)
+
+
+def _checkpoint(path, seed):
+    torch.manual_seed(seed)
+    torch.save(TinyModel().state_dict(), path)
+    return str(path)
+
+
+def test_cache_is_reused(tmp_path):
+    weight_path = _checkpoint(tmp_path / "model.ckpt", 0)
+    load_quantized(TinyModel(), weight_path)
+    cached = quantized_weight_path(weight_path)
+    assert os.path.exists(cached)
+
+    mtime = os.stat(cached).st_mtime_ns
+    model = load_quantized(TinyModel(), weight_path)
+    assert model.quantized
+    assert os.stat(cached).st_mtime_ns == mtime
+
+
+def test_updated_checkpoint_invalidates_cache(tmp_path):
+    weight_path = _checkpoint(tmp_path / "model.ckpt", 0)
+    first = quantized_weight_path(weight_path)
+    load_quantized(TinyModel(), weight_path)
+
+    _checkpoint(tmp_path / "model.ckpt", 1)
+    stat = os.stat(weight_path)
+    os.utime(weight_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert quantized_weight_path(weight_path) != first
+
+    x = torch.randn(2, 8)
+    model = load_quantized(TinyModel(), weight_path)
+    reference = load_quantized(TinyModel(), weight_path, cache=False)
+    assert torch.allclose(model.decoder(x), reference.decoder(x))
+
+
+def test_cache_dir(tmp_path):
+    weight_path = _checkpoint(tmp_path / "model.ckpt", 0)
+    cache_dir = tmp_path / "int8"
+    load_quantized(TinyModel(), weight_path, cache_dir=str(cache_dir))
+    assert os.path.dirname(quantized_weight_path(weight_path, str(cache_dir))) == str(cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_unwritable_cache_keeps_model(tmp_path):
+    weight_path = _checkpoint(tmp_path / "model.ckpt", 0)
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    model = load_quantized(TinyModel(), weight_path, cache_dir=str(blocker))
+    assert model.quantized
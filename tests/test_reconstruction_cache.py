@@ -0,0 +1,80 @@
+import shutil
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import reconstruction_cache
+from reconstruction_cache import ReconstructionCache
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "input.png"
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(path)
+    return str(path)
+
+
+def test_key_ignores_file_encoding(tmp_path, image_path):
+    # Piksel sama dalam format berbeda -> kunci sama
+    other = tmp_path / "input.bmp"
+    Image.open(image_path).save(other)
+    assert ReconstructionCache.make_key(image_path, resolution=256) == ReconstructionCache.make_key(str(other), resolution=256)
+
+
+def test_key_changes_with_model_config(image_path):
+    fp32 = {"device": "cpu", "precision": "fp32", "quantize": False, "backend": "torch",
+            "compile_mode": None, "mc_backend": "skimage"}
+    keys = {
+        ReconstructionCache.make_key(image_path, resolution=256, model=dict(fp32, **change))
+        for change in ({}, {"precision": "bf16"}, {"quantize": True}, {"backend": "onnx"},
+                       {"mc_backend": "torchmcubes"})
+    }
+    assert len(keys) == 5
+
+
+def test_registry_config_key_tracks_model_settings():
+    model_registry = pytest.importorskip("model_registry")
+    base = model_registry.ModelRegistry(device="cpu").config_key()
+    assert base == model_registry.ModelRegistry(device="cpu").config_key()
+    for kwargs in ({"precision": "bf16"}, {"quantize": True}, {"backend": "onnx"},
+                   {"compile_mode": "script"}, {"mc_backend": "torchmcubes"}):
+        assert model_registry.ModelRegistry(device="cpu", **kwargs).config_key() != base
+
+
+def test_store_and_lookup_roundtrip(tmp_path, image_path):
+    cache = ReconstructionCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    src = tmp_path / "session"
+    src.mkdir()
+    for name in ReconstructionCache.ARTIFACTS:
+        (src / name).write_bytes(name.encode())
+    key = ReconstructionCache.make_key(image_path, model={"precision": "fp32"})
+    other_key = ReconstructionCache.make_key(image_path, model={"precision": "bf16"})
+    cache.store(key, src)
+
+    dest = tmp_path / "hit"
+    assert cache.lookup(key, dest)
+    assert (dest / "model.obj").read_bytes() == b"model.obj"
+    assert not cache.lookup(other_key, tmp_path / "miss")
+
+
+def test_lookup_during_eviction_is_a_miss(tmp_path, image_path, monkeypatch):
+    cache = ReconstructionCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    src = tmp_path / "session"
+    src.mkdir()
+    for name in ReconstructionCache.ARTIFACTS:
+        (src / name).write_bytes(name.encode())
+    key = ReconstructionCache.make_key(image_path)
+    cache.store(key, src)
+
+    # Proses lain menghapus entri tepat setelah artefak pertama ditautkan
+    link = reconstruction_cache._link_or_copy
+
+    def link_then_evict(src_path, dst_path):
+        link(src_path, dst_path)
+        shutil.rmtree(tmp_path / "cache" / key)
+
+    monkeypatch.setattr(reconstruction_cache, "_link_or_copy", link_then_evict)
+    dest = tmp_path / "hit"
+    assert not cache.lookup(key, dest)
+    assert list(dest.iterdir()) == []
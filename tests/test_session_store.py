@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+session_store = pytest.importorskip("session_store")
+
+SessionStore = session_store.SessionStore
+
+
+def _store(tmp_path, budget=1 << 20):
+    return SessionStore(str(tmp_path / "temp"), str(tmp_path / "sessions.db"), budget)
+
+
+def _grid(value):
+    return np.full((2, 3, 4), value, dtype=bool)
+
+
+def _versions(store, session_id):
+    return sorted(p.name for p in store._state_dir(session_id).iterdir())
+
+
+def test_set_is_visible_to_other_worker(tmp_path):
+    writer, reader = _store(tmp_path), _store(tmp_path)
+    writer.set("s", {"solid_grid": _grid(True)})
+    assert "s" in reader
+    np.testing.assert_array_equal(reader.get("s")["solid_grid"], _grid(True))
+    writer.set("s", {"solid_grid": _grid(False)})
+    # Cache lokal pembaca divalidasi terhadap versi di SQLite
+    np.testing.assert_array_equal(reader.get("s")["solid_grid"], _grid(False))
+
+
+def test_previous_version_is_kept_and_no_temp_dirs_remain(tmp_path):
+    store = _store(tmp_path)
+    for i in range(3):
+        store.set("s", {"solid_grid": _grid(i % 2 == 0)})
+    assert _versions(store, "s") == ["v2", "v3"]
+
+
+def test_get_retries_when_version_is_replaced_during_read(tmp_path, monkeypatch):
+    reader, writer = _store(tmp_path), _store(tmp_path)
+    writer.set("s", {"solid_grid": _grid(True)})
+    load = reader._load
+
+    def racing_load(session_id, version, meta):
+        # Worker lain menulis dua versi baru: versi yang baru dibaca ikut terhapus
+        if version == 1:
+            writer.set("s", {"solid_grid": _grid(False)})
+            writer.set("s", {"solid_grid": _grid(False)})
+        return load(session_id, version, meta)
+
+    monkeypatch.setattr(reader, "_load", racing_load)
+    entry = reader.get("s")
+    assert entry is not None
+    np.testing.assert_array_equal(entry["solid_grid"], _grid(False))
+
+
+def test_delete_removes_row_and_files(tmp_path):
+    store = _store(tmp_path)
+    store.set("s", {"solid_grid": _grid(True)})
+    store.delete("s")
+    assert "s" not in store
+    assert store.get("s") is None
+    assert not store._state_dir("s").exists()
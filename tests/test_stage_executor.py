@@ -0,0 +1,19 @@
+import pytest
+
+stage_executor = pytest.importorskip("stage_executor")
+
+
+def test_default_pool_splits_cores_across_web_workers(monkeypatch):
+    monkeypatch.setattr(stage_executor.os, "cpu_count", lambda: 16)
+    monkeypatch.delenv("STAGE_PROCESSES", raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert stage_executor.StageProcessPool.from_env("atlas.png").processes == 4
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "32")
+    assert stage_executor.StageProcessPool.from_env("atlas.png").processes == 1
+
+
+def test_explicit_stage_processes_wins(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("STAGE_PROCESSES", "6")
+    assert stage_executor.StageProcessPool.from_env("atlas.png").processes == 6
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+triplane_voxelizer = pytest.importorskip("triplane_voxelizer")
+
+TriplaneVoxeliser = triplane_voxelizer.TriplaneVoxeliser
+
+
+class _SphereModel:
+    """Model tiruan: densitas turun linear dari pusat bola, warna tetap merah."""
+    def __init__(self, radius=0.87):
+        self.decoder = None
+        self.renderer = SimpleNamespace(cfg=SimpleNamespace(radius=radius), query_triplane=self._query)
+
+    def _query(self, decoder, positions, scene_code):
+        distance = positions.norm(dim=-1, keepdim=True)
+        colour = torch.tensor([1.0, 0.0, 0.0]).expand(positions.shape[0], 3)
+        return {"density_act": 100.0 * (1.0 - distance / 0.5), "color": colour}
+
+
+def _run(threshold=triplane_voxelizer.DEFAULT_THRESHOLD, supersample=triplane_voxelizer.DEFAULT_SUPERSAMPLE):
+    voxeliser = TriplaneVoxeliser(_SphereModel(), threshold=threshold, supersample=supersample)
+    return voxeliser.run(torch.zeros(1, 3, 1, 4, 4), max_blocks=16, fill=True)
+
+
+@pytest.mark.parametrize("threshold", [25.0, 75.0])
+def test_threshold_selects_sphere_filling_the_grid(threshold):
+    # densitas 25 di r=0.375, 75 di r=0.125: keduanya diskalakan ke max_blocks yang sama
+    voxel_mesh, solid = _run(threshold=threshold)
+    assert solid.any()
+    assert voxel_mesh.get_voxel_count() == int(solid.sum())
+    assert 12 <= max(solid.shape) <= 16
+    # bola: hampir simetris di ketiga sumbu
+    assert max(solid.shape) - min(solid.shape) <= 1
+
+
+def test_supersample_keeps_grid_and_colour():
+    voxel_mesh, single = _run(supersample=1)
+    _, multi = _run(supersample=3)
+    assert single.shape == multi.shape
+    _, colours = voxel_mesh.to_arrays()
+    # RGBA: merah penuh, alpha selalu 255
+    assert (colours[:, 0] == 255).all() and (colours[:, 1:3] == 0).all()
+    assert (colours[:, 3] == 255).all()
+
+
+def test_supersample_must_be_positive():
+    with pytest.raises(ValueError):
+        TriplaneVoxeliser(_SphereModel(), supersample=0)
+
+
+def test_empty_density_returns_empty_mesh():
+    voxel_mesh, solid = _run(threshold=1000.0)
+    assert voxel_mesh.get_voxel_count() == 0
+    assert not solid.any()
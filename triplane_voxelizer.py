@@ -0,0 +1,134 @@
+import logging
+
+import numpy as np
+import torch
+from scipy.ndimage import binary_erosion
+from scipy.spatial import KDTree
+
+from core_voxelizer import VoxelMesh
+
+# =========================================================================================
+# VOKSELISASI LANGSUNG DARI TRIPLANE (TANPA MESH, UV ATLAS & TEKSTUR)
+# =========================================================================================
+
+# Resolusi grid kasar untuk mencari bounding box objek
+BOUNDS_RESOLUTION = 64
+# Default bersama untuk /voxelize, /pipeline dan run_pipeline (mode "triplane")
+DEFAULT_THRESHOLD = 25.0
+DEFAULT_SUPERSAMPLE = 1
+
+def _model_to_world(points: np.ndarray) -> np.ndarray:
+    # Rotasi -90 derajat pada sumbu X, sama seperti mesh yang ditulis bake_textured_mesh: (x, y, z) -> (x, z, -y)
+    return np.stack([points[..., 0], points[..., 2], -points[..., 1]], axis=-1)
+
+def _world_to_model(points: np.ndarray) -> np.ndarray:
+    return np.stack([points[..., 0], -points[..., 2], points[..., 1]], axis=-1)
+
+class TriplaneVoxeliser:
+    """
+    Menghasilkan solid_grid dan VoxelMesh langsung dari scene code: densitas dan warna
+    di-query di titik pusat voxel (opsional supersampling `supersample`^3 titik per voxel).
+    Grid voxel memakai pitch dan orientasi yang sama dengan BasicGridVoxeliser pada
+    mesh hasil bake, sehingga keluarannya bisa langsung dipakai tahap pemetaan blok.
+    """
+    def __init__(self, model, threshold: float = DEFAULT_THRESHOLD, supersample: int = DEFAULT_SUPERSAMPLE):
+        if supersample < 1:
+            raise ValueError("supersample minimal 1.")
+        self.model = model
+        self.threshold = threshold
+        self.supersample = supersample
+
+    def _query(self, scene_code: torch.Tensor, world_points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        positions = torch.from_numpy(_world_to_model(world_points).astype(np.float32)).to(scene_code.device)
+        with torch.no_grad():
+            out = self.model.renderer.query_triplane(self.model.decoder, positions, scene_code)
+        return out["density_act"][:, 0].float().cpu().numpy(), out["color"].float().cpu().numpy()
+
+    def _world_bounds(self, scene_code: torch.Tensor) -> tuple[np.ndarray, np.ndarray]:
+        radius = self.model.renderer.cfg.radius
+        axis = np.linspace(-radius, radius, BOUNDS_RESOLUTION, dtype=np.float32)
+        grid = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+        occupied = self._query(scene_code, _model_to_world(grid))[0] > self.threshold
+        if not occupied.any():
+            return None, None
+        points = _model_to_world(grid[occupied])
+        # Permukaan bisa berada hingga satu sel grid kasar di luar titik terisi terakhir
+        cell = axis[1] - axis[0]
+        return points.min(axis=0) - cell, points.max(axis=0) + cell
+
+    def _occupancy(self, scene_code: torch.Tensor, origin: np.ndarray, pitch: float, dims: tuple):
+        """Fraksi titik sampel di dalam objek per voxel, plus warna rata-rata titik yang terisi."""
+        s = self.supersample
+        offsets = ((np.arange(s) + 0.5) / s - 0.5) * pitch
+        sub = np.stack(np.meshgrid(offsets, offsets, offsets, indexing="ij"), axis=-1).reshape(-1, 3)
+
+        occupancy = np.zeros(dims, dtype=np.float32)
+        colour = np.zeros(dims + (3,), dtype=np.float32)
+        j, k = np.meshgrid(np.arange(dims[1]), np.arange(dims[2]), indexing="ij")
+        for i in range(dims[0]):
+            # Satu irisan voxel per query agar memori tetap terbatas
+            centres = origin + np.stack([np.full_like(j, i), j, k], axis=-1).reshape(-1, 3) * pitch
+            samples = (centres[:, None, :] + sub[None, :, :]).reshape(-1, 3)
+            density, rgb = self._query(scene_code, samples)
+            inside = density.reshape(-1, len(sub)) > self.threshold
+            rgb = rgb.reshape(-1, len(sub), 3)
+            count = inside.sum(axis=1)
+            weights = np.where(count[:, None] > 0, inside, 1.0 / len(sub))
+            weights = weights / weights.sum(axis=1, keepdims=True)
+            occupancy[i] = (count / len(sub)).reshape(dims[1], dims[2])
+            colour[i] = (rgb * weights[..., None]).sum(axis=1).reshape(dims[1], dims[2], 3)
+        return occupancy, colour
+
+    def run(self, scene_code: torch.Tensor, max_blocks: int, fill: bool) -> tuple[VoxelMesh, np.ndarray]:
+        if scene_code.ndim == 5:
+            scene_code = scene_code[0]
+        min_w, max_w = self._world_bounds(scene_code)
+        if min_w is None:
+            logging.error("Vokselisasi triplane gagal, tidak ada densitas di atas threshold.")
+            return VoxelMesh(), np.zeros((1, 1, 1), dtype=bool)
+
+        # Dua lintasan: bounding box kasar, lalu pitch dihitung ulang dari voxel yang benar-benar terisi
+        for attempt in range(2):
+            size = max_w - min_w
+            pitch = size.max() / (max_blocks - 1) if max_blocks > 1 else size.max()
+            pitch = max(pitch, 1e-6)
+            dims = tuple(int(d) for d in np.floor(size / pitch).astype(int) + 1)
+            logging.info(f"Vokselisasi triplane: grid {dims[0]}x{dims[1]}x{dims[2]}, pitch {pitch:.4f}.")
+            occupancy, colour = self._occupancy(scene_code, min_w, pitch, dims)
+            solid = occupancy >= 0.5
+            if not solid.any():
+                logging.error("Vokselisasi triplane gagal, tidak ada voxel yang ditemukan.")
+                return VoxelMesh(), solid
+            indices = np.argwhere(solid)
+            lo, hi = indices.min(axis=0), indices.max(axis=0)
+            tight_min, tight_max = min_w + lo * pitch, min_w + hi * pitch
+            if attempt == 0 and (hi - lo).max() < max_blocks - 2:
+                min_w, max_w = tight_min, tight_max
+                continue
+            break
+
+        solid = solid[lo[0]:hi[0] + 1, lo[1]:hi[1] + 1, lo[2]:hi[2] + 1]
+        colour = colour[lo[0]:hi[0] + 1, lo[1]:hi[1] + 1, lo[2]:hi[2] + 1]
+        surface = solid & ~binary_erosion(solid)
+        surface_indices = np.argwhere(surface)
+        logging.info(f"Mengidentifikasi {len(surface_indices)} voxel permukaan dari triplane.")
+
+        rgb = np.clip(colour * 255.0 + 0.5, 0, 255).astype(np.uint8)
+        coords = [surface_indices]
+        colours = [rgb[tuple(surface_indices.T)]]
+        if fill:
+            interior_indices = np.argwhere(solid & ~surface)
+            if len(interior_indices) > 0:
+                # Warna interior mengikuti voxel permukaan terdekat, seperti BasicGridVoxeliser
+                _, nearest = KDTree(surface_indices).query(interior_indices)
+                coords.append(interior_indices)
+                colours.append(colours[0][nearest])
+        else:
+            solid = surface
+
+        coords = np.concatenate(coords).astype(np.int32)
+        colours = np.concatenate(colours)
+        colours = np.concatenate([colours, np.full((len(colours), 1), 255, dtype=np.uint8)], axis=1)
+        voxel_mesh = VoxelMesh.from_arrays(coords, colours)
+        logging.info(f"Jumlah voxel yang dihasilkan: {voxel_mesh.get_voxel_count()}")
+        return voxel_mesh, solid
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import numpy as np
 import torch
 import trimesh
@@ -9,51 +10,102 @@ import logging
 import rembg
 
 from tsr.system import TSR
-from tsr.utils import remove_background, resize_foreground, save_video
+from tsr.onnx_backend import load_onnx_backend
+from tsr.autotune import autotune_chunk_size
+from tsr.utils import remove_background, resize_foreground, save_video, default_chunk_workers
 from tsr.bake_texture import bake_texture as bake_texture_fn
+from mesh_io import write_textured_obj, write_glb, parse_formats
+from mesh_decimation import decimate_mesh
 
-def write_obj(vertices, uvs, faces, obj_path, texture_name="texture.png"):
-    # Fungsi ini tidak perlu diubah
-    with open(obj_path, 'w') as f:
-        f.write(f"mtllib material.mtl\nusemtl material_0\n")
-        for v in vertices:
-            f.write(f"v {v[0]} {v[1]} {v[2]}\n")
-        for vt in uvs:
-            f.write(f"vt {vt[0]} {1 - vt[1]}\n")  # OBJ UV Y-axis is inverted!
-        for face in faces:
-            idx = [i + 1 for i in face]
-            f.write(f"f {idx[0]}/{idx[0]} {idx[1]}/{idx[1]} {idx[2]}/{idx[2]}\n")
-
-    mtl_path = os.path.join(os.path.dirname(obj_path), "material.mtl")
-    with open(mtl_path, "w") as f:
-        f.write(f"newmtl material_0\n")
-        f.write(f"map_Kd {texture_name}\n")
-
-def run_triposr(
-        image_path,
-        output_dir,
-        bake_texture=True,
-        render=False,
-        resolution=256,
-        texture_resolution=2048,
-        device=None,
-        foreground_ratio=0.85,
-        remove_bg=True,
-        export_formats=["obj"]
-):
-    os.makedirs(output_dir, exist_ok=True)
+def resolve_device(device=None):
+    """
+    Menentukan device inferensi dari argumen atau env TRIPOSR_DEVICE,
+    dengan fallback ke CPU jika CUDA tidak tersedia.
+    """
     if device is None:
         device = os.environ.get("TRIPOSR_DEVICE", "cuda:0")
     if not torch.cuda.is_available():
         device = "cpu"
-    logging.info(f"Menggunakan device: {device}")
+    return device
 
-    model = TSR.from_pretrained("stabilityai/TripoSR", config_name="config.yaml", weight_name="model.ckpt")
+def load_tsr_model(device, chunk_size=None, precision="fp32", quantize=False,
+                   backend="torch", onnx_dir="onnx", onnx_threads=0, compile_mode=None,
+                   mc_backend="skimage", mc_workers=None, render_budget_mb=1024,
+                   occupancy_resolution=64, chunk_memory_mb=2048, chunk_workers=None,
+                   mc_processes=None, replicas=1, int8_cache_dir=None):
+    """
+    Memuat bobot TripoSR dan memindahkannya ke device.
+    Operasi ini mahal (parsing config, torch.load checkpoint, resolusi config DINO),
+    jadi sebaiknya dipanggil sekali saja lewat ModelRegistry.
+    `precision="bf16"` mengaktifkan autocast bfloat16 untuk tokenizer, backbone dan
+    decoder (cek akurasinya dulu dengan `python -m tsr.precision <gambar>`).
+    `quantize=True` memuat backbone dan decoder int8 dinamis (khusus CPU); checkpoint
+    hasil kuantisasi di-cache di samping checkpoint asli, atau di `int8_cache_dir` bila folder
+    snapshot hub read-only (`python -m tsr.quantize`).
+    `backend="onnx"` menjalankan tokenizer gambar + backbone lewat ONNX Runtime
+    (graf diekspor sekali ke `onnx_dir`); decoder, marching cubes dan bake tetap PyTorch.
+    `compile_mode` ("compile" atau "script") mengompilasi kueri triplane + MLP decoder;
+    graf hasil kompilasi di-cache di renderer dan dipakai ulang antar permintaan.
+    `mc_backend` memilih implementasi marching cubes ("skimage" bawaan, atau "torchmcubes"
+    bila terpasang); volume dipecah menjadi slab yang dipoligonisasi paralel oleh `mc_workers` worker,
+    berupa proses bila `mc_processes` (None: proses untuk skimage yang menahan GIL) atau thread.
+    torchmcubes memproses volume utuh di device-nya (CUDA di host GPU).
+    `render_budget_mb` membatasi memori sinar dari beberapa view yang dirender dalam satu batch.
+    `occupancy_resolution` > 0 mengaktifkan empty-space skipping dan early ray termination saat render.
+    `chunk_size=None` memilih ukuran chunk kueri triplane lewat benchmark singkat (titik/detik
+    tertinggi yang muat dalam `chunk_memory_mb`); hasilnya ada di `model.renderer.chunk_size`.
+    `chunk_workers` chunk dievaluasi paralel di thread pool, masing-masing dengan jatah thread
+    intra-op sendiri (None: otomatis dari jumlah core CPU, 1: berurutan). Core CPU dibagi rata
+    antar `replicas` replika yang berjalan bersamaan agar tidak oversubscribe.
+    """
+    if backend == "onnx" and quantize:
+        logging.warning("Backend ONNX memakai graf fp32; kuantisasi int8 dinonaktifkan.")
+        quantize = False
+    if backend == "onnx" and precision != "fp32":
+        logging.warning(f"Backend ONNX memakai graf fp32; precision {precision} hanya berlaku untuk decoder.")
+    if quantize:
+        if device != "cpu":
+            logging.warning(f"Kuantisasi int8 dinamis hanya untuk CPU, diabaikan untuk device {device}.")
+            quantize = False
+        elif precision != "fp32":
+            logging.warning("Model int8 tidak digabung dengan autocast; precision dipaksa fp32.")
+            precision = "fp32"
+    model = TSR.from_pretrained(
+        "stabilityai/TripoSR", config_name="config.yaml", weight_name="model.ckpt", quantize=quantize,
+        quantized_cache_dir=int8_cache_dir
+    )
     model.to(device)
-    model.renderer.set_chunk_size(8192)
+    model.renderer.set_chunk_size(chunk_size or 0)
+    model.renderer.set_compile_mode(compile_mode)
+    workers, threads_per_worker = default_chunk_workers(device, replicas)
+    if chunk_workers is not None:
+        cores = max(1, (os.cpu_count() or 1) // max(1, replicas))
+        workers, threads_per_worker = chunk_workers, max(1, cores // max(1, chunk_workers))
+    model.renderer.set_chunk_workers(workers, threads_per_worker)
+    model.renderer.set_render_budget(render_budget_mb * 1024 * 1024)
+    model.renderer.set_ray_marching(occupancy_resolution=occupancy_resolution)
+    model.set_marching_cubes_backend(mc_backend, mc_workers, mc_processes)
+    model.set_precision(precision)
+    if backend == "onnx":
+        model.set_onnx_backend(load_onnx_backend(model, onnx_dir, onnx_threads))
+        # Graf ONNX diekspor dari CPU; pastikan model kembali ke device tujuan
+        model.to(device)
+    elif backend != "torch":
+        raise ValueError(f"Backend inferensi tidak dikenal: {backend}")
+    if chunk_size is None:
+        # Setelah precision/kompilasi/kuantisasi diterapkan, karena semuanya memengaruhi throughput
+        model.eval()
+        autotune_chunk_size(model, chunk_memory_mb)
+    return model
+
+def prepare_image(image_path, output_dir, remove_bg=True, foreground_ratio=0.85, rembg_session=None):
+    """
+    Tahap pra-proses: hapus latar belakang (opsional), crop foreground, lalu
+    simpan hasilnya sebagai input.png. Mengembalikan PIL.Image RGB siap inferensi.
+    """
+    if rembg_session is None and remove_bg:
+        rembg_session = rembg.new_session()
 
-    rembg_session = rembg.new_session()
-    
     # --- PERBAIKAN LOGIKA PENANGANAN GAMBAR TRANSPARAN ---
     logging.info("Memproses gambar input...")
     img_pil = Image.open(image_path)
@@ -77,48 +129,201 @@ def run_triposr(
         image = img_pil.convert("RGB")
     # --- PERBAIKAN LOGIKA SELESAI ---
 
-    input_path = os.path.join(output_dir, "input.png")
-    image.save(input_path)
+    # output_dir=None: jangan tulis input.png (dipakai pipeline in-memory)
+    if output_dir is not None:
+        input_path = os.path.join(output_dir, "input.png")
+        image.save(input_path)
+    return image
 
-    logging.info("Memulai inferensi model TripoSR...")
-    with torch.no_grad():
-        scene_codes = model([image], device=device)
+# =========================================================================================
+# SCENE CODE (TRIPLANE) PER SESI
+# =========================================================================================
 
-    if render:
-        logging.info("Merender video pratinjau...")
-        render_images = model.render(scene_codes, n_views=30, return_type="pil")
-        save_video(render_images[0], os.path.join(output_dir, "render.mp4"), fps=30)
+SCENE_CODE_FILENAME = "scene_code.npy"
+# Bitfield okupansi kasar untuk render (empty-space skipping), turunan dari scene code
+OCCUPANCY_FILENAME = "occupancy.npz"
+
+def save_scene_code(scene_codes, output_dir):
+    """
+    Menyimpan triplane hasil transformer sebagai .npy fp16 agar ekstraksi ulang
+    (resolusi/threshold/tekstur berbeda) tidak perlu menjalankan rembg dan backbone lagi.
+    """
+    path = os.path.join(output_dir, SCENE_CODE_FILENAME)
+    array = scene_codes.detach().to("cpu", torch.float16).numpy()
+    # Tulis ke file sementara lalu rename: file lama mungkin masih di-mmap / di-hardlink dari cache
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+    # Grid okupansi milik scene code lama tidak berlaku lagi
+    occupancy_path = os.path.join(output_dir, OCCUPANCY_FILENAME)
+    if os.path.exists(occupancy_path):
+        os.remove(occupancy_path)
+    return path
+
+def load_scene_code(output_dir, device="cpu"):
+    """Memuat scene code (memory-mapped fp16) sebagai tensor float32 di `device`."""
+    array = np.load(os.path.join(output_dir, SCENE_CODE_FILENAME), mmap_mode='r', allow_pickle=False)
+    return torch.from_numpy(np.asarray(array, dtype=np.float32)).to(device)
 
+def has_scene_code(output_dir):
+    return os.path.exists(os.path.join(output_dir, SCENE_CODE_FILENAME))
+
+def _scene_code_digest(scene_code):
+    # Sidik jari pada presisi fp16 seperti di scene_code.npy: sama untuk tensor hasil
+    # inferensi maupun yang dimuat ulang dari disk
+    return hashlib.sha1(scene_code.detach().to("cpu", torch.float16).numpy().tobytes()).hexdigest()
+
+def load_or_build_occupancy(model, scene_code, output_dir):
+    """
+    Grid okupansi (bool R^3) untuk render, disimpan sebagai bitfield (np.packbits) di
+    samping scene code bersama resolusi, threshold dan sidik jari scene code pembuatnya.
+    Dibangun sekali dari satu pass densitas kasar lalu dipakai ulang selama ketiganya cocok.
+    """
+    resolution = model.renderer.occupancy_resolution
+    threshold = float(model.renderer.occupancy_threshold)
+    digest = _scene_code_digest(scene_code)
+    path = os.path.join(output_dir, OCCUPANCY_FILENAME)
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as cached:
+            if (int(cached["resolution"]) == resolution and float(cached["threshold"]) == threshold
+                    and str(cached["scene_code"]) == digest):
+                occupancy = np.unpackbits(cached["bits"], count=resolution ** 3).astype(bool)
+                return torch.from_numpy(occupancy.reshape((resolution,) * 3)).to(scene_code.device)
+    occupancy = model.occupancy_grid(scene_code)
+    tmp_path = path + ".tmp.npz"
+    np.savez(
+        tmp_path, bits=np.packbits(occupancy.cpu().numpy().reshape(-1)),
+        resolution=resolution, threshold=threshold, scene_code=digest
+    )
+    os.replace(tmp_path, path)
+    return occupancy
+
+def bake_textured_mesh(model, scene_codes, resolution=256, texture_resolution=2048, threshold=25.0,
+                       hierarchical=False, decimate_faces=None):
+    """
+    Ekstraksi mesh + bake tekstur sepenuhnya di memori. Mengembalikan trimesh ber-UV
+    (orientasi dan konvensi UV sama dengan model.obj hasil trimesh.load) beserta
+    tekstur PIL, tanpa menulis file apa pun.
+    `hierarchical=True` mengevaluasi densitas coarse-to-fine (hanya pita di sekitar
+    permukaan pada resolusi penuh), jauh lebih murah untuk resolusi 512.
+    `decimate_faces` menyederhanakan mesh (quadric error) sebelum xatlas dan bake;
+    warna tetap dari triplane per texel, jadi detail warna tidak hilang.
+    """
     logging.info("Mengekstrak mesh dari model...")
-    meshes = model.extract_mesh(scene_codes, True, resolution=resolution)
-    mesh = meshes[0]
+    meshes = model.extract_mesh(
+        scene_codes, True, resolution=resolution, threshold=threshold, hierarchical=hierarchical
+    )
+    mesh = decimate_mesh(meshes[0], decimate_faces)
 
-    output_obj_path = os.path.join(output_dir, "model.obj")
-    texture_path = os.path.join(output_dir, "baked_texture.png") if bake_texture else None
-    extras = {}
+    logging.info("Mem-bake tekstur ke mesh...")
+    baked = bake_texture_fn(mesh, model, scene_codes[0], texture_resolution, output_dir=None)
 
-    if bake_texture:
-        logging.info("Mem-bake tekstur ke mesh...")
-        baked = bake_texture_fn(mesh, model, scene_codes[0], texture_resolution, output_dir=output_dir)
+    vertices = mesh.vertices[baked["vmapping"]]
+    R = trimesh.transformations.rotation_matrix(
+        np.radians(-90), [1, 0, 0], point=[0, 0, 0]
+    )
+    vertices = trimesh.transform_points(vertices, R)
+
+    # UV xatlas -> konvensi trimesh/OBJ (sumbu V terbalik), sama seperti yang ditulis write_obj
+    uvs = np.column_stack([baked["uvs"][:, 0], 1 - baked["uvs"][:, 1]])
+    texture = Image.fromarray(baked["texture"], mode="RGB")
+    textured_mesh = trimesh.Trimesh(
+        vertices=vertices,
+        faces=baked["indices"],
+        visual=trimesh.visual.TextureVisuals(uv=uvs, image=texture),
+        process=False,
+    )
+    return textured_mesh, texture
 
-        vertices = mesh.vertices[baked["vmapping"]]
-        uvs = baked["uvs"]
-        faces = baked["indices"]
+def export_reconstruction(
+        model,
+        scene_codes,
+        output_dir,
+        bake_texture=True,
+        render=False,
+        resolution=256,
+        texture_resolution=2048,
+        export_formats=("obj",),
+        threshold=25.0,
+        hierarchical=False,
+        decimate_faces=None
+):
+    """
+    Tahap pasca-inferensi: render (opsional), ekstraksi mesh dan bake tekstur
+    dari scene code berukuran batch 1, lalu tulis mesh ke output_dir dalam
+    format `export_formats` ("glb" biner dengan tekstur tertanam dan/atau "obj").
+    Elemen pertama hasil adalah path format pertama.
+    """
+    export_formats = parse_formats(export_formats)
+    texture_path = None
+    extras = {}
 
-        R = trimesh.transformations.rotation_matrix(
-            np.radians(-90), [1, 0, 0], point=[0, 0, 0]
+    if render:
+        logging.info("Merender video pratinjau...")
+        extras["render"] = os.path.join(output_dir, "render.mp4")
+        occupancy = None
+        if model.renderer.occupancy_resolution > 0:
+            occupancy = load_or_build_occupancy(model, scene_codes[0], output_dir)
+        # frame dialirkan langsung ke encoder video, tanpa menampung 30 gambar PIL di memori
+        save_video(
+            model.render_iter(scene_codes[0], n_views=30, return_type="pil", occupancy=occupancy),
+            extras["render"], fps=30
         )
-        vertices = trimesh.transform_points(vertices, R)
 
-        texture_path = baked["texture_path"]
-        write_obj(vertices, uvs, faces, output_obj_path, os.path.basename(texture_path))
-        logging.info(f"Model OBJ disimpan di: {output_obj_path}")
-        mesh = None
+    if bake_texture:
+        mesh, texture = bake_textured_mesh(
+            model, scene_codes, resolution, texture_resolution, threshold, hierarchical, decimate_faces
+        )
+        if "glb" in export_formats:
+            extras["glb"] = write_glb(mesh, output_dir)
+        if "obj" in export_formats:
+            extras["obj"], texture_path = write_textured_obj(mesh, texture, output_dir)
+            extras["mtl"] = os.path.join(output_dir, "material.mtl")
     else:
-        mesh.export(output_obj_path)
+        logging.info("Mengekstrak mesh dari model...")
+        mesh = model.extract_mesh(
+            scene_codes, True, resolution=resolution, threshold=threshold, hierarchical=hierarchical
+        )[0]
+        for fmt in export_formats:
+            extras[fmt] = os.path.join(output_dir, f"model.{fmt}")
+            mesh.export(extras[fmt], file_type=fmt)
 
-    extras["obj"] = output_obj_path
     extras["texture"] = texture_path
-    extras["mtl"] = os.path.join(output_dir, "material.mtl")
+    return extras[export_formats[0]], texture_path, extras
+
+def run_triposr(
+        image_path,
+        output_dir,
+        bake_texture=True,
+        render=False,
+        resolution=256,
+        texture_resolution=2048,
+        device=None,
+        foreground_ratio=0.85,
+        remove_bg=True,
+        export_formats=["obj"],
+        model=None,
+        rembg_session=None
+):
+    os.makedirs(output_dir, exist_ok=True)
+    # Model & sesi rembg yang sudah "hangat" (dari ModelRegistry) dipakai apa adanya.
+    # Jika tidak diberikan, muat baru seperti sebelumnya (mis. pemakaian dari skrip).
+    if model is None:
+        device = resolve_device(device)
+        model = load_tsr_model(device)
+    elif device is None:
+        device = str(next(model.parameters()).device)
+    logging.info(f"Menggunakan device: {device}")
+
+    image = prepare_image(image_path, output_dir, remove_bg, foreground_ratio, rembg_session)
+
+    logging.info("Memulai inferensi model TripoSR...")
+    with torch.no_grad():
+        scene_codes = model([image], device=device)
 
-    return output_obj_path, texture_path, extras
\ No newline at end of file
+    return export_reconstruction(
+        model, scene_codes, output_dir,
+        bake_texture=bake_texture, render=render,
+        resolution=resolution, texture_resolution=texture_resolution,
+        export_formats=export_formats
+    )
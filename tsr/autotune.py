@@ -0,0 +1,123 @@
+import argparse
+import logging
+import time
+from typing import Iterable, Optional
+
+import torch
+
+CHUNK_CANDIDATES = tuple(4096 * 2**i for i in range(9))  # 4096 .. 1048576
+BENCHMARK_POINTS = 1 << 18
+BENCHMARK_ROUNDS = 4  # every worker evaluates at least this many chunks per candidate
+
+
+def bytes_per_point(decoder: torch.nn.Module) -> int:
+    """
+    Rough peak memory of one query point inside a chunk: the sampled triplane
+    features plus every decoder activation, counted twice for temporaries.
+    """
+    widths = [
+        module.out_features
+        for module in decoder.modules()
+        if hasattr(module, "out_features") and isinstance(module.out_features, int)
+    ]
+    first_in = next(
+        (
+            module.in_features
+            for module in decoder.modules()
+            if hasattr(module, "in_features") and isinstance(module.in_features, int)
+        ),
+        0,
+    )
+    return 4 * 2 * (first_in + sum(widths))
+
+
+def _benchmark_triplane(model) -> torch.Tensor:
+    # detokenized learned embeddings have the real scene code shape, without running the backbone
+    device = next(model.parameters()).device
+    with torch.no_grad():
+        tokens = model.tokenizer(1).to(device)
+        return model.post_processor(model.tokenizer.detokenize(tokens))[0].float()
+
+
+def _sync(device: torch.device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def autotune_chunk_size(
+    model,
+    memory_limit_mb: int = 2048,
+    candidates: Iterable[int] = CHUNK_CANDIDATES,
+    n_points: int = BENCHMARK_POINTS,
+    triplane: Optional[torch.Tensor] = None,
+) -> int:
+    """
+    Times `renderer.query_triplane` for each candidate chunk size that fits in
+    `memory_limit_mb` and sets the one with the highest points per second.
+    With a chunk executor, `renderer.chunk_workers` chunks are in flight at once,
+    so the memory limit is shared between them.
+    Returns the chosen chunk size.
+    """
+    renderer, decoder = model.renderer, model.decoder
+    if triplane is None:
+        triplane = _benchmark_triplane(model)
+    device = triplane.device
+    workers = max(1, renderer.chunk_workers)
+    limit = memory_limit_mb * 1024 * 1024 // (bytes_per_point(decoder) * workers)
+    candidates = [c for c in candidates if c <= limit] or [max(1, min(candidates))]
+
+    radius = renderer.cfg.radius
+    previous = renderer.chunk_size
+    results = {}
+    try:
+        for chunk_size in candidates:
+            renderer.set_chunk_size(chunk_size)
+            # large candidates still run as several rounds of concurrent chunks
+            n = max(n_points, chunk_size * workers * BENCHMARK_ROUNDS)
+            positions = (torch.rand(n, 3, device=device) * 2 - 1) * radius
+            with torch.no_grad():
+                # warm-up: allocator, compiled graphs, thread pools
+                renderer.query_triplane(decoder, positions[:chunk_size], triplane)
+                _sync(device)
+                start = time.perf_counter()
+                renderer.query_triplane(decoder, positions, triplane)
+                _sync(device)
+            results[chunk_size] = positions.shape[0] / (time.perf_counter() - start)
+    finally:
+        renderer.set_chunk_size(previous)
+
+    best = max(results, key=results.get)
+    logging.info(
+        "Chunk size autotune: "
+        + ", ".join(f"{c}: {p / 1e6:.2f}M pts/s" for c, p in results.items())
+        + f" -> {best}"
+    )
+    renderer.set_chunk_size(best)
+    return best
+
+
+def main():
+    from .system import TSR
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark triplane query chunk sizes under a memory ceiling."
+    )
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--pretrained-model-name-or-path", default="stabilityai/TripoSR")
+    parser.add_argument("--memory-limit-mb", type=int, default=2048)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    model = TSR.from_pretrained(
+        args.pretrained_model_name_or_path,
+        config_name="config.yaml",
+        weight_name="model.ckpt",
+    )
+    model.to(args.device)
+    model.eval()
+    autotune_chunk_size(model, args.memory_limit_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import atexit
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import torch
 import xatlas
@@ -20,116 +24,209 @@ def make_atlas(mesh, texture_resolution, texture_padding):
         "uvs": uvs,
     }
 
+# framebuffers kept per texture resolution; least recently used ones are released beyond this
+MAX_POOLED_FRAMEBUFFERS = 4
+
+
+class BakingContext:
+    """
+    Process-wide OpenGL state for texture baking: one standalone context and the
+    two compiled shader programs, created on first use, plus a small pool of
+    float32 framebuffers keyed by texture resolution. Bakes are serialized by a
+    lock (the context is made current on the calling thread for each bake) and
+    per-bake buffers are released as soon as the atlas has been read back.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ctx = None
+        self._programs = None
+        self._framebuffers = OrderedDict()
+
+    def _ensure_context(self):
+        if self._ctx is not None:
+            return
+        ctx = moderngl.create_context(standalone=True)
+        with ctx:
+            basic_prog = ctx.program(
+                vertex_shader="""
+                    #version 330
+                    in vec2 in_uv;
+                    in vec3 in_pos;
+                    out vec3 v_pos;
+                    void main() {
+                        v_pos = in_pos;
+                        gl_Position = vec4(in_uv * 2.0 - 1.0, 0.0, 1.0);
+                    }
+                """,
+                fragment_shader="""
+                    #version 330
+                    in vec3 v_pos;
+                    out vec4 o_col;
+                    void main() {
+                        o_col = vec4(v_pos, 1.0);
+                    }
+                """,
+            )
+            gs_prog = ctx.program(
+                vertex_shader="""
+                    #version 330
+                    in vec2 in_uv;
+                    in vec3 in_pos;
+                    out vec3 vg_pos;
+                    void main() {
+                        vg_pos = in_pos;
+                        gl_Position = vec4(in_uv * 2.0 - 1.0, 0.0, 1.0);
+                    }
+                """,
+                geometry_shader="""
+                    #version 330
+                    uniform float u_resolution;
+                    uniform float u_dilation;
+                    layout (triangles) in;
+                    layout (triangle_strip, max_vertices = 12) out;
+                    in vec3 vg_pos[];
+                    out vec3 vf_pos;
+                    void lineSegment(int aidx, int bidx) {
+                        vec2 a = gl_in[aidx].gl_Position.xy;
+                        vec2 b = gl_in[bidx].gl_Position.xy;
+                        vec3 aCol = vg_pos[aidx];
+                        vec3 bCol = vg_pos[bidx];
+
+                        vec2 dir = normalize((b - a) * u_resolution);
+                        vec2 offset = vec2(-dir.y, dir.x) * u_dilation / u_resolution;
+
+                        gl_Position = vec4(a + offset, 0.0, 1.0);
+                        vf_pos = aCol;
+                        EmitVertex();
+                        gl_Position = vec4(a - offset, 0.0, 1.0);
+                        vf_pos = aCol;
+                        EmitVertex();
+                        gl_Position = vec4(b + offset, 0.0, 1.0);
+                        vf_pos = bCol;
+                        EmitVertex();
+                        gl_Position = vec4(b - offset, 0.0, 1.0);
+                        vf_pos = bCol;
+                        EmitVertex();
+                    }
+                    void main() {
+                        lineSegment(0, 1);
+                        lineSegment(1, 2);
+                        lineSegment(2, 0);
+                        EndPrimitive();
+                    }
+                """,
+                fragment_shader="""
+                    #version 330
+                    in vec3 vf_pos;
+                    out vec4 o_col;
+                    void main() {
+                        o_col = vec4(vf_pos, 1.0);
+                    }
+                """,
+            )
+        self._ctx = ctx
+        self._programs = (basic_prog, gs_prog)
+
+    def _framebuffer(self, texture_resolution: int):
+        fbo = self._framebuffers.pop(texture_resolution, None)
+        if fbo is None:
+            fbo = self._ctx.framebuffer(
+                color_attachments=[
+                    self._ctx.texture((texture_resolution, texture_resolution), 4, dtype="f4")
+                ]
+            )
+        self._framebuffers[texture_resolution] = fbo
+        while len(self._framebuffers) > MAX_POOLED_FRAMEBUFFERS:
+            _, stale = self._framebuffers.popitem(last=False)
+            self._release_framebuffer(stale)
+        return fbo
+
+    @staticmethod
+    def _release_framebuffer(fbo):
+        for attachment in fbo.color_attachments:
+            attachment.release()
+        fbo.release()
+
+    def rasterize(
+        self, mesh, atlas_vmapping, atlas_indices, atlas_uvs, texture_resolution, texture_padding
+    ) -> np.ndarray:
+        uvs = atlas_uvs.flatten().astype("f4")
+        pos = mesh.vertices[atlas_vmapping].flatten().astype("f4")
+        indices = atlas_indices.flatten().astype("i4")
+        with self._lock:
+            self._ensure_context()
+            ctx = self._ctx
+            basic_prog, gs_prog = self._programs
+            with ctx:
+                resources = []
+                try:
+                    vbo_uvs = ctx.buffer(uvs)
+                    resources.append(vbo_uvs)
+                    vbo_pos = ctx.buffer(pos)
+                    resources.append(vbo_pos)
+                    ibo = ctx.buffer(indices)
+                    resources.append(ibo)
+                    vao_content = [
+                        vbo_uvs.bind("in_uv", layout="2f"),
+                        vbo_pos.bind("in_pos", layout="3f"),
+                    ]
+                    basic_vao = ctx.vertex_array(basic_prog, vao_content, ibo)
+                    resources.append(basic_vao)
+                    gs_vao = ctx.vertex_array(gs_prog, vao_content, ibo)
+                    resources.append(gs_vao)
+
+                    fbo = self._framebuffer(texture_resolution)
+                    fbo.use()
+                    fbo.clear(0.0, 0.0, 0.0, 0.0)
+                    gs_prog["u_resolution"].value = texture_resolution
+                    gs_prog["u_dilation"].value = texture_padding
+                    gs_vao.render()
+                    basic_vao.render()
+
+                    fbo_bytes = fbo.color_attachments[0].read()
+                finally:
+                    # vertex arrays before the buffers they reference
+                    for resource in reversed(resources):
+                        resource.release()
+        return np.frombuffer(fbo_bytes, dtype="f4").reshape(
+            texture_resolution, texture_resolution, 4
+        )
+
+    def release(self):
+        with self._lock:
+            if self._ctx is None:
+                return
+            with self._ctx:
+                for fbo in self._framebuffers.values():
+                    self._release_framebuffer(fbo)
+                self._framebuffers.clear()
+                for program in self._programs:
+                    program.release()
+            self._ctx.release()
+            self._ctx = None
+            self._programs = None
+
+
+_BAKING_CONTEXT = None
+_BAKING_CONTEXT_LOCK = threading.Lock()
+
+
+def get_baking_context() -> BakingContext:
+    global _BAKING_CONTEXT
+    with _BAKING_CONTEXT_LOCK:
+        if _BAKING_CONTEXT is None:
+            _BAKING_CONTEXT = BakingContext()
+            atexit.register(_BAKING_CONTEXT.release)
+        return _BAKING_CONTEXT
+
+
 def rasterize_position_atlas(
     mesh, atlas_vmapping, atlas_indices, atlas_uvs, texture_resolution, texture_padding
 ):
-    ctx = moderngl.create_context(standalone=True)
-    basic_prog = ctx.program(
-        vertex_shader="""
-            #version 330
-            in vec2 in_uv;
-            in vec3 in_pos;
-            out vec3 v_pos;
-            void main() {
-                v_pos = in_pos;
-                gl_Position = vec4(in_uv * 2.0 - 1.0, 0.0, 1.0);
-            }
-        """,
-        fragment_shader="""
-            #version 330
-            in vec3 v_pos;
-            out vec4 o_col;
-            void main() {
-                o_col = vec4(v_pos, 1.0);
-            }
-        """,
-    )
-    gs_prog = ctx.program(
-        vertex_shader="""
-            #version 330
-            in vec2 in_uv;
-            in vec3 in_pos;
-            out vec3 vg_pos;
-            void main() {
-                vg_pos = in_pos;
-                gl_Position = vec4(in_uv * 2.0 - 1.0, 0.0, 1.0);
-            }
-        """,
-        geometry_shader="""
-            #version 330
-            uniform float u_resolution;
-            uniform float u_dilation;
-            layout (triangles) in;
-            layout (triangle_strip, max_vertices = 12) out;
-            in vec3 vg_pos[];
-            out vec3 vf_pos;
-            void lineSegment(int aidx, int bidx) {
-                vec2 a = gl_in[aidx].gl_Position.xy;
-                vec2 b = gl_in[bidx].gl_Position.xy;
-                vec3 aCol = vg_pos[aidx];
-                vec3 bCol = vg_pos[bidx];
-
-                vec2 dir = normalize((b - a) * u_resolution);
-                vec2 offset = vec2(-dir.y, dir.x) * u_dilation / u_resolution;
-
-                gl_Position = vec4(a + offset, 0.0, 1.0);
-                vf_pos = aCol;
-                EmitVertex();
-                gl_Position = vec4(a - offset, 0.0, 1.0);
-                vf_pos = aCol;
-                EmitVertex();
-                gl_Position = vec4(b + offset, 0.0, 1.0);
-                vf_pos = bCol;
-                EmitVertex();
-                gl_Position = vec4(b - offset, 0.0, 1.0);
-                vf_pos = bCol;
-                EmitVertex();
-            }
-            void main() {
-                lineSegment(0, 1);
-                lineSegment(1, 2);
-                lineSegment(2, 0);
-                EndPrimitive();
-            }
-        """,
-        fragment_shader="""
-            #version 330
-            in vec3 vf_pos;
-            out vec4 o_col;
-            void main() {
-                o_col = vec4(vf_pos, 1.0);
-            }
-        """,
-    )
-    uvs = atlas_uvs.flatten().astype("f4")
-    pos = mesh.vertices[atlas_vmapping].flatten().astype("f4")
-    indices = atlas_indices.flatten().astype("i4")
-    vbo_uvs = ctx.buffer(uvs)
-    vbo_pos = ctx.buffer(pos)
-    ibo = ctx.buffer(indices)
-    vao_content = [
-        vbo_uvs.bind("in_uv", layout="2f"),
-        vbo_pos.bind("in_pos", layout="3f"),
-    ]
-    basic_vao = ctx.vertex_array(basic_prog, vao_content, ibo)
-    gs_vao = ctx.vertex_array(gs_prog, vao_content, ibo)
-    fbo = ctx.framebuffer(
-        color_attachments=[
-            ctx.texture((texture_resolution, texture_resolution), 4, dtype="f4")
-        ]
-    )
-    fbo.use()
-    fbo.clear(0.0, 0.0, 0.0, 0.0)
-    gs_prog["u_resolution"].value = texture_resolution
-    gs_prog["u_dilation"].value = texture_padding
-    gs_vao.render()
-    basic_vao.render()
-
-    fbo_bytes = fbo.color_attachments[0].read()
-    fbo_np = np.frombuffer(fbo_bytes, dtype="f4").reshape(
-        texture_resolution, texture_resolution, 4
+    return get_baking_context().rasterize(
+        mesh, atlas_vmapping, atlas_indices, atlas_uvs, texture_resolution, texture_padding
     )
-    return fbo_np
 
 def positions_to_colors(model, scene_code, positions_texture, texture_resolution, inv_transform=None):
     positions = torch.tensor(positions_texture.reshape(-1, 4)[:, :-1])
@@ -147,8 +244,9 @@ def positions_to_colors(model, scene_code, positions_texture, texture_resolution
             model.decoder,
             positions,
             scene_code,
+            output="color",
         )
-    rgb_f = queried_grid["color"].numpy().reshape(-1, 3)
+    rgb_f = queried_grid.numpy().reshape(-1, 3)
     rgba_f = np.insert(rgb_f, 3, positions_texture.reshape(-1, 4)[:, -1], axis=1)
     rgba_f[rgba_f[:, -1] == 0.0] = [0, 0, 0, 0]
     return rgba_f.reshape(texture_resolution, texture_resolution, 4)
@@ -168,11 +266,14 @@ def bake_texture(mesh, model, scene_code, texture_resolution, output_dir="./outp
         model, scene_code, positions_texture, texture_resolution, inv_transform=inv_transform
     )
 
-    os.makedirs(output_dir, exist_ok=True)
     # Jadikan PNG RGB saja (tidak RGBA) agar universal
     texture_img = (colors_texture[:, :, :3] * 255).astype(np.uint8)
-    texture_path = os.path.join(output_dir, "baked_texture.png")
-    Image.fromarray(texture_img, mode="RGB").save(texture_path)
+    texture_path = None
+    # output_dir=None: tekstur hanya dikembalikan di memori
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        texture_path = os.path.join(output_dir, "baked_texture.png")
+        Image.fromarray(texture_img, mode="RGB").save(texture_path)
 
 
     return {
@@ -180,5 +281,6 @@ def bake_texture(mesh, model, scene_code, texture_resolution, output_dir="./outp
         "indices": atlas["indices"],
         "uvs": atlas["uvs"],
         "colors": colors_texture,
+        "texture": texture_img,
         "texture_path": texture_path
     }
@@ -1,9 +1,146 @@
-from typing import Callable, Optional, Tuple
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
 import torch
 import torch.nn as nn
-from torchmcubes import marching_cubes
+
+
+def _empty_mesh() -> Tuple[np.ndarray, np.ndarray]:
+    return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.int64)
+
+
+def skimage_marching_cubes(volume: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # portable default: scikit-image, no compiled extension to build
+    from skimage.measure import marching_cubes
+
+    if volume.min() > 0.0 or volume.max() < 0.0:
+        return _empty_mesh()
+    verts, faces, _, _ = marching_cubes(volume, 0.0)
+    return verts.astype(np.float32), faces.astype(np.int64)
+
+
+def torchmcubes_marching_cubes(volume: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    # runs on the volume's device (CUDA kernel on GPU hosts), no host round trip
+    from torchmcubes import marching_cubes
+
+    verts, faces = marching_cubes(volume, 0.0)
+    # torchmcubes returns (k, j, i) vertex coordinates
+    return verts[..., [2, 1, 0]], faces.long()
+
+
+MC_BACKENDS = {
+    "skimage": skimage_marching_cubes,
+    "torchmcubes": torchmcubes_marching_cubes,
+}
+
+
+# backends polygonizing numpy volumes on the host, split into parallel slabs
+HOST_BACKENDS = ("skimage",)
+
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+
+def _shared_process_pool(workers: int) -> ProcessPoolExecutor:
+    # one long-lived pool per size; spawn so workers do not inherit torch/server threads
+    with _process_pools_lock:
+        if workers not in _process_pools:
+            _process_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pools[workers]
+
+
+@atexit.register
+def _shutdown_process_pools():
+    with _process_pools_lock:
+        for pool in _process_pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _process_pools.clear()
+
+
+def _polygonize_slab(backend: str, volume: np.ndarray, start: int):
+    verts, faces = MC_BACKENDS[backend](volume)
+    # offset in float64: adding it in float32 rounds the vertices differently
+    # from a single-slab extraction
+    verts = verts.astype(np.float64)
+    verts[:, 0] += start
+    return verts, faces
+
+
+def seam_planes(volume: np.ndarray, n_slabs: int) -> np.ndarray:
+    """
+    Slab bounds (vertex plane indices, including 0 and n_cells) for about `n_slabs`
+    slabs. Interior seams are moved to nearby planes without exact zeros: a zero
+    grid value yields coincident vertices from different edges, which could not be
+    paired unambiguously across the seam. Seams with no such plane nearby are dropped.
+    """
+    n_cells = volume.shape[0] - 1
+    targets = np.linspace(0, n_cells, n_slabs + 1).round().astype(int)
+    zero_free = ~(volume == 0).reshape(volume.shape[0], -1).any(axis=1)
+    max_shift = max(1, n_cells // (2 * n_slabs))
+    bounds = [0]
+    for target in targets[1:-1]:
+        for shift in range(max_shift + 1):
+            candidates = [b for b in (target - shift, target + shift) if bounds[-1] < b < n_cells]
+            found = next((b for b in candidates if zero_free[b]), None)
+            if found is not None:
+                bounds.append(found)
+                break
+    bounds.append(n_cells)
+    return np.asarray(bounds)
+
+
+def _pair_rows(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # (i, j) with a[i] == b[j], for rows occurring exactly once on each side
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    _, inverse = np.unique(np.concatenate([a, b]), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    ia, ib = inverse[: len(a)], inverse[len(a) :]
+    n_unique = int(inverse.max()) + 1
+    pairable = (np.bincount(ia, minlength=n_unique) == 1) & (
+        np.bincount(ib, minlength=n_unique) == 1
+    )
+    pos_a = np.full(n_unique, -1)
+    pos_b = np.full(n_unique, -1)
+    pos_a[ia] = np.arange(len(a))
+    pos_b[ib] = np.arange(len(b))
+    keep = np.nonzero(pairable)[0]
+    return pos_a[keep], pos_b[keep]
+
+
+def weld_slabs(
+    slabs: List[Tuple[np.ndarray, np.ndarray]], bounds: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenates per-slab meshes (vertices already offset to global coordinates)
+    and merges the vertices that slab k and slab k+1 both produce on their shared
+    plane bounds[k+1]. Vertices within one slab are never merged, faces that become
+    degenerate are dropped, and unused vertices are removed.
+    """
+    offsets = np.cumsum([0] + [len(verts) for verts, _ in slabs])
+    verts = np.concatenate([verts for verts, _ in slabs])
+    faces = np.concatenate([faces + offset for (_, faces), offset in zip(slabs, offsets)])
+    remap = np.arange(len(verts))
+    for k, seam in enumerate(bounds[1:-1]):
+        last = offsets[k] + np.nonzero(slabs[k][0][:, 0] == seam)[0]
+        first = offsets[k + 1] + np.nonzero(slabs[k + 1][0][:, 0] == seam)[0]
+        ia, ib = _pair_rows(verts[last], verts[first])
+        remap[first[ib]] = last[ia]
+    faces = remap[faces]
+    faces = faces[
+        (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    ]
+    used = np.zeros(len(verts), dtype=bool)
+    used[faces.reshape(-1)] = True
+    new_index = np.cumsum(used) - 1
+    return verts[used], new_index[faces]
 
 
 class IsosurfaceHelper(nn.Module):
@@ -15,38 +152,87 @@ class IsosurfaceHelper(nn.Module):
 
 
 class MarchingCubeHelper(IsosurfaceHelper):
-    def __init__(self, resolution: int) -> None:
+    def __init__(
+        self,
+        resolution: int,
+        backend: str = "skimage",
+        workers: Optional[int] = None,
+        use_processes: Optional[bool] = None,
+    ) -> None:
         super().__init__()
+        assert backend in MC_BACKENDS, f"marching cubes backend must be one of {list(MC_BACKENDS)}"
         self.resolution = resolution
-        self.mc_func: Callable = marching_cubes
-        self._grid_vertices: Optional[torch.FloatTensor] = None
+        self.backend = backend
+        # slabs are polygonized in parallel; 1 disables slab splitting
+        self.workers = workers or os.cpu_count() or 1
+        # scikit-image's marching cubes holds the GIL, so its slabs default to processes
+        self.use_processes = backend == "skimage" if use_processes is None else use_processes
+        self.mc_func: Callable = MC_BACKENDS[backend]
+
+    def points_from_indices(self, indices: torch.Tensor) -> torch.FloatTensor:
+        lo, hi = self.points_range
+        return indices.float() / (self.resolution - 1) * (hi - lo) + lo
+
+    def grid_slab(self, start: int, end: int, device=None) -> torch.FloatTensor:
+        # grid vertices whose first index lies in [start, end), in the same
+        # (i, j, k) order as the full grid
+        axis = torch.linspace(*self.points_range, self.resolution, device=device)
+        x, y, z = torch.meshgrid(axis[start:end], axis, axis, indexing="ij")
+        return torch.stack((x, y, z), dim=-1).reshape(-1, 3)
+
+    def iter_grid_slabs(self, slab_size: int, device=None):
+        for start in range(0, self.resolution, slab_size):
+            end = min(start + slab_size, self.resolution)
+            yield start, end, self.grid_slab(start, end, device)
 
     @property
     def grid_vertices(self) -> torch.FloatTensor:
-        if self._grid_vertices is None:
-            # keep the vertices on CPU so that we can support very large resolution
-            x, y, z = (
-                torch.linspace(*self.points_range, self.resolution),
-                torch.linspace(*self.points_range, self.resolution),
-                torch.linspace(*self.points_range, self.resolution),
-            )
-            x, y, z = torch.meshgrid(x, y, z, indexing="ij")
-            verts = torch.cat(
-                [x.reshape(-1, 1), y.reshape(-1, 1), z.reshape(-1, 1)], dim=-1
-            ).reshape(-1, 3)
-            self._grid_vertices = verts
-        return self._grid_vertices
+        # materialized on demand and not cached (resolution^3 x 3 floats);
+        # prefer iter_grid_slabs for large resolutions
+        return self.grid_slab(0, self.resolution)
+
+    def polygonize(self, volume: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        n_cells = volume.shape[0] - 1
+        n_slabs = max(1, min(self.workers, n_cells // 8))
+        bounds = seam_planes(volume, n_slabs) if n_slabs > 1 else None
+        if bounds is None or len(bounds) == 2:
+            return self.mc_func(volume)
+        n_slabs = len(bounds) - 1
+
+        # slab s covers cells [start, end) and therefore vertices [start, end];
+        # neighbouring slabs share the vertex plane at `end`
+        slab_args = (
+            [self.backend] * n_slabs,
+            [volume[start : end + 1] for start, end in zip(bounds[:-1], bounds[1:])],
+            bounds[:-1],
+        )
+        if self.use_processes:
+            results = list(_shared_process_pool(self.workers).map(_polygonize_slab, *slab_args))
+        else:
+            with ThreadPoolExecutor(max_workers=n_slabs) as executor:
+                results = list(executor.map(_polygonize_slab, *slab_args))
+
+        return weld_slabs(results, bounds)
 
     def forward(
         self,
         level: torch.FloatTensor,
     ) -> Tuple[torch.FloatTensor, torch.LongTensor]:
-        level = -level.view(self.resolution, self.resolution, self.resolution)
-        try:
-            v_pos, t_pos_idx = self.mc_func(level.detach(), 0.0)
-        except AttributeError:
-            print("torchmcubes was not compiled with CUDA support, use CPU version instead.")
-            v_pos, t_pos_idx = self.mc_func(level.detach().cpu(), 0.0)
-        v_pos = v_pos[..., [2, 1, 0]]
+        volume = (
+            -level.view(self.resolution, self.resolution, self.resolution)
+        ).detach().float()
+        if self.backend in HOST_BACKENDS:
+            verts, faces = self.polygonize(volume.cpu().numpy())
+            v_pos = torch.from_numpy(np.ascontiguousarray(verts)).float().to(level.device)
+            t_pos_idx = torch.from_numpy(np.ascontiguousarray(faces)).long().to(level.device)
+        else:
+            v_pos, t_pos_idx = self.mc_func(volume)
+            v_pos = v_pos.float()
+        if len(t_pos_idx) > 0:
+            # keep the outward orientation independent of the backend's winding
+            tri = v_pos[t_pos_idx].double()
+            signed_volume = (tri[:, 0] * torch.cross(tri[:, 1], tri[:, 2], dim=-1)).sum()
+            if signed_volume < 0:
+                t_pos_idx = t_pos_idx[:, [0, 2, 1]]
         v_pos = v_pos / (self.resolution - 1.0)
-        return v_pos.to(level.device), t_pos_idx.to(level.device)
+        return v_pos, t_pos_idx
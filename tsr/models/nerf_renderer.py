@@ -1,19 +1,77 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Optional, Union
 
 import torch
 import torch.nn.functional as F
-from einops import rearrange, reduce
 
 from ..utils import (
     BaseModule,
     chunk_batch,
     get_activation,
+    make_chunk_executor,
     rays_intersect_bbox,
     scale_tensor,
 )
 
 
+# decoder output rows of each query head: density 1 + features 3
+QUERY_HEADS = {"all": (0, 4), "density": (0, 1), "color": (1, 4)}
+
+
+class TriplaneQuery(torch.nn.Module):
+    """
+    Fused triplane sampling + decoder MLP for one chunk of points. Written with
+    plain tensor ops so it can be compiled (torch.compile) or scripted (TorchScript).
+    Returns the raw decoder output rows of `head`; for "density" and "color" the
+    last linear layer only computes those rows. Use `decoder.split_output` on "all".
+    """
+
+    # constant for TorchScript, so only the taken branch is compiled
+    slice_weight: torch.jit.Final[bool]
+
+    def __init__(self, layers: torch.nn.Module, feature_reduction: str, head: str = "all"):
+        super().__init__()
+        self.hidden = torch.nn.Sequential(*list(layers)[:-1])
+        self.last = layers[-1]
+        self.concat = feature_reduction == "concat"
+        self.start, self.end = QUERY_HEADS[head]
+        # dynamically quantized layers have no plain weight to slice; their output is sliced instead
+        self.slice_weight = isinstance(self.last, torch.nn.Linear)
+
+    def forward(self, triplane: torch.Tensor, x: torch.Tensor) -> torch.Tensor:
+        indices2D = torch.stack(
+            (
+                torch.stack((x[:, 0], x[:, 1]), dim=-1),
+                torch.stack((x[:, 0], x[:, 2]), dim=-1),
+                torch.stack((x[:, 1], x[:, 2]), dim=-1),
+            ),
+            dim=0,
+        )
+        out = F.grid_sample(
+            triplane,
+            indices2D.unsqueeze(1),
+            align_corners=False,
+            mode="bilinear",
+        ).squeeze(2)
+        if self.concat:
+            # "Np Cp N -> N (Np Cp)"
+            out = out.permute(2, 0, 1).reshape(out.shape[2], -1)
+        else:
+            out = out.mean(dim=0).t()
+        out = self.hidden(out)
+        if self.slice_weight:
+            bias = self.last.bias
+            if bias is not None:
+                bias = bias[self.start : self.end]
+            return F.linear(out, self.last.weight[self.start : self.end], bias)
+        return self.last(out)[:, self.start : self.end]
+
+
+# rough peak fp32 values held per ray sample in _forward (positions, decoder heads,
+# activations and compositing terms); the decoder's hidden layers are bounded by chunk_size
+_FLOATS_PER_SAMPLE = 20
+
+
 class TriplaneNeRFRenderer(BaseModule):
     @dataclass
     class Config(BaseModule.Config):
@@ -31,6 +89,94 @@ class TriplaneNeRFRenderer(BaseModule):
     def configure(self) -> None:
         assert self.cfg.feature_reduction in ["concat", "mean"]
         self.chunk_size = 0
+        self.autocast_dtype = None
+        self.compile_mode = None
+        self._query_fns = {}
+        self.render_budget = 1 << 30
+        self.chunk_executor = None
+        self.chunk_workers = 1
+        self.occupancy_resolution = 64
+        self.occupancy_threshold = 0.1
+        self.march_step = 16
+        self.min_transmittance = 1e-4
+
+    def set_compile_mode(self, mode):
+        # None (eager), "compile" (torch.compile) or "script" (TorchScript)
+        assert mode in (None, "compile", "script"), "compile mode must be None, 'compile' or 'script'."
+        self.compile_mode = mode
+
+    def get_query_fn(self, decoder: torch.nn.Module, head: str = "all"):
+        # compiled graphs are cached per decoder and head and reused across requests
+        key = (id(decoder), self.compile_mode, head)
+        if key not in self._query_fns:
+            query = TriplaneQuery(decoder.layers, self.cfg.feature_reduction, head).eval()
+            if self.compile_mode == "compile":
+                query = torch.compile(query, dynamic=True)
+            elif self.compile_mode == "script":
+                query = torch.jit.script(query)
+            self._query_fns[key] = query
+        return self._query_fns[key]
+
+    def set_autocast_dtype(self, dtype):
+        # None keeps the decoder MLP in fp32; e.g. torch.bfloat16 for reduced-precision CPU inference
+        self.autocast_dtype = dtype
+
+    def set_render_budget(self, max_bytes: int):
+        # approximate memory ceiling for the rays pushed through _forward at once
+        assert max_bytes > 0, "render budget must be a positive number of bytes."
+        self.render_budget = max_bytes
+
+    def rays_per_batch(self) -> int:
+        per_ray = self.cfg.num_samples_per_ray * _FLOATS_PER_SAMPLE * 4
+        return max(1, self.render_budget // per_ray)
+
+    def set_ray_marching(
+        self,
+        occupancy_resolution: int = 64,
+        occupancy_threshold: float = 0.1,
+        march_step: int = 16,
+        min_transmittance: float = 1e-4,
+    ):
+        # occupancy_resolution=0 disables empty-space skipping and early termination
+        assert occupancy_resolution >= 0 and march_step > 0
+        self.occupancy_resolution = occupancy_resolution
+        self.occupancy_threshold = occupancy_threshold
+        self.march_step = march_step
+        self.min_transmittance = min_transmittance
+
+    def build_occupancy_grid(
+        self, decoder: torch.nn.Module, triplane: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Boolean (R, R, R) grid over [-radius, radius]^3 marking cells whose centre
+        density exceeds `occupancy_threshold`, dilated by one cell so that thin
+        structures between cell centres are not skipped.
+        """
+        resolution = self.occupancy_resolution
+        axis = (
+            torch.arange(resolution, device=triplane.device, dtype=torch.float32) + 0.5
+        ) / resolution * 2.0 - 1.0
+        axis = axis * self.cfg.radius
+        x, y, z = torch.meshgrid(axis, axis, axis, indexing="ij")
+        centres = torch.stack((x, y, z), dim=-1).reshape(-1, 3)
+        with torch.no_grad():
+            density = self.query_triplane(decoder, centres, triplane, output="density")
+        occupied = (density.view(1, 1, resolution, resolution, resolution) > self.occupancy_threshold).float()
+        occupied = F.max_pool3d(occupied, kernel_size=3, stride=1, padding=1)
+        return occupied[0, 0] > 0
+
+    def _lookup_occupancy(self, occupancy: torch.Tensor, xyz: torch.Tensor) -> torch.Tensor:
+        resolution = occupancy.shape[0]
+        indices = ((xyz + self.cfg.radius) / (2 * self.cfg.radius) * resolution).long()
+        indices = indices.clamp(0, resolution - 1)
+        return occupancy[indices[..., 0], indices[..., 1], indices[..., 2]]
+
+    def set_chunk_workers(self, workers: int, threads_per_worker: int = 1):
+        # evaluates independent query chunks concurrently; 1 keeps them sequential
+        if self.chunk_executor is not None:
+            self.chunk_executor.shutdown(wait=True)
+        self.chunk_executor = make_chunk_executor(workers, threads_per_worker)
+        self.chunk_workers = max(1, workers) if self.chunk_executor is not None else 1
 
     def set_chunk_size(self, chunk_size: int):
         assert chunk_size >= 0, "chunk_size must be a non-negative integer (0 for no chunking)."
@@ -41,7 +187,14 @@ class TriplaneNeRFRenderer(BaseModule):
         decoder: torch.nn.Module,
         positions: torch.Tensor,
         triplane: torch.Tensor,
-    ) -> Dict[str, torch.Tensor]:
+        output: str = "all",
+    ) -> Union[Dict[str, torch.Tensor], torch.Tensor]:
+        """
+        output="all" returns the dict of every head. "density" returns only the
+        activated density (..., 1) and "color" only the activated colour (..., 3),
+        evaluating just that part of the decoder.
+        """
+        assert output in QUERY_HEADS, f"output must be one of {list(QUERY_HEADS)}"
         input_shape = positions.shape[:-1]
         positions = positions.view(-1, 3)
 
@@ -51,31 +204,38 @@ class TriplaneNeRFRenderer(BaseModule):
 
         positions = scale_tensor(positions, (-self.cfg.radius, self.cfg.radius), (-1, 1))
 
-        def _query_chunk(x):
-            indices2D = torch.stack(
-                (x[..., [0, 1]], x[..., [0, 2]], x[..., [1, 2]]),
-                dim=-3,
-            )
-            out = F.grid_sample(
-                rearrange(triplane, "Np Cp Hp Wp -> Np Cp Hp Wp", Np=3),
-                rearrange(indices2D, "Np N Nd -> Np () N Nd", Np=3),
-                align_corners=False,
-                mode="bilinear",
-            )
-            if self.cfg.feature_reduction == "concat":
-                out = rearrange(out, "Np Cp () N -> N (Np Cp)", Np=3)
-            elif self.cfg.feature_reduction == "mean":
-                out = reduce(out, "Np Cp () N -> N Cp", Np=3, reduction="mean")
-            else:
-                raise NotImplementedError
+        query = self.get_query_fn(decoder, output)
 
-            return decoder(out)
+        def _query_chunk(x):
+            # autocast state is thread-local, so it is entered per chunk
+            with torch.autocast(
+                device_type=x.device.type,
+                dtype=self.autocast_dtype or torch.bfloat16,
+                enabled=self.autocast_dtype is not None,
+            ):
+                if output == "all":
+                    return decoder.split_output(query(triplane, x))
+                return query(triplane, x)
 
         if self.chunk_size > 0:
-            net_out = chunk_batch(_query_chunk, self.chunk_size, positions)
+            net_out = chunk_batch(
+                _query_chunk, self.chunk_size, positions, executor=self.chunk_executor
+            )
         else:
             net_out = _query_chunk(positions)
 
+        # activations, compositing and density thresholding run in fp32
+        if output == "density":
+            density = get_activation(self.cfg.density_activation)(
+                net_out.float() + self.cfg.density_bias
+            )
+            return density.view(*input_shape, 1)
+        if output == "color":
+            return get_activation(self.cfg.color_activation)(net_out.float()).view(
+                *input_shape, 3
+            )
+        net_out = {k: v.float() for k, v in net_out.items()}
+
         net_out["density_act"] = get_activation(self.cfg.density_activation)(
             net_out["density"] + self.cfg.density_bias
         )
@@ -92,6 +252,7 @@ class TriplaneNeRFRenderer(BaseModule):
         triplane: torch.Tensor,
         rays_o: torch.Tensor,
         rays_d: torch.Tensor,
+        occupancy: Optional[torch.Tensor] = None,
         **kwargs,
     ):
         rays_shape = rays_o.shape[:-1]
@@ -102,6 +263,12 @@ class TriplaneNeRFRenderer(BaseModule):
         t_near, t_far, rays_valid = rays_intersect_bbox(rays_o, rays_d, self.cfg.radius)
         t_near, t_far = t_near[rays_valid], t_far[rays_valid]
 
+        if occupancy is not None:
+            comp_rgb_, opacity_ = self._march(
+                decoder, triplane, rays_o[rays_valid], rays_d[rays_valid], t_near, t_far, occupancy
+            )
+            return self._finalize(comp_rgb_, opacity_, rays_valid, n_rays, rays_shape)
+
         t_vals = torch.linspace(
             0, 1, self.cfg.num_samples_per_ray + 1, device=triplane.device
         )
@@ -122,7 +289,62 @@ class TriplaneNeRFRenderer(BaseModule):
         weights = alpha * accum_prod
         comp_rgb_ = (weights[..., None] * mlp_out["color"]).sum(dim=-2)
         opacity_ = weights.sum(dim=-1)
+        return self._finalize(comp_rgb_, opacity_, rays_valid, n_rays, rays_shape)
+
+    def _march(
+        self,
+        decoder: torch.nn.Module,
+        triplane: torch.Tensor,
+        rays_o: torch.Tensor,
+        rays_d: torch.Tensor,
+        t_near: torch.Tensor,
+        t_far: torch.Tensor,
+        occupancy: torch.Tensor,
+    ):
+        """
+        Same sample positions and compositing as the dense path, marched
+        `march_step` samples at a time: samples in empty occupancy cells are not
+        queried, and rays whose transmittance drops below `min_transmittance` stop.
+        """
+        device = rays_o.device
+        n_rays = rays_o.shape[0]
+        eps = 1e-10
+        t_vals = torch.linspace(0, 1, self.cfg.num_samples_per_ray + 1, device=device)
+        t_mid = (t_vals[:-1] + t_vals[1:]) / 2.0
+        deltas = t_vals[1:] - t_vals[:-1]
+
+        comp_rgb = torch.zeros(n_rays, 3, device=device)
+        opacity = torch.zeros(n_rays, device=device)
+        transmittance = torch.ones(n_rays, device=device)
+        active = torch.arange(n_rays, device=device)
+
+        for start in range(0, self.cfg.num_samples_per_ray, self.march_step):
+            if active.numel() == 0:
+                break
+            end = min(start + self.march_step, self.cfg.num_samples_per_ray)
+            z_vals = t_near[active] * (1 - t_mid[None, start:end]) + t_far[active] * t_mid[None, start:end]
+            xyz = rays_o[active, None, :] + z_vals[..., None] * rays_d[active, None, :]
+
+            occupied = self._lookup_occupancy(occupancy, xyz)
+            density = torch.zeros(occupied.shape, device=device)
+            color = torch.zeros(*occupied.shape, 3, device=device)
+            if occupied.any():
+                mlp_out = self.query_triplane(decoder=decoder, positions=xyz[occupied], triplane=triplane)
+                density[occupied] = mlp_out["density_act"][..., 0]
+                color[occupied] = mlp_out["color"]
+
+            alpha = 1 - torch.exp(-deltas[None, start:end] * density)
+            accum_prod = torch.cumprod(1 - alpha + eps, dim=-1)
+            prefix = torch.cat([torch.ones_like(alpha[:, :1]), accum_prod[:, :-1]], dim=-1)
+            weights = alpha * prefix * transmittance[active, None]
+            comp_rgb[active] += (weights[..., None] * color).sum(dim=-2)
+            opacity[active] += weights.sum(dim=-1)
+            transmittance[active] *= accum_prod[:, -1]
+            active = active[transmittance[active] > self.min_transmittance]
+
+        return comp_rgb, opacity
 
+    def _finalize(self, comp_rgb_, opacity_, rays_valid, n_rays, rays_shape):
         comp_rgb = torch.zeros(n_rays, 3, dtype=comp_rgb_.dtype, device=comp_rgb_.device)
         opacity = torch.zeros(n_rays, dtype=opacity_.dtype, device=opacity_.device)
         comp_rgb[rays_valid] = comp_rgb_
@@ -138,12 +360,23 @@ class TriplaneNeRFRenderer(BaseModule):
         triplane: torch.Tensor,
         rays_o: torch.Tensor,
         rays_d: torch.Tensor,
+        occupancy: Optional[torch.Tensor] = None,
     ) -> Dict[str, torch.Tensor]:
+        # occupancy: grid from build_occupancy_grid (per scene code, batched when triplane is)
         if triplane.ndim == 4:
-            comp_rgb = self._forward(decoder, triplane, rays_o, rays_d)
+            comp_rgb = self._forward(decoder, triplane, rays_o, rays_d, occupancy)
         else:
             comp_rgb = torch.stack(
-                [self._forward(decoder, triplane[i], rays_o[i], rays_d[i]) for i in range(triplane.shape[0])],
+                [
+                    self._forward(
+                        decoder,
+                        triplane[i],
+                        rays_o[i],
+                        rays_d[i],
+                        None if occupancy is None else occupancy[i],
+                    )
+                    for i in range(triplane.shape[0])
+                ],
                 dim=0,
             )
         return comp_rgb
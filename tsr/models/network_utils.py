@@ -119,6 +119,7 @@ class NeRFMLP(BaseModule):
 
         features = self.layers(x)
         features = features.reshape(*inp_shape, -1)
-        out = {"density": features[..., 0:1], "features": features[..., 1:4]}
+        return self.split_output(features)
 
-        return out
+    def split_output(self, features):
+        return {"density": features[..., 0:1], "features": features[..., 1:4]}
@@ -0,0 +1,165 @@
+import argparse
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import torch
+import torch.nn as nn
+from einops import rearrange
+
+IMAGE_TOKENIZER_FILENAME = "image_tokenizer.onnx"
+BACKBONE_FILENAME = "backbone.onnx"
+
+
+class _ImageTokenizerGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.image_tokenizer = model.image_tokenizer
+
+    def forward(self, rgb_cond: torch.Tensor) -> torch.Tensor:
+        input_image_tokens = self.image_tokenizer(
+            rearrange(rgb_cond, "B Nv H W C -> B Nv C H W", Nv=1)
+        )
+        return rearrange(input_image_tokens, "B Nv C Nt -> B (Nv Nt) C", Nv=1)
+
+
+class _BackboneGraph(nn.Module):
+    # Triplane1DTokenizer + Transformer1D + TriplaneUpsampleNetwork
+    def __init__(self, model):
+        super().__init__()
+        self.tokenizer = model.tokenizer
+        self.backbone = model.backbone
+        self.post_processor = model.post_processor
+
+    def forward(self, input_image_tokens: torch.Tensor) -> torch.Tensor:
+        # expand keeps the batch size a traced (dynamic) dimension
+        tokens = self.tokenizer(1).expand(input_image_tokens.shape[0], -1, -1)
+        tokens = self.backbone(tokens, encoder_hidden_states=input_image_tokens)
+        return self.post_processor(self.tokenizer.detokenize(tokens))
+
+
+def _export(module: nn.Module, args, path: str, input_name: str, output_name: str, opset: int):
+    # unique temp file per writer: several workers may export at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                module,
+                args,
+                tmp_path,
+                input_names=[input_name],
+                output_names=[output_name],
+                dynamic_axes={input_name: {0: "batch"}, output_name: {0: "batch"}},
+                opset_version=opset,
+                do_constant_folding=True,
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logging.info(f"Exported {path}")
+
+
+def export_onnx(model, output_dir: str, opset: int = 17) -> dict:
+    """
+    Traces the image tokenizer and the tokenizer/backbone/post-processor into two
+    ONNX graphs with a dynamic batch axis (`cond_image_size` input).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    model = model.to("cpu").eval()
+    size = model.cfg.cond_image_size
+    paths = {
+        "image_tokenizer": os.path.join(output_dir, IMAGE_TOKENIZER_FILENAME),
+        "backbone": os.path.join(output_dir, BACKBONE_FILENAME),
+    }
+
+    # traced with a batch of 2 so that no batch-1 shape gets folded into the graphs
+    rgb_cond = torch.rand(2, 1, size, size, 3)
+    tokenizer_graph = _ImageTokenizerGraph(model).eval()
+    _export(tokenizer_graph, (rgb_cond,), paths["image_tokenizer"], "rgb_cond", "input_image_tokens", opset)
+
+    with torch.no_grad():
+        input_image_tokens = tokenizer_graph(rgb_cond)
+    _export(
+        _BackboneGraph(model).eval(),
+        (input_image_tokens,),
+        paths["backbone"],
+        "input_image_tokens",
+        "scene_codes",
+        opset,
+    )
+    return paths
+
+
+class OnnxBackend:
+    """
+    Runs the transformer half of `TSR.forward` through ONNX Runtime sessions with
+    full graph optimizations (fused attention / GELU kernels on CPU).
+    """
+
+    def __init__(
+        self,
+        onnx_dir: str,
+        intra_op_threads: int = 0,
+        providers: Optional[list] = None,
+    ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 0 lets ORT pick the number of physical cores
+        options.intra_op_num_threads = intra_op_threads
+        providers = providers or ["CPUExecutionProvider"]
+
+        self.image_tokenizer = ort.InferenceSession(
+            os.path.join(onnx_dir, IMAGE_TOKENIZER_FILENAME), options, providers=providers
+        )
+        self.backbone = ort.InferenceSession(
+            os.path.join(onnx_dir, BACKBONE_FILENAME), options, providers=providers
+        )
+
+    def __call__(self, rgb_cond: torch.Tensor) -> torch.Tensor:
+        # the whole micro-batch in one call per graph (dynamic batch axis)
+        rgb_cond = rgb_cond.detach().cpu().float().numpy()
+        (input_image_tokens,) = self.image_tokenizer.run(None, {"rgb_cond": rgb_cond})
+        (scene_codes,) = self.backbone.run(None, {"input_image_tokens": input_image_tokens})
+        return torch.from_numpy(scene_codes)
+
+
+def has_onnx_graphs(onnx_dir: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(onnx_dir, name))
+        for name in (IMAGE_TOKENIZER_FILENAME, BACKBONE_FILENAME)
+    )
+
+
+def load_onnx_backend(model, onnx_dir: str, intra_op_threads: int = 0) -> OnnxBackend:
+    if not has_onnx_graphs(onnx_dir):
+        export_onnx(model, onnx_dir)
+    return OnnxBackend(onnx_dir, intra_op_threads)
+
+
+def main():
+    from .system import TSR
+
+    parser = argparse.ArgumentParser(description="Export the TSR transformer to ONNX.")
+    parser.add_argument("--pretrained-model-name-or-path", default="stabilityai/TripoSR")
+    parser.add_argument("--output-dir", default="onnx")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    model = TSR.from_pretrained(
+        args.pretrained_model_name_or_path,
+        config_name="config.yaml",
+        weight_name="model.ckpt",
+    )
+    export_onnx(model, args.output_dir, args.opset)
+
+
+if __name__ == "__main__":
+    main()
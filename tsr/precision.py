@@ -0,0 +1,108 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+import rembg
+import torch
+from PIL import Image
+
+from .system import PRECISIONS, TSR
+from .utils import remove_background, resize_foreground
+
+
+def density_grid(model: TSR, scene_code: torch.Tensor, resolution: int) -> np.ndarray:
+    model.set_marching_cubes_resolution(resolution)
+    return model._dense_density(scene_code, resolution).view(-1).cpu().numpy()
+
+
+def occupancy_iou(density_a: np.ndarray, density_b: np.ndarray, threshold: float) -> float:
+    # volumetric IoU of the regions enclosed by the extracted meshes
+    occ_a = density_a > threshold
+    occ_b = density_b > threshold
+    union = np.logical_or(occ_a, occ_b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(occ_a, occ_b).sum() / union)
+
+
+def check_precision(
+    model: TSR,
+    image: Image.Image,
+    device: str,
+    precision: str = "bf16",
+    resolution: int = 128,
+    threshold: float = 25.0,
+) -> dict:
+    """
+    Runs the same image in fp32 and in `precision`, and compares the occupancy of
+    the marching-cubes density grids (mesh IoU) together with the inference time.
+    The model's current precision is restored afterwards.
+    """
+    previous = model.precision
+    runs = {}
+    try:
+        for name in dict.fromkeys(("fp32", precision)):
+            model.set_precision(name)
+            start = time.perf_counter()
+            with torch.no_grad():
+                scene_codes = model([image], device=device)
+            elapsed = time.perf_counter() - start
+            runs[name] = (elapsed, density_grid(model, scene_codes[0], resolution))
+    finally:
+        model.set_precision(previous)
+
+    return {
+        "precision": precision,
+        "iou": occupancy_iou(runs["fp32"][1], runs[precision][1], threshold),
+        "fp32_seconds": runs["fp32"][0],
+        "seconds": runs[precision][0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare reduced-precision TSR inference against fp32 on a reference image."
+    )
+    parser.add_argument("image", type=str)
+    parser.add_argument("--precision", default="bf16", choices=[p for p in PRECISIONS if p != "fp32"])
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--pretrained-model-name-or-path", default="stabilityai/TripoSR")
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--mc-resolution", type=int, default=128)
+    parser.add_argument("--threshold", type=float, default=25.0)
+    parser.add_argument("--foreground-ratio", type=float, default=0.85)
+    parser.add_argument("--min-iou", type=float, default=0.95)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    model = TSR.from_pretrained(
+        args.pretrained_model_name_or_path,
+        config_name="config.yaml",
+        weight_name="model.ckpt",
+    )
+    model.renderer.set_chunk_size(args.chunk_size)
+    model.to(args.device)
+    model.eval()
+
+    image = remove_background(Image.open(args.image), rembg.new_session())
+    image = resize_foreground(image, args.foreground_ratio)
+    image = np.array(image).astype(np.float32) / 255.0
+    image = image[:, :, :3] * image[:, :, 3:4] + (1 - image[:, :, 3:4]) * 0.5
+    image = Image.fromarray((image * 255.0).astype(np.uint8))
+
+    result = check_precision(
+        model, image, args.device, args.precision, args.mc_resolution, args.threshold
+    )
+    logging.info(
+        f"{result['precision']}: IoU {result['iou']:.4f} vs fp32, "
+        f"{result['seconds']:.2f}s vs {result['fp32_seconds']:.2f}s"
+    )
+    if result["iou"] < args.min_iou:
+        logging.error(f"IoU below {args.min_iou}, {result['precision']} is not safe for this model.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
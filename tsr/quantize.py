@@ -0,0 +1,121 @@
+import argparse
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import torch
+import torch.nn as nn
+
+# submodules dominated by nn.Linear; the DINO tokenizer and the triplane
+# upsampler (ConvTranspose2d) stay in fp32
+QUANTIZED_MODULES = ("backbone", "decoder")
+
+
+def quantize_model(model: nn.Module) -> nn.Module:
+    for name in QUANTIZED_MODULES:
+        setattr(
+            model,
+            name,
+            torch.ao.quantization.quantize_dynamic(
+                getattr(model, name), {nn.Linear}, dtype=torch.qint8
+            ),
+        )
+    model.quantized = True
+    return model
+
+
+def _checkpoint_fingerprint(weight_path: str) -> str:
+    # identifies the source checkpoint: a replaced fp32 file gets a new int8 cache entry
+    stat = os.stat(weight_path)
+    key = f"{os.path.realpath(weight_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def quantized_weight_path(weight_path: str, cache_dir: Optional[str] = None) -> str:
+    # next to the fp32 checkpoint unless cache_dir is given (e.g. read-only hub snapshots)
+    root, _ = os.path.splitext(weight_path)
+    if cache_dir is not None:
+        root = os.path.join(cache_dir, os.path.basename(root))
+    return f"{root}.{_checkpoint_fingerprint(weight_path)}.int8.ckpt"
+
+
+def load_quantized(
+    model: nn.Module, weight_path: str, cache: bool = True, cache_dir: Optional[str] = None
+) -> nn.Module:
+    """
+    Loads `model` as a dynamic int8 model. The quantized state dict is cached
+    next to the fp32 checkpoint (or in `cache_dir`), keyed by the checkpoint's
+    path, size and mtime, so only the first load pays for quantization.
+    Dynamic int8 kernels are CPU-only.
+    """
+    quantized_path = quantized_weight_path(weight_path, cache_dir)
+    if os.path.exists(quantized_path):
+        quantize_model(model)
+        model.load_state_dict(torch.load(quantized_path, map_location="cpu"))
+        return model
+
+    model.load_state_dict(torch.load(weight_path, map_location="cpu"))
+    quantize_model(model)
+    if cache:
+        try:
+            save_quantized(model, quantized_path)
+        except OSError as e:
+            # read-only or shared checkpoint dir: keep the in-memory int8 model
+            logging.warning(f"Could not cache the quantized checkpoint at {quantized_path}: {e}")
+    return model
+
+
+def save_quantized(model: nn.Module, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # unique temp file per writer: several workers may build the cache at once
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(model.state_dict(), f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logging.info(f"Saved quantized checkpoint to {path}")
+
+
+def main():
+    from .system import TSR
+
+    parser = argparse.ArgumentParser(
+        description="Build and cache a dynamic int8 TSR checkpoint (backbone and decoder)."
+    )
+    parser.add_argument("--pretrained-model-name-or-path", default="stabilityai/TripoSR")
+    parser.add_argument("--config-name", default="config.yaml")
+    parser.add_argument("--weight-name", default="model.ckpt")
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Where to write the quantized checkpoint. Default: the cache path next to the fp32 checkpoint.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory for the cached quantized checkpoint instead of the checkpoint's directory.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    model = TSR.from_pretrained(
+        args.pretrained_model_name_or_path,
+        config_name=args.config_name,
+        weight_name=args.weight_name,
+        quantize=args.output is None,
+        quantized_cache_dir=args.cache_dir,
+    )
+    if args.output is not None:
+        save_quantized(quantize_model(model), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
+import logging
 import math
 import os
 from dataclasses import dataclass, field
-from typing import List, Union
+from typing import List, Optional, Union
 
 import numpy as np
 import PIL.Image
@@ -18,11 +19,14 @@ from .utils import (
     BaseModule,
     ImagePreprocessor,
     find_class,
-    get_spherical_cameras,
+    get_spherical_cameras_cached,
     scale_tensor,
 )
 
 
+PRECISIONS = {"fp32": None, "bf16": torch.bfloat16}
+
+
 class TSR(BaseModule):
     @dataclass
     class Config(BaseModule.Config):
@@ -50,7 +54,12 @@ class TSR(BaseModule):
 
     @classmethod
     def from_pretrained(
-        cls, pretrained_model_name_or_path: str, config_name: str, weight_name: str
+        cls,
+        pretrained_model_name_or_path: str,
+        config_name: str,
+        weight_name: str,
+        quantize: bool = False,
+        quantized_cache_dir: Optional[str] = None,
     ):
         if os.path.isdir(pretrained_model_name_or_path):
             config_path = os.path.join(pretrained_model_name_or_path, config_name)
@@ -66,6 +75,12 @@ class TSR(BaseModule):
         cfg = OmegaConf.load(config_path)
         OmegaConf.resolve(cfg)
         model = cls(cfg)
+        if quantize:
+            # dynamic int8 backbone + decoder (CPU only), cached next to the checkpoint
+            # or in quantized_cache_dir
+            from .quantize import load_quantized
+
+            return load_quantized(model, weight_path, cache_dir=quantized_cache_dir)
         ckpt = torch.load(weight_path, map_location="cpu")
         model.load_state_dict(ckpt)
         return model
@@ -83,6 +98,29 @@ class TSR(BaseModule):
         self.renderer = find_class(self.cfg.renderer_cls)(self.cfg.renderer)
         self.image_processor = ImagePreprocessor()
         self.isosurface_helper = None
+        self.mc_backend = "skimage"
+        self.mc_workers = None
+        self.mc_use_processes = None
+        self.precision = "fp32"
+        self.quantized = False
+        self.onnx_backend = None
+
+    def set_onnx_backend(self, backend):
+        # e.g. tsr.onnx_backend.OnnxBackend; None restores eager PyTorch
+        self.onnx_backend = backend
+
+    def set_precision(self, precision: str):
+        assert precision in PRECISIONS, f"precision must be one of {list(PRECISIONS)}"
+        self.precision = precision
+        self.renderer.set_autocast_dtype(PRECISIONS[precision])
+
+    def _autocast(self, device):
+        dtype = PRECISIONS[self.precision]
+        return torch.autocast(
+            device_type=torch.device(device).type,
+            dtype=dtype or torch.bfloat16,
+            enabled=dtype is not None,
+        )
 
     def forward(
         self,
@@ -101,27 +139,32 @@ class TSR(BaseModule):
         )
         batch_size = rgb_cond.shape[0]
 
-        input_image_tokens: torch.Tensor = self.image_tokenizer(
-            rearrange(rgb_cond, "B Nv H W C -> B Nv C H W", Nv=1),
-        )
+        if self.onnx_backend is not None:
+            return self.onnx_backend(rgb_cond).to(device)
 
-        input_image_tokens = rearrange(
-            input_image_tokens, "B Nv C Nt -> B (Nv Nt) C", Nv=1
-        )
+        with self._autocast(device):
+            input_image_tokens: torch.Tensor = self.image_tokenizer(
+                rearrange(rgb_cond, "B Nv H W C -> B Nv C H W", Nv=1),
+            )
+
+            input_image_tokens = rearrange(
+                input_image_tokens, "B Nv C Nt -> B (Nv Nt) C", Nv=1
+            )
 
-        tokens: torch.Tensor = self.tokenizer(batch_size)
+            tokens: torch.Tensor = self.tokenizer(batch_size)
 
-        tokens = self.backbone(
-            tokens,
-            encoder_hidden_states=input_image_tokens,
-        )
+            tokens = self.backbone(
+                tokens,
+                encoder_hidden_states=input_image_tokens,
+            )
 
-        scene_codes = self.post_processor(self.tokenizer.detokenize(tokens))
-        return scene_codes
+            scene_codes = self.post_processor(self.tokenizer.detokenize(tokens))
+        # scene codes are stored and sampled downstream in fp32
+        return scene_codes.float()
 
-    def render(
+    def render_iter(
         self,
-        scene_codes,
+        scene_code,
         n_views: int,
         elevation_deg: float = 0.0,
         camera_distance: float = 1.9,
@@ -129,36 +172,83 @@ class TSR(BaseModule):
         height: int = 256,
         width: int = 256,
         return_type: str = "pil",
+        occupancy: Optional[torch.Tensor] = None,
     ):
-        rays_o, rays_d = get_spherical_cameras(
+        """
+        Yields the turntable frames of a single scene code in view order. Rays of
+        several views go through the renderer together, as many as fit in
+        `renderer.rays_per_batch()`. `occupancy` (see `occupancy_grid`) is built
+        on the fly when not given, unless empty-space skipping is disabled.
+        """
+        if return_type not in ("pt", "np", "pil"):
+            raise NotImplementedError
+        if occupancy is None and self.renderer.occupancy_resolution > 0:
+            occupancy = self.occupancy_grid(scene_code)
+        rays_o, rays_d = get_spherical_cameras_cached(
             n_views, elevation_deg, camera_distance, fovy_deg, height, width
         )
-        rays_o, rays_d = rays_o.to(scene_codes.device), rays_d.to(scene_codes.device)
+        views_per_batch = max(1, self.renderer.rays_per_batch() // (height * width))
 
-        def process_output(image: torch.FloatTensor):
-            if return_type == "pt":
-                return image
-            elif return_type == "np":
-                return image.detach().cpu().numpy()
-            elif return_type == "pil":
-                return Image.fromarray(
-                    (image.detach().cpu().numpy() * 255.0).astype(np.uint8)
+        for start in range(0, n_views, views_per_batch):
+            end = min(start + views_per_batch, n_views)
+            with torch.no_grad():
+                images = self.renderer(
+                    self.decoder,
+                    scene_code,
+                    rays_o[start:end].to(scene_code.device),
+                    rays_d[start:end].to(scene_code.device),
+                    occupancy,
                 )
-            else:
-                raise NotImplementedError
+            if return_type == "pt":
+                yield from images
+                continue
+            if return_type == "pil":
+                # one quantization and device transfer per batch instead of per frame
+                images = (images * 255.0).to(torch.uint8)
+            images = images.detach().cpu().numpy()
+            for image in images:
+                yield Image.fromarray(image) if return_type == "pil" else image
 
-        images = []
-        for scene_code in scene_codes:
-            images_ = []
-            for i in range(n_views):
-                with torch.no_grad():
-                    image = self.renderer(
-                        self.decoder, scene_code, rays_o[i], rays_d[i]
-                    )
-                images_.append(process_output(image))
-            images.append(images_)
+    def occupancy_grid(self, scene_code) -> torch.Tensor:
+        # coarse occupancy bitfield used by the renderer to skip empty space
+        return self.renderer.build_occupancy_grid(self.decoder, scene_code)
+
+    def render(
+        self,
+        scene_codes,
+        n_views: int,
+        elevation_deg: float = 0.0,
+        camera_distance: float = 1.9,
+        fovy_deg: float = 40.0,
+        height: int = 256,
+        width: int = 256,
+        return_type: str = "pil",
+    ):
+        return [
+            list(
+                self.render_iter(
+                    scene_code,
+                    n_views,
+                    elevation_deg,
+                    camera_distance,
+                    fovy_deg,
+                    height,
+                    width,
+                    return_type,
+                )
+            )
+            for scene_code in scene_codes
+        ]
 
-        return images
+    def set_marching_cubes_backend(
+        self, backend: str, workers: Optional[int] = None, use_processes: Optional[bool] = None
+    ):
+        # "skimage" (default, portable) or "torchmcubes"; workers bounds the parallel slabs,
+        # which run in processes (default for skimage) or threads
+        self.mc_backend = backend
+        self.mc_workers = workers
+        self.mc_use_processes = use_processes
+        self.isosurface_helper = None
 
     def set_marching_cubes_resolution(self, resolution: int):
         if (
@@ -166,23 +256,117 @@ class TSR(BaseModule):
             and self.isosurface_helper.resolution == resolution
         ):
             return
-        self.isosurface_helper = MarchingCubeHelper(resolution)
+        self.isosurface_helper = MarchingCubeHelper(
+            resolution,
+            backend=self.mc_backend,
+            workers=self.mc_workers,
+            use_processes=self.mc_use_processes,
+        )
+
+    def _query_density(self, scene_code, points):
+        # points are given in isosurface_helper.points_range
+        with torch.no_grad():
+            return self.renderer.query_triplane(
+                self.decoder,
+                scale_tensor(
+                    points,
+                    self.isosurface_helper.points_range,
+                    (-self.renderer.cfg.radius, self.renderer.cfg.radius),
+                ),
+                scene_code,
+                output="density",
+            )
+
+    def _slab_size(self, resolution: int) -> int:
+        # number of x-slabs per query, so that a slab holds about one renderer chunk
+        if self.renderer.chunk_size <= 0:
+            return resolution
+        return max(1, self.renderer.chunk_size // resolution**2)
+
+    def _dense_density(self, scene_code, resolution: int):
+        # grid coordinates are generated slab by slab; only the output volume is full size
+        density = torch.empty((resolution,) * 3, device=scene_code.device)
+        for start, end, points in self.isosurface_helper.iter_grid_slabs(
+            self._slab_size(resolution), scene_code.device
+        ):
+            density[start:end] = self._query_density(scene_code, points).view(
+                end - start, resolution, resolution
+            )
+        return density
+
+    def _hierarchical_density(
+        self, scene_code, resolution: int, threshold: float, coarse_factor: int, dilation: int
+    ):
+        device = scene_code.device
+        coarse_resolution = max(2, (resolution - 1) // coarse_factor + 1)
 
-    def extract_mesh(self, scene_codes, has_vertex_color, resolution: int = 256, threshold: float = 25.0):
+        # 1. coarse grid over the same range
+        coarse_helper = MarchingCubeHelper(coarse_resolution)
+        coarse = self._query_density(scene_code, coarse_helper.grid_vertices.to(device)).view(
+            1, 1, coarse_resolution, coarse_resolution, coarse_resolution
+        )
+
+        # 2. coarse cells whose 8 corners straddle the threshold, dilated
+        cell_max = F.max_pool3d(coarse, kernel_size=2, stride=1)
+        cell_min = -F.max_pool3d(-coarse, kernel_size=2, stride=1)
+        band_cells = ((cell_min <= threshold) & (cell_max >= threshold)).float()
+        if dilation > 0:
+            band_cells = F.max_pool3d(
+                band_cells, kernel_size=2 * dilation + 1, stride=1, padding=dilation
+            )
+        band_cells = band_cells[0, 0] > 0
+
+        # 3. trilinear upsampling; inside a non-straddling cell every corner lies on the
+        # same side of the threshold, so the interpolated values keep that sign
+        density = F.interpolate(
+            coarse, size=(resolution,) * 3, mode="trilinear", align_corners=True
+        )[0, 0]
+
+        # 4. evaluate the fine grid only inside the band
+        cell_of = torch.clamp(
+            (torch.arange(resolution, device=device) * (coarse_resolution - 1)) // (resolution - 1),
+            max=coarse_resolution - 2,
+        )
+        slab = self._slab_size(resolution)
+        n_evaluated = 0
+        for start in range(0, resolution, slab):
+            xs = torch.arange(start, min(start + slab, resolution), device=device)
+            band = band_cells[cell_of[xs]][:, cell_of][:, :, cell_of]
+            indices = band.nonzero()
+            if indices.shape[0] == 0:
+                continue
+            indices[:, 0] += start
+            density[indices[:, 0], indices[:, 1], indices[:, 2]] = self._query_density(
+                scene_code, self.isosurface_helper.points_from_indices(indices)
+            )[:, 0]
+            n_evaluated += indices.shape[0]
+        logging.info(
+            f"Hierarchical extraction: evaluated {n_evaluated} of {resolution**3} fine grid vertices"
+        )
+        return density
+
+    def extract_mesh(
+        self,
+        scene_codes,
+        has_vertex_color,
+        resolution: int = 256,
+        threshold: float = 25.0,
+        hierarchical: bool = False,
+        coarse_factor: int = 4,
+        dilation: int = 1,
+    ):
         self.set_marching_cubes_resolution(resolution)
         meshes = []
         for scene_code in scene_codes:
-            with torch.no_grad():
-                density = self.renderer.query_triplane(
-                    self.decoder,
-                    scale_tensor(
-                        self.isosurface_helper.grid_vertices.to(scene_codes.device),
-                        self.isosurface_helper.points_range,
-                        (-self.renderer.cfg.radius, self.renderer.cfg.radius),
-                    ),
-                    scene_code,
-                )["density_act"]
-            v_pos, t_pos_idx = self.isosurface_helper(-(density - threshold))
+            if hierarchical:
+                density = self._hierarchical_density(
+                    scene_code, resolution, threshold, coarse_factor, dilation
+                )
+            else:
+                density = self._dense_density(scene_code, resolution)
+            density = density.reshape(-1, 1)
+            # thresholding stays in fp32 regardless of the inference precision
+            v_pos, t_pos_idx = self.isosurface_helper(-(density.float() - threshold))
             v_pos = scale_tensor(
                 v_pos,
                 self.isosurface_helper.points_range,
@@ -195,7 +379,8 @@ class TSR(BaseModule):
                         self.decoder,
                         v_pos,
                         scene_code,
-                    )["color"]
+                        output="color",
+                    )
             mesh = trimesh.Trimesh(
                 vertices=v_pos.cpu().numpy(),
                 faces=t_pos_idx.cpu().numpy(),
@@ -1,8 +1,10 @@
 import importlib
 import math
-from collections import defaultdict
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import imageio
 import numpy as np
@@ -151,7 +153,11 @@ def rays_intersect_bbox(
     return t_near, t_far, rays_valid
 
 
-def chunk_batch(func: Callable, chunk_size: int, *args, **kwargs) -> Any:
+def chunk_batch(
+    func: Callable, chunk_size: int, *args, executor: Optional[Executor] = None, **kwargs
+) -> Any:
+    # func must be row-wise: each returned tensor has one row per input row of the chunk.
+    # With an executor, chunks are evaluated concurrently and written back in order.
     if chunk_size <= 0:
         return func(*args, **kwargs)
     B = None
@@ -162,20 +168,32 @@ def chunk_batch(func: Callable, chunk_size: int, *args, **kwargs) -> Any:
     assert (
         B is not None
     ), "No tensor found in args or kwargs, cannot determine batch size."
-    out = defaultdict(list)
-    out_type = None
+    grad_enabled = torch.is_grad_enabled()
+
+    def run_chunk(i):
+        # grad mode is thread-local, so it is forwarded to executor threads explicitly
+        with torch.set_grad_enabled(grad_enabled):
+            return func(
+                *[
+                    arg[i : i + chunk_size] if isinstance(arg, torch.Tensor) else arg
+                    for arg in args
+                ],
+                **{
+                    k: arg[i : i + chunk_size] if isinstance(arg, torch.Tensor) else arg
+                    for k, arg in kwargs.items()
+                },
+            )
+
     # max(1, B) to support B == 0
-    for i in range(0, max(1, B), chunk_size):
-        out_chunk = func(
-            *[
-                arg[i : i + chunk_size] if isinstance(arg, torch.Tensor) else arg
-                for arg in args
-            ],
-            **{
-                k: arg[i : i + chunk_size] if isinstance(arg, torch.Tensor) else arg
-                for k, arg in kwargs.items()
-            },
-        )
+    starts = range(0, max(1, B), chunk_size)
+    if executor is None or len(starts) == 1:
+        results = map(run_chunk, starts)
+    else:
+        results = executor.map(run_chunk, starts)
+
+    out: Dict[Any, Optional[torch.Tensor]] = {}
+    out_type = None
+    for i, out_chunk in zip(starts, results):
         if out_chunk is None:
             continue
         out_type = type(out_chunk)
@@ -192,30 +210,64 @@ def chunk_batch(func: Callable, chunk_size: int, *args, **kwargs) -> Any:
             )
             exit(1)
         for k, v in out_chunk.items():
-            v = v if torch.is_grad_enabled() else v.detach()
-            out[k].append(v)
+            if v is not None and not isinstance(v, torch.Tensor):
+                raise TypeError(f"Unsupported type in return value of func: {type(v)}")
+            if (v is None) != (out.get(k, v) is None):
+                raise TypeError(f"Return value {k} of func mixes None and tensors across chunks.")
+            if v is None:
+                # allow None in return value
+                out[k] = None
+                continue
+            v = v if grad_enabled else v.detach()
+            if k not in out:
+                # chunks are written into one preallocated output instead of torch.cat over a list
+                out[k] = v.new_empty((B,) + tuple(v.shape[1:]))
+            out[k][i : i + v.shape[0]] = v
 
     if out_type is None:
         return None
 
-    out_merged: Dict[Any, Optional[torch.Tensor]] = {}
-    for k, v in out.items():
-        if all([vv is None for vv in v]):
-            # allow None in return value
-            out_merged[k] = None
-        elif all([isinstance(vv, torch.Tensor) for vv in v]):
-            out_merged[k] = torch.cat(v, dim=0)
-        else:
-            raise TypeError(
-                f"Unsupported types in return value of func: {[type(vv) for vv in v if not isinstance(vv, torch.Tensor)]}"
-            )
-
     if out_type is torch.Tensor:
-        return out_merged[0]
+        return out[0]
     elif out_type in [tuple, list]:
-        return out_type([out_merged[i] for i in range(chunk_length)])
+        return out_type([out[i] for i in range(chunk_length)])
     elif out_type is dict:
-        return out_merged
+        return out
+
+
+def _limit_worker_threads(threads: int):
+    # torch.set_num_threads is process-wide (it would leak into every other thread),
+    # so only the OpenMP team size of this worker thread is limited.
+    from threadpoolctl import threadpool_limits
+
+    torch.get_num_threads()  # initializes this thread's OpenMP state first
+    threadpool_limits(limits=threads, user_api="openmp")
+
+
+def make_chunk_executor(workers: int, threads_per_worker: int) -> Optional[ThreadPoolExecutor]:
+    """
+    Thread pool for `chunk_batch`. Each worker limits its own OpenMP thread team
+    on start, so that `workers` concurrent chunks share the cores instead of each
+    one spawning a full-size team; other threads keep the process-wide setting.
+    """
+    if workers <= 1:
+        return None
+    return ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="chunk",
+        initializer=_limit_worker_threads,
+        initargs=(max(1, threads_per_worker),),
+    )
+
+
+def default_chunk_workers(device: str, replicas: int = 1) -> Tuple[int, int]:
+    # (workers, intra-op threads per worker) out of this replica's share of the cores;
+    # GPU kernels are already parallel
+    cores = max(1, (os.cpu_count() or 1) // max(1, replicas))
+    if torch.device(device).type != "cpu" or cores < 8:
+        return 1, cores
+    workers = cores // 4
+    return workers, cores // workers
 
 
 ValidScale = Union[Tuple[float, float], torch.FloatTensor]
@@ -399,6 +451,22 @@ def get_spherical_cameras(
     return rays_o, rays_d
 
 
+@lru_cache(maxsize=4)
+def get_spherical_cameras_cached(
+    n_views: int,
+    elevation_deg: float,
+    camera_distance: float,
+    fovy_deg: float,
+    height: int,
+    width: int,
+):
+    # turntable ray bundles are identical across scene codes; the cached CPU
+    # tensors are shared, so callers must not modify them in place
+    return get_spherical_cameras(
+        n_views, elevation_deg, camera_distance, fovy_deg, height, width
+    )
+
+
 def remove_background(
     image: PIL.Image.Image,
     rembg_session: Any = None,
@@ -456,16 +524,15 @@ def resize_foreground(
 
 
 def save_video(
-    frames: List[PIL.Image.Image],
+    frames: Iterable[Union[PIL.Image.Image, np.ndarray]],
     output_path: str,
     fps: int = 30,
 ):
-    # use imageio to save video
-    frames = [np.array(frame) for frame in frames]
-    writer = imageio.get_writer(output_path, fps=fps)
-    for frame in frames:
-        writer.append_data(frame)
-    writer.close()
+    # frames are encoded as they arrive, so a generator (e.g. TSR.render_iter)
+    # never has to hold the whole clip in memory
+    with imageio.get_writer(output_path, fps=fps) as writer:
+        for frame in frames:
+            writer.append_data(np.asarray(frame))
 
 
 def to_gradio_3d_orientation(mesh):